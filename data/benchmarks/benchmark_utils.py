@@ -0,0 +1,31 @@
+import platform
+import resource
+
+
+class CountingExporter:
+    """Count documents written per collection, every other attribute is passed through."""
+
+    def __init__(self, exporter):
+        self._exporter = exporter
+        self.writes = {}
+
+    def update_docs(self, collection_name, data, *args, **kwargs):
+        self.writes[collection_name] = self.writes.get(collection_name, 0) + len(data)
+        return self._exporter.update_docs(collection_name, data, *args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self._exporter, item)
+
+
+def percentile(values, q):
+    # Nearest rank
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
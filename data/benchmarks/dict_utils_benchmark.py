@@ -0,0 +1,219 @@
+"""
+Equivalence check and benchmark of utils/dict_utils against the recursive implementations it
+replaced (kept below as reference_*).
+
+Random documents (seeded) with nested dicts, lists mixing dicts and scalars, None values, int
+keys and dotted keys colliding with nested ones go through both implementations, outputs must
+be equal including key order. Then both are timed on converted tweets / profiles. Run from the
+directory holding run.py:
+
+    python src/benchmarks/dict_utils_benchmark.py
+    python src/benchmarks/dict_utils_benchmark.py --cases 20000 --docs 5000 --repeat 5
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.getcwd())
+
+import src  # noqa: E402,F401  (puts src/ on sys.path, like run.py)
+from utils import dict_utils  # noqa: E402
+
+
+def reference_flatten_dict(d):
+    out = {}
+    for key, val in d.items():
+        if isinstance(val, dict):
+            val = [val]
+        if isinstance(val, list):
+            array = []
+            for subdict in val:
+                if not isinstance(subdict, dict):
+                    array.append(subdict)
+                else:
+                    deeper = reference_flatten_dict(subdict).items()
+                    out.update({str(key) + '.' + str(key2): val2 for key2, val2 in deeper})
+            if array:
+                out.update({str(key): array})
+        else:
+            out[str(key)] = val
+    return out
+
+
+def reference_reverse_flatten_dict(d):
+    result = {}
+    for key, val in d.items():
+        nested_keys = key.split('.')
+        d_ = result
+        for k in nested_keys[:-1]:
+            if k not in d_:
+                d_[k] = {}
+            d_ = d_[k]
+        d_[nested_keys[-1]] = val
+    return result
+
+
+def reference_delete_none(_dict):
+    for key, value in list(_dict.items()):
+        if isinstance(value, dict):
+            reference_delete_none(value)
+        elif value is None:
+            del _dict[key]
+        elif isinstance(value, list):
+            for v_i in value:
+                if isinstance(v_i, dict):
+                    reference_delete_none(v_i)
+    return _dict
+
+
+def reference_filter_doc_by_keys(doc, keys):
+    doc_ = copy.deepcopy(doc)
+    if keys is None:
+        return doc_
+    return dict(filter(lambda x: x[0] in keys, doc_.items()))
+
+
+KEYS = ["a", "b", "c", "a.b", "b.c", 1, 2, "countLogs", "x", ".a", "a.", ""]
+FLAT_KEYS = ["a", "a.b", "a.b.c", "a.c", "b.c", ".a", "a.", "", "a..b", "c"]
+
+
+def random_value(rng, depth):
+    kind = rng.random()
+    if depth > 0 and kind < 0.25:
+        return random_doc(rng, depth - 1)
+    if depth > 0 and kind < 0.4:
+        return [random_value(rng, depth - 1) for _ in range(rng.randint(0, 4))]
+    if kind < 0.55:
+        return None
+    return rng.choice([0, 1, -3, 2.5, "", "gm", True, False, (1, 2)])
+
+
+def random_doc(rng, depth=4):
+    return {rng.choice(KEYS): random_value(rng, depth) for _ in range(rng.randint(0, 6))}
+
+
+def random_flat(rng):
+    # Unflatten inputs not produced by flatten_dict: parents set after / over their children
+    return {rng.choice(FLAT_KEYS): random_value(rng, 1) for _ in range(rng.randint(0, 6))}
+
+
+def ordered(value):
+    # dict equality ignores key order, compare it too
+    if isinstance(value, dict):
+        return [(k, ordered(v)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [ordered(v) for v in value]
+    return value
+
+
+def outcome(func, *args):
+    try:
+        return "ok", ordered(func(*args))
+    except Exception as ex:
+        return "error", type(ex).__name__
+
+
+def check(cases, seed):
+    rng = random.Random(seed)
+    failures = 0
+    for i in range(cases):
+        doc = random_doc(rng)
+        keys = rng.choice([None, ["a", 1], {"b", "c", "x"}, ("countLogs",)])
+        flat = reference_flatten_dict(doc) if i % 2 else random_flat(rng)
+        pairs = [
+            ("flatten_dict", outcome(reference_flatten_dict, doc), outcome(dict_utils.flatten_dict, doc)),
+            # Both mutate dicts of their input (a value set at a parent path), one copy each
+            ("reverse_flatten_dict", outcome(reference_reverse_flatten_dict, copy.deepcopy(flat)),
+             outcome(dict_utils.reverse_flatten_dict, copy.deepcopy(flat))),
+            ("delete_none", outcome(reference_delete_none, copy.deepcopy(doc)),
+             outcome(dict_utils.delete_none, copy.deepcopy(doc))),
+            ("filter_doc_by_keys", outcome(reference_filter_doc_by_keys, doc, keys),
+             outcome(dict_utils.filter_doc_by_keys, doc, keys)),
+        ]
+        for name, expected, actual in pairs:
+            if expected != actual:
+                failures += 1
+                if failures <= 5:
+                    print(f"MISMATCH {name} on case {i}: {doc!r}\n    expected {expected}\n    actual   {actual}")
+    docs = [random_doc(rng) for _ in range(200)]
+    batch_pairs = [
+        ("flatten_dicts", [reference_flatten_dict(d) for d in docs], dict_utils.flatten_dicts(docs)),
+        ("delete_none_docs", [reference_delete_none(d) for d in copy.deepcopy(docs)],
+         dict_utils.delete_none_docs(copy.deepcopy(docs))),
+        ("filter_docs_by_keys", [reference_filter_doc_by_keys(d, ["a", 1]) for d in docs],
+         dict_utils.filter_docs_by_keys(docs, ["a", 1])),
+    ]
+    for name, expected, actual in batch_pairs:
+        if ordered(expected) != ordered(actual):
+            failures += 1
+            print(f"MISMATCH {name}")
+    print(f"{cases} random documents, {failures} mismatches")
+    return failures
+
+
+def sample_docs(n, seed):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        if i % 2:
+            docs.append({
+                "_id": str(i), "userName": f"user_{i}", "displayName": "User", "followersCount": rng.randint(0, 10 ** 6),
+                "descriptionLinks": [f"https://x.com/{i}"], "location": None, "country": None,
+                "countLogs": {str(1_700_000_000 + day * 86400): {
+                    "followersCount": rng.randint(0, 10 ** 6), "statusesCount": rng.randint(0, 10 ** 4),
+                    "friendsCount": rng.randint(0, 5000)} for day in range(30)},
+            })
+        else:
+            docs.append({
+                "_id": str(i), "author": "1", "authorName": "user", "text": "gm " * 20, "views": None,
+                "likes": rng.randint(0, 1000), "hashTags": ["web3"], "userMentions": {"2": "someone"},
+                "retweetedTweet": {}, "quotedTweet": {"_id": "3", "authorName": "other", "text": "wagmi", "views": None},
+                "media": {"photos": ["https://pbs.twimg.com/a.jpg"], "videos": []},
+                "impressionLogs": {str(1_700_000_000 + h * 3600): {"views": h, "likes": h} for h in range(48)},
+            })
+    return docs
+
+
+def best_time(func, make_input, repeat):
+    # Inputs built outside the timed call (delete_none mutates its input)
+    times = []
+    for _ in range(repeat):
+        data = make_input()
+        begin = timeit.default_timer()
+        func(data)
+        times.append(timeit.default_timer() - begin)
+    return min(times)
+
+
+def bench(docs, repeat):
+    flats = [reference_flatten_dict(d) for d in docs]
+    keys = ["_id", "userName", "followersCount", "text"]
+    cases = [
+        ("flatten", lambda ds: [reference_flatten_dict(d) for d in ds], dict_utils.flatten_dicts, lambda: docs),
+        ("unflatten", lambda ds: [reference_reverse_flatten_dict(d) for d in ds], dict_utils.reverse_flatten_dicts,
+         lambda: flats),
+        ("delete_none", lambda ds: [reference_delete_none(d) for d in ds], dict_utils.delete_none_docs,
+         lambda: copy.deepcopy(docs)),
+        ("project", lambda ds: [reference_filter_doc_by_keys(d, keys) for d in ds],
+         lambda ds: dict_utils.filter_docs_by_keys(ds, keys), lambda: docs),
+    ]
+    print(f"{len(docs)} documents, best of {repeat}")
+    for name, reference, current, make_input in cases:
+        before = best_time(reference, make_input, repeat)
+        after = best_time(current, make_input, repeat)
+        print(f"    {name:<12} {before * 1000:8.1f}ms -> {after * 1000:8.1f}ms  ({before / after:.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000, help="random documents checked")
+    parser.add_argument("--docs", type=int, default=2000, help="documents per timed batch")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parsed = parser.parse_args()
+
+    if check(parsed.cases, parsed.seed):
+        sys.exit(1)
+    bench(sample_docs(parsed.docs, parsed.seed), parsed.repeat)
@@ -0,0 +1,188 @@
+import copy
+import re
+import threading
+
+_MISSING = object()
+
+
+def _get_path(doc, path):
+    value = doc
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def _set_path(doc, path, value):
+    # $set of a dotted key: only the leaf changes, its siblings stay
+    *parents, leaf = path.split(".")
+    for key in parents:
+        if not isinstance(doc.get(key), dict):
+            doc[key] = {}
+        doc = doc[key]
+    doc[leaf] = value
+
+
+def _compare(value, condition):
+    if not isinstance(condition, dict) or not any(k.startswith("$") for k in condition):
+        if isinstance(condition, re.Pattern):
+            return value is not _MISSING and isinstance(value, str) and bool(condition.search(value))
+        if condition is None:
+            # Like Mongo, null matches missing fields as well
+            return value is _MISSING or value is None
+        if isinstance(value, list) and not isinstance(condition, list):
+            return condition in value
+        return value is not _MISSING and value == condition
+    for op, arg in condition.items():
+        if op == "$eq" and not _compare(value, arg):
+            return False
+        if op == "$ne" and _compare(value, arg):
+            return False
+        if op == "$in" and not any(_compare(value, x) for x in arg):
+            return False
+        if op == "$nin" and any(_compare(value, x) for x in arg):
+            return False
+        if op == "$exists" and (value is not _MISSING) != bool(arg):
+            return False
+        if op == "$not" and _compare(value, arg):
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is _MISSING or value is None:
+                return False
+            try:
+                ok = {"$gt": value > arg, "$gte": value >= arg, "$lt": value < arg, "$lte": value <= arg}[op]
+            except TypeError:
+                return False
+            if not ok:
+                return False
+    return True
+
+
+def matches(doc, filter_):
+    for key, condition in (filter_ or {}).items():
+        if key == "$and":
+            if not all(matches(doc, x) for x in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, x) for x in condition):
+                return False
+        elif not _compare(_get_path(doc, key), condition):
+            return False
+    return True
+
+
+def _is_id_lookup(filter_):
+    if not filter_ or list(filter_) != ["_id"]:
+        return False
+    value = filter_["_id"]
+    return not isinstance(value, (dict, list, re.Pattern))
+
+
+def _sort_key(doc, key):
+    # Missing / None values sort first ascending, like Mongo
+    value = _get_path(doc, key)
+    if value is _MISSING or value is None:
+        return False, 0
+    return True, value
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v}
+    if include:
+        result = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k not in projection}
+
+
+class InMemoryCursor:
+    """The part of a pymongo cursor the jobs use: sort, limit, batch_size and iteration."""
+
+    def __init__(self, docs, projection=None):
+        self._docs = docs
+        self._projection = projection
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        keys = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else key_or_list
+        # Stable sorts from the last key to the first give the compound order
+        for key, order in reversed(keys):
+            self._docs.sort(key=lambda doc: _sort_key(doc, key), reverse=order == -1)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit or 0
+        return self
+
+    def batch_size(self, _):
+        return self
+
+    def __iter__(self):
+        docs = self._docs[:self._limit] if self._limit else self._docs
+        for doc in docs:
+            yield _project(doc, self._projection)
+
+
+class InMemoryExporter:
+    """
+    Stand-in for MongoDBCDP / MongoDBCentic in benchmarks: update_docs upserts by _id merging
+    fields ($set semantics), get_docs supports the filter operators the jobs use. Every
+    written document is counted per collection.
+    """
+
+    def __init__(self):
+        self.collections = {}
+        self.writes = {}
+        self._lock = threading.Lock()
+
+    def update_docs(self, collection_name, data, *args, **kwargs):
+        with self._lock:
+            collection = self.collections.setdefault(collection_name, {})
+            for doc in data:
+                doc = copy.deepcopy(doc)
+                _id = doc.get("_id")
+                if _id is None:
+                    _id = doc["_id"] = len(collection)
+                stored = collection.setdefault(_id, {})
+                for key, value in doc.items():
+                    _set_path(stored, key, value)
+            self.writes[collection_name] = self.writes.get(collection_name, 0) + len(data)
+
+    def get_docs(self, collection, filter_=None, projection=None, *args, **kwargs):
+        with self._lock:
+            docs = self.collections.get(collection, {})
+            if _is_id_lookup(filter_):
+                # Lookups by _id (configs, checkpoints, users) do not scan the collection
+                doc = docs.get(filter_["_id"])
+                docs = [doc] if doc is not None else []
+            else:
+                docs = [doc for doc in docs.values() if matches(doc, filter_)]
+        return InMemoryCursor(docs, projection)
+
+    def get_doc(self, collection, filter_=None, projection=None, *args, **kwargs):
+        for doc in self.get_docs(collection, filter_=filter_, projection=projection).limit(1):
+            return doc
+        return None
+
+    def count(self, collection):
+        return len(self.collections.get(collection, {}))
+
+
+class NullExporter:
+    """
+    Exporter that drops every write, for conversion throughput at scales (1M messages) that
+    do not fit in memory. Reads find nothing.
+    """
+
+    def update_docs(self, collection_name, data, *args, **kwargs):
+        return None
+
+    def get_docs(self, collection, filter_=None, projection=None, *args, **kwargs):
+        return InMemoryCursor([], projection)
+
+    def get_doc(self, collection, filter_=None, projection=None, *args, **kwargs):
+        return None
@@ -0,0 +1,76 @@
+"""
+Startup budget check for the CLI entrypoint.
+
+Runs `python -X importtime run.py <args>` for a few cheap invocations, sums the cumulative
+import time of top level modules and fails (exit 1) when a case goes over its budget or
+imports one of the heavy crawler dependencies. Run from the directory holding run.py:
+
+    python src/benchmarks/startup_importtime.py --budget-ms 300
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+HEAVY_MODULES = ("telethon", "twscrape", "pycountry", "selenium", "pymongo", "pandas")
+
+CASES = [
+    ("--help",),
+    ("twitter_growing3_crawler", "--help"),
+    ("twitter_projects_crawler", "--help"),
+    ("telegram_projects_crawler", "--help"),
+    ("mongo_index_advisor", "--help"),
+    ("job_runner", "--help"),
+]
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """
+    Returns:
+        (total cumulative microseconds of top level imports, {module: cumulative us})
+    """
+    modules = {}
+    total = 0
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        modules[module] = cumulative
+        if indent == 1:
+            total += cumulative
+    return total, modules
+
+
+def run_case(args, cwd):
+    process = subprocess.run([sys.executable, "-X", "importtime", "run.py", *args], cwd=cwd,
+                             capture_output=True, text=True)
+    total, modules = parse_importtime(process.stderr)
+    return process.returncode, total, modules
+
+
+def check(budget_ms, cwd, top=5):
+    failed = False
+    for args in CASES:
+        returncode, total, modules = run_case(args, cwd)
+        heavy = sorted({m.split(".")[0] for m in modules} & set(HEAVY_MODULES))
+        over = total / 1000 > budget_ms
+        status = "FAIL" if over or heavy or returncode else "ok"
+        failed |= status == "FAIL"
+        print(f"[{status}] run.py {' '.join(args)}: {total / 1000:.0f}ms (budget {budget_ms}ms), exit {returncode}")
+        if heavy:
+            print(f"    heavy modules imported: {', '.join(heavy)}")
+        slowest = sorted(((us, m) for m, us in modules.items() if "." not in m), reverse=True)[:top]
+        print("    slowest: " + ", ".join(f"{m} {us / 1000:.0f}ms" for us, m in slowest))
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=300)
+    parser.add_argument("--cwd", default=os.getcwd(), help="directory holding run.py")
+    parsed = parser.parse_args()
+    sys.exit(0 if check(parsed.budget_ms, parsed.cwd) else 1)
@@ -0,0 +1,314 @@
+"""
+Fake TelegramClient for benchmarks: serves synthetic or recorded Message / User TL objects for
+iter_messages, iter_participants, GetFullChannelRequest and GetParticipantRequest, in request
+sized batches with a simulated latency and injectable FloodWaitErrors.
+"""
+import asyncio
+import os
+import random
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+
+from telethon.errors import FloodWaitError
+from telethon.extensions import BinaryReader
+from telethon.tl import types
+from telethon.tl.functions.channels import GetFullChannelRequest, GetParticipantRequest
+from telethon.tl.types import channels, messages
+
+WORDS = ["gm", "airdrop", "staking", "mainnet", "wen", "token", "bridge", "listing", "soon", "ser", "pool", "apr"]
+EMOTICONS = ["👍", "🔥", "❤", "🎉", "🚀"]
+
+
+def _date(timestamp):
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+
+
+def synthetic_photo(index):
+    return types.Photo(
+        id=7_000_000_000 + index, access_hash=index, file_reference=b"", date=_date(0), dc_id=1,
+        sizes=[types.PhotoSize(type="x", w=800, h=600, size=photo_bytes_size(index))])
+
+
+def photo_bytes_size(index):
+    return 20_000 + index % 50 * 1_000
+
+
+def photo_bytes(photo_id):
+    # Deterministic content, a photo id always downloads the same bytes
+    return random.Random(photo_id).randbytes(photo_bytes_size(photo_id - 7_000_000_000))
+
+
+class SyntheticChannel:
+    """
+    Deterministic channel: messages ids 1..n_messages spread evenly over the last history
+    seconds (newest first, like iter_messages), n_members members sending them.
+    """
+
+    def __init__(self, channel_id, username, n_messages=10_000, n_members=1_000, history=30 * 24 * 3600,
+                 seed=0, now=None, media_rate=0.0, media_pool=1_000):
+        self.channel_id = channel_id
+        self.username = username
+        self.n_messages = n_messages
+        self.n_members = n_members
+        self.history = history
+        self.seed = seed
+        self.now = int(now or time.time())
+        # Photos are drawn from a pool shared by every channel, like forwarded media
+        self.media_rate = media_rate
+        self.media_pool = media_pool
+
+    def _rng(self, key):
+        return random.Random(zlib.crc32(f"{self.seed}:{self.channel_id}:{key}".encode()))
+
+    def user_id(self, index):
+        return 5_000_000_000 + self.channel_id % 1_000_000 * 1_000_000 + index
+
+    def user(self, index, rng=None):
+        rng = rng or self._rng(f"user:{index}")
+        user_id = self.user_id(index)
+        bot = rng.random() < 0.01
+        return types.User(
+            id=user_id,
+            access_hash=rng.getrandbits(63),
+            first_name=rng.choice(["An", "Binh", "Chris", "Dana", "Eli", "Fatima", "Giang"]),
+            last_name=rng.choice([None, "Nguyen", "Smith", "Tran", "Ivanov"]),
+            username=f"member_{user_id}" if rng.random() < 0.7 else None,
+            bot=bot,
+            bot_info_version=1 if bot else None,
+            premium=rng.random() < 0.1,
+            verified=False,
+            status=types.UserStatusOffline(was_online=_date(self.now - rng.randint(0, self.history)))
+            if rng.random() < 0.5 else types.UserStatusRecently(),
+        )
+
+    def message(self, msg_id, rng):
+        step = self.history / max(self.n_messages, 1)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 60)))
+        entities = None
+        if rng.random() < 0.2:
+            entities = [types.MessageEntityUrl(offset=0, length=min(len(text), 12))]
+        # Telegram sends views and forwards together (serializing one without the other fails)
+        views = forwards = None
+        if rng.random() < 0.3:
+            views, forwards = rng.randint(0, 50_000), rng.randint(0, 500)
+        reactions = None
+        if rng.random() < 0.4:
+            reactions = types.MessageReactions(results=[
+                types.ReactionCount(reaction=types.ReactionEmoji(emoticon=emoticon), count=rng.randint(1, 300))
+                for emoticon in rng.sample(EMOTICONS, rng.randint(1, 3))
+            ])
+        media = None
+        if self.media_rate and rng.random() < self.media_rate:
+            media = types.MessageMediaPhoto(photo=synthetic_photo(rng.randrange(self.media_pool)))
+        return types.Message(
+            id=msg_id,
+            media=media,
+            peer_id=types.PeerChannel(channel_id=self.channel_id),
+            date=_date(self.now - (self.n_messages - msg_id) * step),
+            message=text,
+            out=False,
+            post=rng.random() < 0.1,
+            from_id=types.PeerUser(user_id=self.user_id(rng.randrange(max(self.n_members, 1)))),
+            entities=entities,
+            views=views,
+            forwards=forwards,
+            reactions=reactions,
+            replies=types.MessageReplies(replies=rng.randint(0, 50), replies_pts=0) if rng.random() < 0.3 else None,
+            reply_to=types.MessageReplyHeader(reply_to_msg_id=rng.randint(1, msg_id))
+            if msg_id > 1 and rng.random() < 0.3 else None,
+        )
+
+    def messages(self, offset_id=0):
+        # offset_id: only messages older than it, 0 for the newest ones
+        start = min(offset_id - 1, self.n_messages) if offset_id else self.n_messages
+        rng = self._rng(f"messages:{start}")
+        for msg_id in range(start, 0, -1):
+            yield self.message(msg_id, rng)
+
+    def participants(self):
+        rng = self._rng("participants")
+        for index in range(self.n_members):
+            yield self.user(index, rng)
+
+    def participant(self, user_id):
+        index = user_id - self.user_id(0)
+        if 0 <= index < self.n_members:
+            return self.user(index)
+        return None
+
+    def counts(self):
+        return self.n_members, self.n_members // 50
+
+
+class RecordedChannel:
+    """
+    Channel saved by record_channel: <directory>/messages.bin and participants.bin hold the
+    serialized TL objects (bytes(obj)), newest message first, each prefixed by its length.
+    """
+
+    def __init__(self, directory, channel_id=None, username=None):
+        self.directory = directory
+        self._messages = list(self._read("messages.bin"))
+        self._members = {user.id: user for user in self._read("participants.bin")}
+        first = self._messages[0] if self._messages else None
+        self.channel_id = channel_id or (first.peer_id.channel_id if first else 0)
+        self.username = username or os.path.basename(os.path.normpath(directory))
+
+    def _read(self, file_name):
+        path = os.path.join(self.directory, file_name)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        position = 0
+        while position < len(data):
+            (length,) = struct.unpack_from("<I", data, position)
+            position += 4
+            yield BinaryReader(data[position:position + length]).tgread_object()
+            position += length
+
+    def messages(self, offset_id=0):
+        for message in self._messages:
+            if not offset_id or message.id < offset_id:
+                yield message
+
+    def participants(self):
+        yield from self._members.values()
+
+    def participant(self, user_id):
+        return self._members.get(user_id)
+
+    def counts(self):
+        return len(self._members), 0
+
+
+async def record_channel(client, entity, directory, messages_limit=10_000, participants_limit=10_000):
+    """Save messages and participants of entity with a real (logged in) TelegramClient, for RecordedChannel."""
+    os.makedirs(directory, exist_ok=True)
+    for file_name, items in (("messages.bin", client.iter_messages(entity, limit=messages_limit)),
+                             ("participants.bin", client.iter_participants(entity, limit=participants_limit))):
+        with open(os.path.join(directory, file_name), "wb") as f:
+            async for item in items:
+                # Drop the custom Message wrapper state, keep the raw TL object
+                data = bytes(item)
+                f.write(struct.pack("<I", len(data)))
+                f.write(data)
+
+
+class FakeTelegramClient:
+    """
+    The part of TelegramClient the crawling jobs use, over channels {channel_id: SyntheticChannel
+    / RecordedChannel}. Each request (a batch of messages_per_request messages or
+    participants_per_request members, or one RPC) waits latency seconds. Every
+    flood_wait_every-th request of a kind gets a flood wait of flood_wait_seconds: slept through
+    when under flood_sleep_threshold, raised as FloodWaitError otherwise, like Telethon.
+    """
+
+    def __init__(self, channels_, latency=0.0, jitter=0.5, messages_per_request=100, participants_per_request=200,
+                 flood_wait_every=None, flood_wait_seconds=5, flood_sleep_threshold=60, seed=0):
+        self.channels = {channel.channel_id: channel for channel in channels_}
+        self.usernames = {channel.username.lower(): channel for channel in channels_}
+        self.latency = latency
+        self.jitter = jitter
+        self.messages_per_request = messages_per_request
+        self.participants_per_request = participants_per_request
+        self.flood_wait_every = flood_wait_every
+        self.flood_wait_seconds = flood_wait_seconds
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.rng = random.Random(seed)
+        self.requests = {}
+        self.flood_waits = 0
+
+    @property
+    def loop(self):
+        return asyncio.get_event_loop()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+    def _channel(self, entity):
+        if isinstance(entity, str):
+            channel = self.usernames.get(entity.lower().split("t.me/")[-1])
+        else:
+            channel = self.channels.get(getattr(entity, "channel_id", entity))
+        if channel is None:
+            raise ValueError(f"Cannot find any entity corresponding to {entity}")
+        return channel
+
+    async def _request(self, name, produce):
+        count = self.requests[name] = self.requests.get(name, 0) + 1
+        if self.flood_wait_every and not count % self.flood_wait_every:
+            self.flood_waits += 1
+            if self.flood_wait_seconds > self.flood_sleep_threshold:
+                raise FloodWaitError(request=None, capture=self.flood_wait_seconds)
+            await asyncio.sleep(self.flood_wait_seconds)
+        begin = time.perf_counter()
+        result = produce()
+        # Building the objects is part of the simulated latency
+        delay = self.latency * (1 + self.jitter * (2 * self.rng.random() - 1))
+        await asyncio.sleep(max(delay - (time.perf_counter() - begin), 0))
+        return result
+
+    async def _iter_batches(self, name, items, batch_size, limit):
+        served = 0
+        while limit is None or served < limit:
+            size = batch_size if limit is None else min(batch_size, limit - served)
+            batch = await self._request(name, lambda: [x for _, x in zip(range(size), items)])
+            for item in batch:
+                yield item
+            served += len(batch)
+            if len(batch) < size:
+                return
+
+    async def download_media(self, message, file=None, **kwargs):
+        photo = getattr(message.media, "photo", None)
+        if photo is None:
+            return None
+        data = await self._request("GetFileRequest", lambda: photo_bytes(photo.id))
+        with open(file, "wb") as f:
+            f.write(data)
+        return file
+
+    async def iter_dialogs(self, *args, **kwargs):
+        return
+        yield
+
+    def iter_messages(self, entity, limit=None, offset_id=0, **kwargs):
+        items = self._channel(entity).messages(offset_id)
+        return self._iter_batches("GetHistoryRequest", items, self.messages_per_request, limit)
+
+    def iter_participants(self, entity, limit=None, **kwargs):
+        items = self._channel(entity).participants()
+        return self._iter_batches("GetParticipantsRequest", items, self.participants_per_request, limit)
+
+    async def __call__(self, request):
+        if isinstance(request, GetFullChannelRequest):
+            return await self._request("GetFullChannelRequest", lambda: self._full_channel(request.channel))
+        if isinstance(request, GetParticipantRequest):
+            return await self._request("GetParticipantRequest", lambda: self._participant(request))
+        raise NotImplementedError(f"{type(request).__name__} is not faked")
+
+    def _full_channel(self, entity):
+        channel = self._channel(entity)
+        participants, kicked = channel.counts()
+        return messages.ChatFull(
+            full_chat=types.ChannelFull(
+                id=channel.channel_id, about="", read_inbox_max_id=0, read_outbox_max_id=0, unread_count=0,
+                chat_photo=types.PhotoEmpty(id=0), notify_settings=types.PeerNotifySettings(), bot_info=[], pts=0,
+                participants_count=participants, kicked_count=kicked),
+            chats=[types.Channel(id=channel.channel_id, title=channel.username, photo=types.ChatPhotoEmpty(),
+                                 date=_date(0), username=channel.username, broadcast=True)],
+            users=[],
+        )
+
+    def _participant(self, request):
+        user = self._channel(request.channel).participant(int(request.participant))
+        if user is None:
+            raise ValueError("USER_NOT_PARTICIPANT")
+        return channels.ChannelParticipant(
+            participant=types.ChannelParticipant(user_id=user.id, date=_date(0)), chats=[], users=[user])
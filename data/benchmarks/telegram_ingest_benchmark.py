@@ -0,0 +1,226 @@
+"""
+Ingestion benchmark of TelegramProjectCrawlingJob without touching Telegram.
+
+Replaces the job's TelegramClient with a FakeTelegramClient serving a synthetic (default) or
+recorded channel and reports messages/s (or members/s) through convert_*_to_dict and the
+exporter, the time per stage and the peak RSS. Scenarios:
+
+    messages  update_messages_periods over --messages messages (default 1M)
+    members   update_all_users over --members members (default 200k)
+    execute   the whole execute() of one project / channel, --streams selects the streams
+
+Run from the directory holding run.py:
+
+    python src/benchmarks/telegram_ingest_benchmark.py messages
+    python src/benchmarks/telegram_ingest_benchmark.py members --exporter memory --latency 0.2
+    python src/benchmarks/telegram_ingest_benchmark.py execute --messages 20000 --members 5000 --flood-wait-every 50
+    python src/benchmarks/telegram_ingest_benchmark.py messages --record recordings/zetachain --channel zetachain
+    python src/benchmarks/telegram_ingest_benchmark.py messages --messages 20000 --media-rate 0.3 --media-dir /tmp/media --latency 0.05
+
+Synthetic data is seeded (--seed), the same arguments replay the same channel. The default
+null exporter drops documents so channel scale scenarios fit in memory.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import src  # noqa: E402,F401  (puts src/ on sys.path, like run.py)
+from benchmarks.benchmark_utils import CountingExporter, peak_rss_mb  # noqa: E402
+from benchmarks.in_memory_exporter import InMemoryExporter, NullExporter  # noqa: E402
+from benchmarks.telegram_fakes import FakeTelegramClient, RecordedChannel, SyntheticChannel, record_channel  # noqa: E402
+from utils.telegram_media_utils import MediaPipeline  # noqa: E402
+from constants.mongo_constant import MongoCollection  # noqa: E402
+from constants.time_constant import TimeConstants  # noqa: E402
+from utils.checkpoint_utils import CheckpointStore  # noqa: E402
+from utils.metrics_utils import InstrumentedExporter  # noqa: E402
+from utils.profiling_utils import RunProfiler  # noqa: E402
+
+SCENARIOS = ["messages", "members", "execute"]
+DEFAULT_SIZES = {"messages": (1_000_000, 1_000), "members": (0, 200_000), "execute": (10_000, 2_000)}
+PROJECT = "benchmark"
+CHANNEL_ID = 1_585_021_118
+
+
+def build_channel(args):
+    if args.recordings:
+        return RecordedChannel(args.recordings, username=args.channel)
+    default_messages, default_members = DEFAULT_SIZES[args.scenario]
+    return SyntheticChannel(
+        CHANNEL_ID, args.channel,
+        n_messages=default_messages if args.messages is None else args.messages,
+        n_members=default_members if args.members is None else args.members,
+        history=args.history, seed=args.seed, media_rate=args.media_rate, media_pool=args.media_pool)
+
+
+def build_exporter(args):
+    if args.exporter == "mongo":
+        from databases.mongodb_cdp import MongoDBCDP
+
+        return MongoDBCDP(connection_url=args.mongo_url, database=args.mongo_database)
+    if args.exporter == "memory":
+        return InMemoryExporter()
+    return NullExporter()
+
+
+def build_job(args, client, exporter, channel):
+    from telethon.sessions import MemorySession
+
+    from src.jobs.telegram_projects_crawling_job import TelegramProjectCrawlingJob
+
+    centic = InMemoryExporter()
+    centic.update_docs("projects", [{"_id": PROJECT, "projectId": PROJECT, "settings": {"socialMedia": [{
+        "platform": "telegram", "type": "channel", "id": channel.username,
+        "url": f"https://t.me/{channel.username}", "telegramId": str(channel.channel_id),
+    }]}}])
+    # MemorySession: no .session file, the client is swapped for the fake right away
+    job = TelegramProjectCrawlingJob(
+        interval=TimeConstants.A_DAY, period=args.period, projects=[PROJECT], exporter=exporter,
+        mongodb_centic=centic, api_id="1", api_hash="benchmark", session_id=MemorySession(),
+        stream_types=args.streams, media_dir=args.media_dir, media_workers=args.media_workers)
+    job.client = client
+    return job
+
+
+async def run_scenario(args, job, channel, timings):
+    if args.scenario == "messages":
+        # execute() starts the media pipeline itself, this scenario calls the stream directly
+        if args.media_dir:
+            job.media_pipeline = MediaPipeline(job.client, job.exporter, args.media_dir, workers=args.media_workers)
+            job.media_pipeline.start()
+        try:
+            # Counted here, media hash updates are telegram_messages writes as well
+            timings["messages"] = await job.update_messages_periods(PROJECT, channel.username, channel.channel_id)
+            return timings["messages"]
+        finally:
+            timings["ingested"] = time.perf_counter()
+            if job.media_pipeline:
+                await job.media_pipeline.close()
+    if args.scenario == "members":
+        return await job.update_all_users(PROJECT, channel.username, channel.channel_id)
+    with CheckpointStore(job.exporter, f"benchmark_{int(time.time())}") as job.checkpoints:
+        await job.execute()
+    return None
+
+
+def benchmark(args):
+    channel = build_channel(args)
+    client = FakeTelegramClient(
+        [channel], latency=args.latency, jitter=args.jitter, messages_per_request=args.messages_per_request,
+        participants_per_request=args.participants_per_request, flood_wait_every=args.flood_wait_every,
+        flood_wait_seconds=args.flood_wait_seconds, flood_sleep_threshold=args.flood_sleep_threshold, seed=args.seed)
+    counting = CountingExporter(build_exporter(args))
+    job = build_job(args, client, InstrumentedExporter(counting), channel)
+
+    profiler = RunProfiler(f"benchmark_telegram_{args.scenario}")
+    profiler.start()
+    begin = time.perf_counter()
+    error = None
+    timings = {}
+    try:
+        asyncio.run(run_scenario(args, job, channel, timings))
+    except Exception as ex:
+        # e.g. a FloodWaitError over --flood-sleep-threshold, report what was ingested until then
+        error = repr(ex)
+    finally:
+        wall = time.perf_counter() - begin
+        stages = profiler.stop()["stages"]
+    ingest = timings.get("ingested", begin + wall) - begin
+    messages = timings.get("messages", counting.writes.get(MongoCollection.telegram_messages, 0))
+    members = counting.writes.get(MongoCollection.telegram_users, 0)
+    return {
+        "scenario": args.scenario,
+        "exporter": args.exporter,
+        "seconds": wall,
+        "messages": messages,
+        "messages_per_second": messages / ingest if ingest else 0.0,
+        "ingest_seconds": ingest,
+        "media": job.media_pipeline.stats if job.media_pipeline else None,
+        "members": members,
+        "members_per_second": members / wall if wall else 0.0,
+        "requests": client.requests,
+        "flood_waits": client.flood_waits,
+        "writes": counting.writes,
+        "stages": {stage: round(stats["total"], 3) for stage, stats in stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "error": error,
+    }
+
+
+def print_result(result):
+    print(f"[{result['scenario']}] {result['messages']} messages, {result['members']} members "
+          f"in {result['seconds']:.2f}s ({result['exporter']})")
+    print(f"    {result['messages_per_second']:.0f} messages/s, {result['members_per_second']:.0f} members/s, "
+          f"peak RSS {result['peak_rss_mb']:.0f}MB")
+    print(f"    requests {result['requests']}, {result['flood_waits']} flood waits")
+    if result["media"]:
+        print(f"    ingestion {result['ingest_seconds']:.2f}s, media {result['media']}")
+    if result["stages"]:
+        print("    stages: " + ", ".join(f"{stage} {total:.2f}s" for stage, total in result["stages"].items()))
+    if result["error"]:
+        print(f"    stopped by {result['error']}")
+
+
+def record(args):
+    from telethon import TelegramClient
+
+    from constants.config import AccountConfig
+
+    async def _record():
+        async with TelegramClient(args.session_id, int(AccountConfig.TELE_API_ID), AccountConfig.TELE_API_HASH) as client:
+            await record_channel(client, args.channel, args.record,
+                                 messages_limit=args.messages or 10_000, participants_limit=args.members or 10_000)
+
+    asyncio.run(_record())
+    print(f"Recorded {args.channel} to {args.record}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=SCENARIOS)
+    parser.add_argument("--messages", type=int, default=None, help="synthetic channel size")
+    parser.add_argument("--members", type=int, default=None, help="synthetic member count")
+    parser.add_argument("--history", type=int, default=TimeConstants.DAYS_30,
+                        help="seconds the synthetic messages are spread over")
+    parser.add_argument("--period", type=int, default=TimeConstants.DAYS_7, help="period of the job")
+    parser.add_argument("--streams", nargs="+", default=["messages", "new_users", "users"],
+                        help="streams of the execute scenario")
+    parser.add_argument("--channel", default="benchmark_channel", help="channel username")
+    parser.add_argument("--recordings", default=None, help="replay a channel saved with --record instead")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency varies by +/- this share")
+    parser.add_argument("--messages-per-request", type=int, default=100)
+    parser.add_argument("--participants-per-request", type=int, default=200)
+    parser.add_argument("--flood-wait-every", type=int, default=None, help="every n-th request of a kind floods")
+    parser.add_argument("--flood-wait-seconds", type=float, default=1)
+    parser.add_argument("--flood-sleep-threshold", type=float, default=60,
+                        help="longer flood waits raise FloodWaitError instead of sleeping")
+    parser.add_argument("--media-rate", type=float, default=0.0, help="share of synthetic messages with a photo")
+    parser.add_argument("--media-pool", type=int, default=1_000, help="distinct photos, smaller means more forwards")
+    parser.add_argument("--media-dir", default=None, help="download media here with the media pipeline")
+    parser.add_argument("--media-workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exporter", choices=["null", "memory", "mongo"], default="null")
+    parser.add_argument("--mongo-url", default=None, help="mongod used by --exporter mongo")
+    parser.add_argument("--mongo-database", default="cdp_benchmark")
+    parser.add_argument("--output", default=None, help="also write the result as JSON here")
+    parser.add_argument("--record", default=None, help="record --channel with the real client to this directory")
+    parser.add_argument("--session-id", default="telegram", help="Telethon session used by --record")
+    parser.add_argument("--verbose", action="store_true", help="keep the job's info logs")
+    parsed = parser.parse_args()
+
+    if parsed.record:
+        record(parsed)
+        sys.exit(0)
+    if not parsed.verbose:
+        logging.disable(logging.INFO)
+    result = benchmark(parsed)
+    print_result(result)
+    if parsed.output:
+        with open(parsed.output, "w") as f:
+            json.dump(result, f, indent=2)
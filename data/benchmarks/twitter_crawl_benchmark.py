@@ -0,0 +1,197 @@
+"""
+Throughput benchmark of the twitter crawlers without touching Twitter.
+
+Drives TwitterGrowing3CrawlingJob.crawl and TwitterProjectCrawlingJob.execute with a
+FakeNewAPi replaying synthetic (default) or recorded GraphQL responses, writing to an
+in-memory exporter or to a local mongod (--mongo-url), and reports accounts/s, docs/s,
+p50/p99 per-account latency, the time per stage and the peak RSS. Run from the directory
+holding run.py:
+
+    python src/benchmarks/twitter_crawl_benchmark.py --accounts 500 --latency 0.05
+    python src/benchmarks/twitter_crawl_benchmark.py --rate-limit 50 --rate-window 60 --rate-limit-wait 2
+    python src/benchmarks/twitter_crawl_benchmark.py --record recordings/ --usernames centic_io trava_finance
+    python src/benchmarks/twitter_crawl_benchmark.py --hash-cache /tmp/hashes.json.gz  # twice: unchanged docs skipped
+
+Peak RSS is the peak of the whole process, benchmark one job per run (--jobs) to compare them.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import src  # noqa: E402,F401  (puts src/ on sys.path, like run.py)
+from benchmarks.benchmark_utils import CountingExporter, peak_rss_mb, percentile  # noqa: E402
+from benchmarks.in_memory_exporter import InMemoryExporter  # noqa: E402
+from benchmarks.twitter_fakes import FakeNewAPi, RecordedResponses, SyntheticResponses, record_responses  # noqa: E402
+from constants.mongo_constant import MongoCollection  # noqa: E402
+from constants.time_constant import TimeConstants  # noqa: E402
+from utils.checkpoint_utils import CheckpointStore  # noqa: E402
+from utils.content_hash_utils import ChangeDetectingExporter, ContentHashCache  # noqa: E402
+from utils.profiling_utils import RunProfiler  # noqa: E402
+
+JOBS = ["growing3", "projects"]
+# Bookkeeping writes, not crawled documents
+EXCLUDED_COLLECTIONS = (MongoCollection.crawl_checkpoints,)
+
+
+def account_latencies(starts, end):
+    # Accounts are crawled sequentially: one lasts until the next one starts
+    times = [begin for _, begin in starts] + [end]
+    return [times[i + 1] - times[i] for i in range(len(starts))]
+
+
+def build_api(args):
+    if args.recordings:
+        responses = RecordedResponses(args.recordings)
+    else:
+        responses = SyntheticResponses(
+            tweets_per_account=args.tweets, page_size=args.page_size, max_age=args.period,
+            missing_rate=args.missing_rate, seed=args.seed)
+    return FakeNewAPi(
+        responses, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+        rate_window=args.rate_window, rate_limit_wait=args.rate_limit_wait,
+        rate_limit_mode=args.rate_limit_mode, error_rate=args.error_rate, seed=args.seed)
+
+
+def build_exporter(args):
+    if args.mongo_url:
+        from databases.mongodb_cdp import MongoDBCDP
+
+        return MongoDBCDP(connection_url=args.mongo_url, database=args.mongo_database)
+    return InMemoryExporter()
+
+
+async def run_growing3(args, api, exporter, usernames):
+    from src.jobs.twitter_growing3_crawling_job import TwitterGrowing3CrawlingJob
+
+    job = TwitterGrowing3CrawlingJob(
+        scheduler="^true@daily", interval=TimeConstants.A_DAY, period=args.period, limit=args.limit,
+        exporter=exporter, stream_types=args.streams)
+    accounts = [{"_id": str(api.responses.user_id(x)), "userName": x} for x in usernames]
+    await job.crawl(api, accounts, "fake", args.streams, exporter, args.limit, args.period)
+
+
+async def run_projects(args, api, exporter, usernames):
+    from src.jobs.twitter_projects_crawling_job import TwitterProjectCrawlingJob
+
+    job = TwitterProjectCrawlingJob(
+        interval=TimeConstants.A_DAY, period=args.period, limit=args.limit, projects=usernames,
+        projects_file=None, col_output=None, exporter=exporter, mongodb_centic=InMemoryExporter(),
+        stream_types=args.streams)
+
+    async def _get_api():
+        return api
+
+    job._get_api = _get_api
+    with CheckpointStore(exporter, f"benchmark_{int(time.time())}") as job.checkpoints:
+        await job.execute()
+
+
+RUNNERS = {"growing3": run_growing3, "projects": run_projects}
+
+
+def benchmark(job_name, args):
+    api = build_api(args)
+    exporter = CountingExporter(build_exporter(args))
+    job_exporter = exporter
+    if args.hash_cache:
+        # Counted under the change detection, only documents actually written
+        job_exporter = ChangeDetectingExporter(exporter, ContentHashCache(args.hash_cache))
+    usernames = [f"{args.prefix}{i}" for i in range(args.accounts)]
+    profiler = RunProfiler(f"benchmark_{job_name}")
+    profiler.start()
+    begin = time.perf_counter()
+    try:
+        asyncio.run(RUNNERS[job_name](args, api, job_exporter, usernames))
+    finally:
+        end = time.perf_counter()
+        stages = profiler.stop()["stages"]
+        if args.hash_cache:
+            job_exporter.save()
+    wall = end - begin
+    latencies = account_latencies(api.account_starts, end)
+    docs = sum(n for collection, n in exporter.writes.items() if collection not in EXCLUDED_COLLECTIONS)
+    return {
+        "job": job_name,
+        "exporter": "mongodb" if args.mongo_url else "in_memory",
+        "accounts": len(latencies),
+        "seconds": wall,
+        "accounts_per_second": len(latencies) / wall if wall else 0.0,
+        "docs": docs,
+        "docs_per_second": docs / wall if wall else 0.0,
+        "p50_account_seconds": percentile(latencies, 50),
+        "p99_account_seconds": percentile(latencies, 99),
+        "requests": api.requests,
+        "rate_limited": api.rate_limited,
+        "writes": exporter.writes,
+        "stages": {stage: round(stats["total"], 3) for stage, stats in stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_result(result):
+    p50, p99 = result["p50_account_seconds"] or 0, result["p99_account_seconds"] or 0
+    print(f"[{result['job']}] {result['accounts']} accounts, {result['docs']} docs in {result['seconds']:.2f}s "
+          f"({result['exporter']})")
+    print(f"    {result['accounts_per_second']:.1f} accounts/s, {result['docs_per_second']:.1f} docs/s, "
+          f"per account p50 {p50 * 1000:.0f}ms p99 {p99 * 1000:.0f}ms")
+    print(f"    {result['requests']} requests, {result['rate_limited']} rate limited, "
+          f"peak RSS {result['peak_rss_mb']:.0f}MB")
+    if result["stages"]:
+        print("    stages: " + ", ".join(f"{stage} {total:.2f}s" for stage, total in result["stages"].items()))
+
+
+def record(args):
+    from src.crawler.new_api import NewAPi
+
+    asyncio.run(record_responses(NewAPi(args.accounts_db), args.usernames, args.record, limit=args.tweets))
+    print(f"Recorded {len(args.usernames)} accounts to {args.record}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", nargs="+", choices=JOBS, default=JOBS)
+    parser.add_argument("--accounts", type=int, default=200, help="accounts crawled per job")
+    parser.add_argument("--prefix", default="bench_account_", help="prefix of the fake usernames")
+    parser.add_argument("--streams", nargs="+", choices=["profiles", "tweets"], default=["profiles", "tweets"])
+    parser.add_argument("--tweets", type=int, default=40, help="tweets per synthetic account")
+    parser.add_argument("--page-size", type=int, default=20, help="tweets per synthetic UserTweets page")
+    parser.add_argument("--limit", type=int, default=None, help="tweets limit per account, like --limit of the jobs")
+    parser.add_argument("--period", type=int, default=TimeConstants.DAYS_7)
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="share of usernames that do not exist")
+    parser.add_argument("--recordings", default=None, help="replay responses saved with --record instead")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency varies by +/- this share")
+    parser.add_argument("--rate-limit", type=int, default=None, help="requests per endpoint and window")
+    parser.add_argument("--rate-window", type=float, default=900)
+    parser.add_argument("--rate-limit-wait", type=float, default=1.0, help="seconds a rate limit blocks")
+    parser.add_argument("--rate-limit-mode", choices=["wait", "error"], default="wait")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that raise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo-url", default=None, help="write to this mongod instead of memory")
+    parser.add_argument("--mongo-database", default="cdp_benchmark")
+    parser.add_argument("--hash-cache", default=None, help="skip unchanged documents, hashes persisted here")
+    parser.add_argument("--output", default=None, help="also write the results as JSON here")
+    parser.add_argument("--record", default=None, help="record real responses of --usernames to this directory")
+    parser.add_argument("--usernames", nargs="+", default=[])
+    parser.add_argument("--accounts-db", default="accounts.db", help="twscrape accounts db used by --record")
+    parser.add_argument("--verbose", action="store_true", help="keep the jobs' info logs")
+    parsed = parser.parse_args()
+
+    if parsed.record:
+        record(parsed)
+        sys.exit(0)
+    if not parsed.verbose:
+        logging.disable(logging.INFO)
+    results = []
+    for name in parsed.jobs:
+        results.append(benchmark(name, parsed))
+        print_result(results[-1])
+    if parsed.output:
+        with open(parsed.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,305 @@
+"""
+Fake twscrape transport for benchmarks: NewAPi with the HTTP layer (_gql_item / _gql_items of
+twscrape.API) replaced by recorded or synthetic GraphQL responses. twscrape's parsers and
+NewAPi's own wrappers still run, so the cost of json -> User / Tweet is part of the measure.
+"""
+import asyncio
+import email.utils
+import json
+import os
+import random
+import time
+import zlib
+
+from twscrape import API, NoAccountError, parse_user
+
+from src.crawler.new_api import NewAPi
+from utils.metrics_utils import observe_rate_limit
+
+USER_OP = "UserByScreenName"
+TWEETS_OP = "UserTweets"
+
+
+class FakeResponse:
+    """The part of httpx.Response the twscrape parsers use."""
+
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def _user_obj(user_id, login, rng):
+    return {
+        "__typename": "User",
+        "rest_id": str(user_id),
+        "legacy": {
+            "id_str": str(user_id),
+            "screen_name": login,
+            "name": login.title(),
+            "description": f"Building on #web3 since {rng.randint(2009, 2024)}",
+            "created_at": email.utils.formatdate(rng.randint(1_230_000_000, 1_700_000_000)),
+            "followers_count": rng.randint(0, 2_000_000),
+            "friends_count": rng.randint(0, 5000),
+            "statuses_count": rng.randint(0, 50_000),
+            "favourites_count": rng.randint(0, 100_000),
+            "listed_count": rng.randint(0, 1000),
+            "media_count": rng.randint(0, 5000),
+            "location": rng.choice(["", "Singapore", "Ha Noi, Vietnam", "Berlin", "New York, USA", "Metaverse"]),
+            "profile_image_url_https": f"https://pbs.twimg.com/profile_images/{user_id}/avatar.jpg",
+            "verified": False,
+        },
+        "is_blue_verified": rng.random() < 0.3,
+    }
+
+
+def _tweet_obj(tweet_id, user, timestamp, rng):
+    legacy = {
+        "id_str": str(tweet_id),
+        "user_id_str": user["rest_id"],
+        "conversation_id_str": str(tweet_id),
+        "created_at": email.utils.formatdate(timestamp),
+        "full_text": " ".join(rng.choice(["gm", "wagmi", "airdrop", "staking", "$ETH", "mainnet", "soon"])
+                              for _ in range(rng.randint(5, 40))),
+        "lang": "en",
+        "reply_count": rng.randint(0, 500),
+        "retweet_count": rng.randint(0, 2000),
+        "favorite_count": rng.randint(0, 10_000),
+        "quote_count": rng.randint(0, 200),
+        "bookmark_count": rng.randint(0, 300),
+        "entities": {
+            "hashtags": [{"text": tag} for tag in rng.sample(["web3", "defi", "nft", "btc", "eth"], rng.randint(0, 3))],
+            "symbols": [],
+            "user_mentions": [],
+            "urls": [],
+        },
+    }
+    if rng.random() < 0.2:
+        legacy["extended_entities"] = {"media": [{
+            "type": "photo",
+            "media_url_https": f"https://pbs.twimg.com/media/{tweet_id}.jpg",
+        }]}
+    return {
+        "__typename": "Tweet",
+        "rest_id": str(tweet_id),
+        "core": {"user_results": {"result": user}},
+        "views": {"count": str(rng.randint(0, 1_000_000))},
+        "legacy": legacy,
+    }
+
+
+def _timeline_page(entries, cursor):
+    if cursor is not None:
+        entries = [*entries, {"entryId": f"cursor-bottom-{cursor}",
+                              "content": {"cursorType": "Bottom", "value": cursor}}]
+    return {"data": {"user": {"result": {"timeline_v2": {"timeline": {"instructions": [
+        {"type": "TimelineAddEntries", "entries": entries},
+    ]}}}}}}
+
+
+class SyntheticResponses:
+    """
+    Deterministic fake accounts: the same login always gets the same profile and tweets,
+    tweets spread over the last max_age seconds. missing_rate of the logins do not exist.
+    """
+
+    def __init__(self, tweets_per_account=40, page_size=20, max_age=14 * 24 * 3600, missing_rate=0.0, seed=0):
+        self.tweets_per_account = tweets_per_account
+        self.page_size = page_size
+        self.max_age = max_age
+        self.missing_rate = missing_rate
+        self.seed = seed
+        self._logins = {}
+
+    def _rng(self, key):
+        return random.Random(zlib.crc32(f"{self.seed}:{key}".encode()))
+
+    def user_id(self, login):
+        return 10 ** 9 + zlib.crc32(login.lower().encode())
+
+    def user(self, login):
+        rng = self._rng(login.lower())
+        if rng.random() < self.missing_rate:
+            return {"data": {}}
+        user_id = self.user_id(login)
+        self._logins[str(user_id)] = login
+        return {"data": {"user": {"result": _user_obj(user_id, login, rng)}}}
+
+    def tweet_pages(self, user_id):
+        login = self._logins.get(str(user_id))
+        if login is None:
+            return []
+        user_id = int(user_id)
+        rng = self._rng(f"tweets:{login.lower()}")
+        user = _user_obj(user_id, login, self._rng(login.lower()))
+        # Hour aligned, runs within the same hour replay identical tweets (see --hash-cache)
+        now = int(time.time()) // 3600 * 3600
+        tweets = [
+            _tweet_obj(user_id * 1000 + i, user, now - rng.randint(0, self.max_age), rng)
+            for i in range(self.tweets_per_account)
+        ]
+        pages = []
+        for begin in range(0, len(tweets), self.page_size):
+            chunk = tweets[begin:begin + self.page_size]
+            entries = [{"entryId": f"tweet-{x['rest_id']}",
+                        "content": {"itemContent": {"tweet_results": {"result": x}}}} for x in chunk]
+            last = begin + self.page_size >= len(tweets)
+            pages.append(_timeline_page(entries, None if last else f"{user_id}-{begin}"))
+        return pages
+
+
+class RecordedResponses:
+    """
+    Responses saved by record_responses: <directory>/<login>/UserByScreenName.json and
+    UserTweets_<page>.json. Logins that were not recorded are served one of the recordings.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.logins = sorted(x for x in os.listdir(directory) if os.path.isdir(os.path.join(directory, x)))
+        if not self.logins:
+            raise ValueError(f"No recordings in {directory}")
+        self._by_user_id = {}
+
+    def _recorded_login(self, login):
+        if login in self.logins:
+            return login
+        return self.logins[zlib.crc32(login.lower().encode()) % len(self.logins)]
+
+    def user_id(self, login):
+        body = self.user(login)
+        return int((((body.get("data") or {}).get("user") or {}).get("result") or {}).get("rest_id") or 0)
+
+    def user(self, login):
+        recorded = self._recorded_login(login)
+        with open(os.path.join(self.directory, recorded, f"{USER_OP}.json")) as f:
+            body = json.load(f)
+        user_id = (((body.get("data") or {}).get("user") or {}).get("result") or {}).get("rest_id")
+        if user_id is not None:
+            self._by_user_id[str(user_id)] = recorded
+        return body
+
+    def tweet_pages(self, user_id):
+        recorded = self._by_user_id.get(str(user_id))
+        if recorded is None:
+            return []
+        folder = os.path.join(self.directory, recorded)
+        pages = []
+        for file_name in sorted(x for x in os.listdir(folder) if x.startswith(TWEETS_OP)):
+            with open(os.path.join(folder, file_name)) as f:
+                pages.append(json.load(f))
+        return pages
+
+
+class ReplayTransport(API):
+    """
+    twscrape.API whose GraphQL calls are answered by a responses source (SyntheticResponses /
+    RecordedResponses) after a simulated latency. Every rate_limit requests of an endpoint
+    within rate_window seconds trigger a rate limit: a rate_limit_wait pause ("wait", like the
+    pool waiting for an account) or NoAccountError ("error", like raise_when_no_account).
+    error_rate of the requests fail.
+    """
+
+    def __init__(self, responses, latency=0.05, jitter=0.5, rate_limit=None, rate_window=900,
+                 rate_limit_wait=1.0, rate_limit_mode="wait", error_rate=0.0, seed=0):
+        # No pool, no http client: nothing here goes to the network
+        self.pool = None
+        self.debug = False
+        self.proxy = None
+        self.responses = responses
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rate_limit_wait = rate_limit_wait
+        self.rate_limit_mode = rate_limit_mode
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.account_starts = []
+        self._windows = {}
+
+    async def _respond(self, endpoint, produce):
+        # Returns the body, callers wrap it in a FakeResponse
+        self.requests += 1
+        await self._check_rate_limit(endpoint)
+        begin = time.perf_counter()
+        body = produce()
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"Injected {endpoint} failure")
+        # Building the response is part of the simulated latency
+        delay = self.latency * (1 + self.jitter * (2 * self.rng.random() - 1))
+        await asyncio.sleep(max(delay - (time.perf_counter() - begin), 0))
+        return body
+
+    async def _check_rate_limit(self, endpoint):
+        if not self.rate_limit:
+            return
+        now = time.monotonic()
+        window_start, count = self._windows.get(endpoint, (now, 0))
+        if now - window_start >= self.rate_window:
+            window_start, count = now, 0
+        if count >= self.rate_limit:
+            self.rate_limited += 1
+            observe_rate_limit(endpoint, "fake", self.rate_limit_wait)
+            if self.rate_limit_mode == "error":
+                raise NoAccountError(f"No account available for queue {endpoint}")
+            await asyncio.sleep(self.rate_limit_wait)
+            window_start, count = time.monotonic(), 0
+        self._windows[endpoint] = (window_start, count + 1)
+
+    async def _gql_item(self, op, kv, ft=None):
+        endpoint = op.split("/")[-1]
+        if endpoint != USER_OP:
+            raise NotImplementedError(f"{endpoint} is not replayed")
+        login = kv["screen_name"]
+        # Accounts are crawled one after another, a new login marks the start of the next one
+        if not self.account_starts or self.account_starts[-1][0] != login:
+            self.account_starts.append((login, time.perf_counter()))
+        return FakeResponse(await self._respond(endpoint, lambda: self.responses.user(login)))
+
+    async def _gql_items(self, op, kv, ft=None, limit=-1, cursor_type="Bottom"):
+        endpoint = op.split("/")[-1]
+        if endpoint != TWEETS_OP:
+            raise NotImplementedError(f"{endpoint} is not replayed")
+        # The first request also builds every page, later pages are one request each
+        pages = await self._respond(endpoint, lambda: self.responses.tweet_pages(kv["userId"]))
+        count = 0
+        for index, body in enumerate(pages):
+            if index:
+                body = await self._respond(endpoint, lambda: body)
+            count += len(self._gql_entries(body))
+            yield FakeResponse(body)
+            if limit > 0 and count >= limit:
+                return
+
+
+class FakeNewAPi(NewAPi, ReplayTransport):
+    """NewAPi over ReplayTransport: NewAPi's wrappers call into the replayed responses."""
+
+
+async def record_responses(api, logins, directory, limit=40):
+    """
+    Save the raw UserByScreenName and UserTweets responses of logins with a real (logged in)
+    API, for RecordedResponses.
+    """
+    for login in logins:
+        rep = await api.user_by_login_raw(login)
+        if rep is None:
+            continue
+        folder = os.path.join(directory, login)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{USER_OP}.json"), "w") as f:
+            json.dump(rep.json(), f)
+        user = parse_user(rep)
+        if user is None:
+            continue
+        page = 0
+        async for rep in api.user_tweets_raw(user.id, limit=limit):
+            with open(os.path.join(folder, f"{TWEETS_OP}_{page:03d}.json"), "w") as f:
+                json.dump(rep.json(), f)
+            page += 1
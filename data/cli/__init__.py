@@ -1,31 +1,60 @@
+import importlib
+
 import click
 
-from src.cli.telegram_projects_crawler import telegram_projects_crawler
-from src.cli.twitter_projects_crawler import twitter_projects_crawler
-from src.cli.update_twitter_projects_followings import update_twitter_projects_followings
-from src.cli.twitter_projects_crawler_v2 import twitter_projects_crawler_v2
-from src.cli.discord_project_crawler import discord_projects_crawler
-from src.cli.update_discord_project_crawler import update_discord
-from src.cli.twitter_growing3_crawler import twitter_growing3_crawler
-from src.cli.topic_growing3_crawler import topic_growing3_crawler
-from src.cli.get_projects_social_media import get_projects_social_media
 
+class LazyGroup(click.Group):
+    """
+    Click group whose subcommands are imported only when invoked, so a cron job or
+    `<command> --help` does not pay for the crawler dependencies of every other command.
+
+    Args:
+        lazy_commands: dict of command name -> "module.path:attribute"
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_name, attribute = self.lazy_commands[cmd_name].split(":")
+            command = getattr(importlib.import_module(module_name), attribute)
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        # List names only, loading every command for its short help would defeat the laziness
+        with formatter.section("Commands"):
+            formatter.write_dl([(name, "") for name in self.list_commands(ctx)])
 
-@click.group()
+
+@click.group(cls=LazyGroup, lazy_commands={
+    # Stream
+    "telegram_projects_crawler": "src.cli.telegram_projects_crawler:telegram_projects_crawler",
+    "twitter_projects_crawler": "src.cli.twitter_projects_crawler:twitter_projects_crawler",
+    "update_twitter_projects_followings": "src.cli.update_twitter_projects_followings:update_twitter_projects_followings",
+    "twitter_projects_crawler_v2": "src.cli.twitter_projects_crawler_v2:twitter_projects_crawler_v2",
+    "discord_projects_crawler": "src.cli.discord_project_crawler:discord_projects_crawler",
+    "update_discord": "src.cli.update_discord_project_crawler:update_discord",
+    "twitter_growing3_crawler": "src.cli.twitter_growing3_crawler:twitter_growing3_crawler",
+    "topic_growing3_crawler": "src.cli.topic_growing3_crawler:topic_growing3_crawler",
+    "get_projects_social_media": "src.cli.get_projects_social_media:get_projects_social_media",
+    "cookie3_kols_crawler": "src.cli.cookie3_kols_crawler:cookie3_kols_crawler",
+    "fetch_images": "src.cli.fetch_images:fetch_images",
+
+    # Runner
+    "job_runner": "src.cli.job_runner:job_runner",
+
+    # Maintenance
+    "mongo_index_advisor": "src.cli.mongo_index_advisor:mongo_index_advisor",
+    "normalize_tweets": "src.cli.normalize_tweets:normalize_tweets",
+})
 @click.version_option(version='1.0.0')
 @click.pass_context
 def cli(ctx):
     # Command line
     pass
-
-
-# Stream
-cli.add_command(telegram_projects_crawler, "telegram_projects_crawler")
-cli.add_command(twitter_projects_crawler, "twitter_projects_crawler")
-cli.add_command(update_twitter_projects_followings, "update_twitter_projects_followings")
-cli.add_command(twitter_projects_crawler_v2, "twitter_projects_crawler_v2")
-cli.add_command(discord_projects_crawler, "discord_projects_crawler")
-cli.add_command(update_discord, "update_discord")
-cli.add_command(twitter_growing3_crawler, "twitter_growing3_crawler")
-cli.add_command(topic_growing3_crawler, "topic_growing3_crawler")
-cli.add_command(get_projects_social_media, "get_projects_social_media")
\ No newline at end of file
@@ -0,0 +1,51 @@
+import click
+
+from constants.config import MongoDBConfig
+from constants.mongo_constant import MongoCollection
+from utils.logger_utils import get_logger
+
+logger = get_logger('Cookie3 KOLs Crawler')
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('-f', '--output-file', default=None, type=str, help='NDJSON output file, Mongo upserts when not set')
+@click.option('-o', '--output-url', default=None, type=str, help='mongo url, default CDP connection url')
+@click.option('-d', '--database', default="cdp_database", show_default=True, type=str, help='database')
+@click.option('-c', '--collection', default=MongoCollection.cookie3_kols, show_default=True, type=str,
+              help='KOLs collection, upserted by twitterId')
+@click.option('-l', '--limit', default=200, show_default=True, type=int, help='KOLs per page')
+@click.option('-w', '--workers', default=8, show_default=True, type=int, help='Pages fetched concurrently')
+@click.option('-wk', '--web3-kols', default=True, show_default=True, type=bool, help='Web3 KOLs only')
+@click.option('-sf', '--state-file', default="cookie3_kols.state.json", show_default=True, type=str,
+              help='Progress file, an interrupted crawl resumes from its last written page')
+@click.option('-r', '--restart', default=False, show_default=True, type=bool, help='Ignore the progress file')
+def cookie3_kols_crawler(output_file, output_url, database, collection, limit, workers, web3_kols, state_file,
+                         restart):
+    """Crawl the Cookie3 KOLs leaderboard to NDJSON or Mongo."""
+    # Imported here so listing commands or --help stays fast
+    from crawler.cookie3_crawler import Cookie3KolsCrawler, CrawlState, MongoUpsertWriter, NdjsonWriter, \
+        crawl_leaderboard
+
+    # A state saved for another page size, filter or output is not resumed
+    output = output_file or f"{database}.{collection}"
+    state = CrawlState(state_file, params={"limit": limit, "web3Kols": web3_kols, "output": output})
+    if restart:
+        state.clear()
+    state.load()
+    if output_file:
+        if state.last_page and not NdjsonWriter.can_resume(output_file, state.offset):
+            logger.warning(f"{output_file} does not hold the {state.last_page} pages written, starting from page 1")
+            state.reset()
+        writer = NdjsonWriter(output_file, offset=state.offset)
+    else:
+        from pymongo import MongoClient
+
+        writer = MongoUpsertWriter(MongoClient(output_url or MongoDBConfig.CDP_CONNECTION_URL)[database][collection])
+    crawler = Cookie3KolsCrawler(limit=limit, web3_kols=web3_kols, workers=workers)
+    try:
+        pages, elements = crawl_leaderboard(crawler, writer, state)
+    finally:
+        writer.close()
+    logger.info(f"Wrote {elements} KOLs of {pages} pages, page {state.last_page}/{state.pages}")
+    if state.last_page >= state.pages:
+        state.clear()
@@ -0,0 +1,106 @@
+import asyncio
+
+import click
+
+from constants.mongo_constant import MongoCollection
+from constants.twitter import TwitterUser
+from utils.logger_utils import get_logger
+
+logger = get_logger('Fetch Images')
+
+DEFAULT_PROFILE_IMAGES = ("https://abs.twimg.com/sticky/default_profile_images/default_profile_normal.png",)
+# url field -> (content hash field, perceptual hash field)
+IMAGE_FIELDS = {
+    TwitterUser.profile_image_url: (TwitterUser.profile_image_hash, TwitterUser.profile_image_phash),
+    TwitterUser.profile_banner_url: (TwitterUser.profile_banner_hash, TwitterUser.profile_banner_phash),
+}
+
+
+def _image_updates(profiles, results, default_phashes):
+    """
+    Returns:
+        [{_id, changed hash fields}] of the profiles whose image hashes or default avatar flag changed
+    """
+    from crawler.image_fetcher import is_similar
+
+    updates = []
+    for profile in profiles:
+        update = {}
+        for url_field, (hash_field, phash_field) in IMAGE_FIELDS.items():
+            result = results.get(profile.get(url_field))
+            if result is None or result["hash"] is None:
+                continue
+            update[hash_field] = result["hash"]
+            update[phash_field] = result["phash"]
+            if url_field == TwitterUser.profile_image_url:
+                update[TwitterUser.default_profile_image] = is_similar(result["phash"], default_phashes)
+        changed = {k: v for k, v in update.items() if profile.get(k) != v}
+        if changed:
+            updates.append({TwitterUser.id_: profile[TwitterUser.id_], **changed})
+    return updates
+
+
+async def _fetch_images(exporter, fetcher, collection, batch_size, limit, default_images):
+    projection = {field: 1 for field in [*IMAGE_FIELDS, *(f for pair in IMAGE_FIELDS.values() for f in pair),
+                                         TwitterUser.default_profile_image]}
+    filter_ = {"$or": [{field: {"$nin": [None, ""]}} for field in IMAGE_FIELDS]}
+    cursor = exporter.get_docs(collection, filter_=filter_, projection=projection)
+    if limit:
+        cursor = cursor.limit(limit)
+    async with fetcher:
+        default_phashes = [r["phash"] for r in await fetcher.fetch_many(list(default_images)) if r["phash"]]
+        if not default_phashes:
+            logger.warning("No default profile image fetched, defaultProfileImage will be False")
+        profiles, updated = [], 0
+        for profile in cursor:
+            profiles.append(profile)
+            if len(profiles) < batch_size:
+                continue
+            updated += await _fetch_batch(exporter, fetcher, collection, profiles, default_phashes)
+            profiles = []
+        if profiles:
+            updated += await _fetch_batch(exporter, fetcher, collection, profiles, default_phashes)
+    logger.info(f"Updated {updated} profiles, fetches: {dict(fetcher.stats)}")
+
+
+async def _fetch_batch(exporter, fetcher, collection, profiles, default_phashes):
+    urls = [profile[field] for profile in profiles for field in IMAGE_FIELDS if profile.get(field)]
+    results = {result["url"]: result for result in await fetcher.fetch_many(urls)}
+    updates = _image_updates(profiles, results, default_phashes)
+    if updates:
+        exporter.update_docs(collection, updates)
+    logger.info(f"Fetched {len(urls)} images of {len(profiles)} profiles, {len(updates)} changed")
+    return len(updates)
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('-o', '--output-url', default=None, type=str, help='mongo url, default CDP connection url')
+@click.option('-d', '--database', default="cdp_database", show_default=True, type=str, help='database')
+@click.option('-c', '--collection', default=MongoCollection.twitter_raw, show_default=True, type=str,
+              help='profiles collection')
+@click.option('-cd', '--cache-dir', default="image_cache", show_default=True, type=str,
+              help='Content addressed image cache directory')
+@click.option('-cs', '--cache-size', default=1024, show_default=True, type=int,
+              help='Cache size in MB, least recently used images evicted above it')
+@click.option('-ma', '--max-age', default=7 * 24 * 3600, show_default=True, type=int,
+              help='Seconds an image is served from the cache before being revalidated')
+@click.option('-cc', '--concurrency', default=64, show_default=True, type=int, help='Requests in flight')
+@click.option('-ph', '--per-host', default=16, show_default=True, type=int, help='Requests in flight per host')
+@click.option('-b', '--batch-size', default=1000, show_default=True, type=int, help='Profiles per batch')
+@click.option('-l', '--limit', default=None, type=int, help='Max profiles')
+@click.option('-di', '--default-images', default=DEFAULT_PROFILE_IMAGES, show_default=True, type=str,
+              multiple=True, help='Default avatar urls, similar profile images are flagged defaultProfileImage')
+def fetch_images(output_url, database, collection, cache_dir, cache_size, max_age, concurrency, per_host,
+                 batch_size, limit, default_images):
+    """Fetch profile / banner images, store their content and perceptual hashes on the profiles."""
+    # Imported here so listing commands or --help stays fast
+    from databases.mongodb_cdp import MongoDBCDP
+    from crawler.image_fetcher import ImageCache, ImageFetcher
+
+    exporter = MongoDBCDP(connection_url=output_url, database=database)
+    cache = ImageCache(cache_dir, max_bytes=cache_size * 1024 * 1024)
+    fetcher = ImageFetcher(cache, concurrency=concurrency, per_host=per_host, max_age=max_age)
+    try:
+        asyncio.run(_fetch_images(exporter, fetcher, collection, batch_size, limit, default_images))
+    finally:
+        cache.close()
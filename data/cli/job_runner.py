@@ -0,0 +1,94 @@
+import asyncio
+
+import click
+
+from constants.config import AccountConfig
+from constants.time_constant import TimeConstants
+from utils.logger_utils import get_logger
+
+logger = get_logger('Job Runner')
+
+JOB_TYPES = ["telegram", "twitter_profiles", "twitter_tweets"]
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('-j', '--jobs', default=JOB_TYPES, show_default=True, type=click.Choice(JOB_TYPES),
+              multiple=True, help='Jobs hosted in this process')
+@click.option('-o', '--output-url', default=None, type=str, help='mongo output url')
+@click.option('-pe', '--period', default=TimeConstants.DAYS_2, type=int, help='Period time')
+@click.option('-ti', '--telegram-interval', default=TimeConstants.A_DAY, type=int, help='Telegram interval')
+@click.option('-pi', '--profiles-interval', default=TimeConstants.A_DAY, type=int, help='Twitter profiles interval')
+@click.option('-wi', '--tweets-interval', default=TimeConstants.A_DAY, type=int, help='Twitter tweets interval')
+@click.option('-tp', '--telegram-projects', default=["trava_finance", "trava_finance_official"], type=str,
+              multiple=True, help='Telegram project names')
+@click.option('-p', '--projects', default=None, type=str, multiple=True, help='Twitter project names')
+@click.option('-li', '--limit', default=None, type=int, help='Tweets limit per account')
+@click.option('-s', '--session-id', default="telegram", show_default=True, type=str, help='Telegram Session Id')
+@click.option('-st', '--shutdown-timeout', default=60, show_default=True, type=int,
+              help='Seconds running jobs get to finish on SIGINT/SIGTERM')
+@click.option('-m', '--monitor', default=False, show_default=True, type=bool, help='Monitor or not')
+@click.option('-r', '--resume', default=False, show_default=True, type=bool,
+              help='Skip accounts/channels finished by an interrupted run')
+@click.option('-nt', '--normalize-tweets', default=False, show_default=True,
+              type=bool, help='Store retweeted / quoted tweets as their own docs, keep {_id, authorName} references')
+@click.option('-mu', '--merge-upserts', default=False, show_default=True,
+              type=bool, help='Bulk upserts appending countLogs / impressionLogs entries as dotted paths')
+@click.option('-hc', '--hash-cache', default=None, type=str,
+              help='Skip unchanged profiles / tweets, content hashes persisted to this file')
+@click.option('-mp', '--metrics-port', default=None, type=int, help='Serve Prometheus metrics on this port')
+@click.option('-mf', '--metrics-file', default=None, type=str, help='Flush Prometheus metrics to this textfile')
+def job_runner(jobs, output_url, period, telegram_interval, profiles_interval, tweets_interval, telegram_projects,
+               projects, limit, session_id, shutdown_timeout, monitor, resume, normalize_tweets, merge_upserts, hash_cache, metrics_port, metrics_file):
+    # Imported here so listing commands or --help stays fast
+    from databases.mongodb_cdp import MongoDBCDP
+    from utils.content_hash_utils import with_change_detection
+    from utils.metrics_utils import InstrumentedExporter, start_metrics
+    from utils.mongo_upsert_utils import with_merge_upserts
+    from databases.mongodb_centic import MongoDBCentic
+    from src.jobs.async_job_runner import AsyncJobRunner
+
+    # One exporter and one centic client, so every job shares the same connection pools
+    start_metrics(port=metrics_port, textfile=metrics_file)
+    _exporter = InstrumentedExporter(with_merge_upserts(
+        MongoDBCDP(connection_url=output_url, database="cdp_database"), merge_upserts, output_url))
+    _exporter = with_change_detection(_exporter, hash_cache)
+    mongodb_centic = MongoDBCentic()
+    hosted = {}
+    if "telegram" in jobs:
+        from src.jobs.telegram_projects_crawling_job import TelegramProjectCrawlingJob
+
+        hosted["telegram"] = TelegramProjectCrawlingJob(
+            interval=telegram_interval,
+            period=period,
+            projects=telegram_projects,
+            exporter=_exporter,
+            mongodb_centic=mongodb_centic,
+            api_id=AccountConfig.TELE_API_ID,
+            api_hash=AccountConfig.TELE_API_HASH,
+            session_id=session_id,
+            monitor=monitor,
+            stream_types=["messages", "new_users"],
+            resume=resume,
+        )
+    for job_type, interval, stream_type in (("twitter_profiles", profiles_interval, "profiles"),
+                                            ("twitter_tweets", tweets_interval, "tweets")):
+        if job_type not in jobs:
+            continue
+        from src.jobs.twitter_projects_crawling_job import TwitterProjectCrawlingJob
+
+        hosted[job_type] = TwitterProjectCrawlingJob(
+            interval=interval,
+            period=period,
+            limit=limit,
+            projects=projects,
+            projects_file=None,
+            col_output=None,
+            exporter=_exporter,
+            mongodb_centic=mongodb_centic,
+            monitor=monitor,
+            stream_types=[stream_type],
+            resume=resume,
+            normalize_tweets=normalize_tweets,
+        )
+
+    asyncio.run(AsyncJobRunner(hosted, shutdown_timeout=shutdown_timeout).run())
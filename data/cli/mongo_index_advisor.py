@@ -0,0 +1,31 @@
+import sys
+
+import click
+
+from constants.config import MongoDBConfig
+from utils.logger_utils import get_logger
+
+logger = get_logger('Mongo Index Advisor')
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('-o', '--output-url', default=None, type=str, help='mongo url, default CDP connection url')
+@click.option('-d', '--database', default="cdp_database", show_default=True, type=str, help='database')
+@click.option('-c', '--create/--no-create', default=True, show_default=True, help='Create declared indexes')
+@click.option('-e', '--explain/--no-explain', default=True, show_default=True, help='Explain query catalogue')
+def mongo_index_advisor(output_url, database, create, explain):
+    # Imported here so listing commands or --help stays fast
+    from pymongo import MongoClient
+    from utils.mongo_index_utils import ensure_indexes, explain_queries
+
+    db = MongoClient(output_url or MongoDBConfig.CDP_CONNECTION_URL)[database]
+    if create:
+        ensure_indexes(db)
+    if explain:
+        report = explain_queries(db)
+        collscans = [r for r in report if r["collscan"]]
+        sorts = [r for r in report if r["blocking_sort"] and not r["collscan"]]
+        logger.info(f"{len(collscans)}/{len(report)} query shapes need a collection scan, "
+                    f"{len(sorts)} an in-memory sort")
+        if collscans or sorts:
+            sys.exit(1)
@@ -0,0 +1,26 @@
+import click
+
+from constants.config import MongoDBConfig
+from constants.mongo_constant import MongoCollection
+from utils.logger_utils import get_logger
+
+logger = get_logger('Normalize Tweets')
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('-o', '--output-url', default=None, type=str, help='mongo url, default CDP connection url')
+@click.option('-d', '--database', default="cdp_database", show_default=True, type=str, help='database')
+@click.option('-c', '--collection', default=MongoCollection.tweets, show_default=True, type=str,
+              help='tweets collection')
+@click.option('-b', '--batch-size', default=1000, show_default=True, type=int, help='Writes per bulk_write')
+@click.option('-dr', '--dry-run', default=False, show_default=True, type=bool, help='Only count, write nothing')
+def normalize_tweets(output_url, database, collection, batch_size, dry_run):
+    """Backfill: move embedded retweeted / quoted tweets to their own docs, keep references."""
+    # Imported here so listing commands or --help stays fast
+    from pymongo import MongoClient
+    from utils.tweet_utils import normalize_embedded_tweets
+
+    tweets = MongoClient(output_url or MongoDBConfig.CDP_CONNECTION_URL)[database][collection]
+    counts = normalize_embedded_tweets(tweets, batch_size=batch_size, dry_run=dry_run)
+    logger.info(f"{'Would normalize' if dry_run else 'Normalized'} {counts['tweets']} tweets "
+                f"and insert {counts['originals']} originals")
@@ -2,9 +2,6 @@ import click
 
 from constants.config import AccountConfig
 from constants.time_constant import TimeConstants
-from databases.mongodb_cdp import MongoDBCDP
-from databases.mongodb_centic import MongoDBCentic
-from src.jobs.telegram_projects_crawling_job import TelegramProjectCrawlingJob
 from utils.logger_utils import get_logger
 
 logger = get_logger('Telegram Projects Crawler')
@@ -25,8 +22,35 @@ logger = get_logger('Telegram Projects Crawler')
               type=str, help='Telegram Session Id', multiple=True)
 @click.option('-m', '--monitor', default=False, show_default=True,
               type=bool, help='Monitor or not')
-def telegram_projects_crawler(interval, period, output_url, projects, api_id, api_hash, session_id, stream_types, monitor):
-    _exporter = MongoDBCDP(connection_url=output_url, database="cdp_database")
+@click.option('-r', '--resume', default=False, show_default=True,
+              type=bool, help='Skip accounts/channels finished by an interrupted run')
+@click.option('-ri', '--run-id', default=None, type=str,
+              help='Checkpoint run id, default job name and scheduled window')
+@click.option('-md', '--media-dir', default=None, type=str,
+              help='Download message media to this directory, content addressed (sha256)')
+@click.option('-mw', '--media-workers', default=4, show_default=True, type=int, help='Concurrent media downloads')
+@click.option('-mq', '--media-queue-size', default=10000, show_default=True, type=int,
+              help='Media waiting for download, more are dropped until the next run')
+@click.option('-mx', '--media-max-size', default=20, show_default=True, type=int,
+              help='MB, larger media are only summarized')
+@click.option('-mp', '--metrics-port', default=None, type=int, help='Serve Prometheus metrics on this port')
+@click.option('-mf', '--metrics-file', default=None, type=str, help='Flush Prometheus metrics to this textfile')
+@click.option('-pr', '--profile', default=False, show_default=True,
+              type=bool, help='Write a per run profile (stage spans) to --profile-dir')
+@click.option('-pd', '--profile-dir', default="profiles", show_default=True, type=str, help='Profile reports directory')
+@click.option('-ps', '--profile-sampling', default=False, show_default=True,
+              type=bool, help='Add a sampling profile of the event loop thread')
+@click.option('-pm', '--profile-memory', default=False, show_default=True,
+              type=bool, help='Add tracemalloc top allocators')
+def telegram_projects_crawler(interval, period, output_url, projects, api_id, api_hash, session_id, stream_types, monitor, resume, run_id, media_dir, media_workers, media_queue_size, media_max_size, metrics_port, metrics_file, profile, profile_dir, profile_sampling, profile_memory):
+    # Imported here so listing commands or --help stays fast
+    from databases.mongodb_cdp import MongoDBCDP
+    from utils.metrics_utils import InstrumentedExporter, start_metrics
+    from databases.mongodb_centic import MongoDBCentic
+    from src.jobs.telegram_projects_crawling_job import TelegramProjectCrawlingJob
+
+    start_metrics(port=metrics_port, textfile=metrics_file)
+    _exporter = InstrumentedExporter(MongoDBCDP(connection_url=output_url, database="cdp_database"))
     mongodb_centic = MongoDBCentic()
     job = TelegramProjectCrawlingJob(
         interval=interval,
@@ -39,5 +63,15 @@ def telegram_projects_crawler(interval, period, output_url, projects, api_id, ap
         session_id=session_id,
         monitor=monitor,
         stream_types=stream_types,
+        resume=resume,
+        run_id=run_id,
+        media_dir=media_dir,
+        media_workers=media_workers,
+        media_queue_size=media_queue_size,
+        media_max_size=media_max_size * 1024 * 1024,
     )
+    if profile:
+        from utils.profiling_utils import profile_job
+
+        profile_job(job, "telegram_projects", output_dir=profile_dir, sampling=profile_sampling, memory=profile_memory)
     job.run()
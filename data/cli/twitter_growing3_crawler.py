@@ -1,8 +1,6 @@
 import click
 
 from constants.time_constant import TimeConstants
-from databases.mongodb_cdp import MongoDBCDP
-from src.jobs.twitter_growing3_crawling_job import TwitterGrowing3CrawlingJob
 from utils.logger_utils import get_logger
 
 logger = get_logger('Twitter Growing3 Crawler')
@@ -24,9 +22,42 @@ logger = get_logger('Twitter Growing3 Crawler')
                 type=int, help='API version')
 @click.option('-n', '--num-accounts', default=10, show_default=True,
                 type=int, help='Number of accounts')
+@click.option('-a', '--adaptive', default=False, show_default=True,
+              type=bool, help='Only crawl accounts due by their learned change rate')
+@click.option('-bu', '--budget', default=None, show_default=True,
+              type=int, help='Max API requests per run in adaptive mode')
+@click.option('-q', '--use-queue', default=False, show_default=True,
+              type=bool, help='Claim accounts from the shared crawl_tasks queue instead of --api-v/--num-accounts slices')
+@click.option('-p', '--pooled', default=False, show_default=True,
+              type=bool, help='Route requests over every account of the shared pool by health')
+@click.option('-nt', '--normalize-tweets', default=False, show_default=True,
+              type=bool, help='Store retweeted / quoted tweets as their own docs, keep {_id, authorName} references')
+@click.option('-mu', '--merge-upserts', default=False, show_default=True,
+              type=bool, help='Bulk upserts appending countLogs / impressionLogs entries as dotted paths')
+@click.option('-hc', '--hash-cache', default=None, type=str,
+              help='Skip unchanged profiles / tweets, content hashes persisted to this file')
 
-def twitter_growing3_crawler(scheduler, interval, period, limit, output_url, stream_types, monitor, batch_size, api_v, num_accounts):
-    _exporter = MongoDBCDP(connection_url=output_url, database="cdp_database")
+@click.option('-mp', '--metrics-port', default=None, type=int, help='Serve Prometheus metrics on this port')
+@click.option('-mf', '--metrics-file', default=None, type=str, help='Flush Prometheus metrics to this textfile')
+@click.option('-pr', '--profile', default=False, show_default=True,
+              type=bool, help='Write a per run profile (stage spans) to --profile-dir')
+@click.option('-pd', '--profile-dir', default="profiles", show_default=True, type=str, help='Profile reports directory')
+@click.option('-ps', '--profile-sampling', default=False, show_default=True,
+              type=bool, help='Add a sampling profile of the event loop thread')
+@click.option('-pm', '--profile-memory', default=False, show_default=True,
+              type=bool, help='Add tracemalloc top allocators')
+def twitter_growing3_crawler(scheduler, interval, period, limit, output_url, stream_types, monitor, batch_size, api_v, num_accounts, adaptive, budget, use_queue, pooled, normalize_tweets, merge_upserts, hash_cache, metrics_port, metrics_file, profile, profile_dir, profile_sampling, profile_memory):
+    # Imported here so listing commands or --help stays fast
+    from databases.mongodb_cdp import MongoDBCDP
+    from utils.content_hash_utils import with_change_detection
+    from utils.metrics_utils import InstrumentedExporter, start_metrics
+    from utils.mongo_upsert_utils import with_merge_upserts
+    from src.jobs.twitter_growing3_crawling_job import TwitterGrowing3CrawlingJob
+
+    start_metrics(port=metrics_port, textfile=metrics_file)
+    _exporter = InstrumentedExporter(with_merge_upserts(
+        MongoDBCDP(connection_url=output_url, database="cdp_database"), merge_upserts, output_url))
+    _exporter = with_change_detection(_exporter, hash_cache)
     job = TwitterGrowing3CrawlingJob(
         scheduler=scheduler,
         interval=interval,
@@ -37,6 +68,16 @@ def twitter_growing3_crawler(scheduler, interval, period, limit, output_url, str
         stream_types=stream_types,
         batch_size=batch_size,
         api_v=api_v,
-        num_accounts=num_accounts
+        num_accounts=num_accounts,
+        adaptive=adaptive,
+        budget=budget,
+        use_queue=use_queue,
+        queue_url=output_url,
+        pooled=pooled,
+        normalize_tweets=normalize_tweets,
     )
+    if profile:
+        from utils.profiling_utils import profile_job
+
+        profile_job(job, "twitter_growing3", output_dir=profile_dir, sampling=profile_sampling, memory=profile_memory)
     job.run()
@@ -2,9 +2,6 @@ import click
 
 from constants.config import AccountConfig
 from constants.time_constant import TimeConstants
-from databases.mongodb_cdp import MongoDBCDP
-from databases.mongodb_centic import MongoDBCentic
-from src.jobs.twitter_projects_crawling_job import TwitterProjectCrawlingJob
 from utils.logger_utils import get_logger
 
 logger = get_logger('Twitter Projects Crawler')
@@ -33,8 +30,36 @@ logger = get_logger('Twitter Projects Crawler')
               type=str, help='Collection output')
 @click.option('-m', '--monitor', default=False, show_default=True,
               type=bool, help='Monitor or not')
-def twitter_projects_crawler(interval, period, limit, output_url, projects, projects_file, twitter_user, twitter_password, email, email_password, crawler_types, stream_types, col_output, monitor):
-    _exporter = MongoDBCDP(connection_url=output_url, database="cdp_database")
+@click.option('-a', '--adaptive', default=False, show_default=True,
+              type=bool, help='Only crawl accounts due by their learned change rate')
+@click.option('-bu', '--budget', default=None, show_default=True,
+              type=int, help='Max API requests per run in adaptive mode')
+@click.option('-r', '--resume', default=False, show_default=True,
+              type=bool, help='Skip accounts/channels finished by an interrupted run')
+@click.option('-ri', '--run-id', default=None, type=str,
+              help='Checkpoint run id, default job name and scheduled window')
+@click.option('-nt', '--normalize-tweets', default=False, show_default=True,
+              type=bool, help='Store retweeted / quoted tweets as their own docs, keep {_id, authorName} references')
+@click.option('-mu', '--merge-upserts', default=False, show_default=True,
+              type=bool, help='Bulk upserts appending countLogs / impressionLogs entries as dotted paths')
+@click.option('-hc', '--hash-cache', default=None, type=str,
+              help='Skip unchanged profiles / tweets, content hashes persisted to this file')
+@click.option('-mp', '--metrics-port', default=None, type=int, help='Serve Prometheus metrics on this port')
+@click.option('-mf', '--metrics-file', default=None, type=str, help='Flush Prometheus metrics to this textfile')
+def twitter_projects_crawler(interval, period, limit, output_url, projects, projects_file, twitter_user, twitter_password, email, email_password, crawler_types, stream_types, col_output, monitor, adaptive, budget, resume, run_id, normalize_tweets, merge_upserts, hash_cache, metrics_port, metrics_file):
+    # Imported here so listing commands or --help stays fast
+    from databases.mongodb_cdp import MongoDBCDP
+    from utils.content_hash_utils import TRACKED_COLLECTIONS, with_change_detection
+    from utils.metrics_utils import InstrumentedExporter, start_metrics
+    from utils.mongo_upsert_utils import with_merge_upserts
+    from databases.mongodb_centic import MongoDBCentic
+    from src.jobs.twitter_projects_crawling_job import TwitterProjectCrawlingJob
+
+    start_metrics(port=metrics_port, textfile=metrics_file)
+    tracked = TRACKED_COLLECTIONS + ((col_output,) if col_output else ())
+    _exporter = InstrumentedExporter(with_merge_upserts(
+        MongoDBCDP(connection_url=output_url, database="cdp_database"), merge_upserts, output_url, collections=tracked))
+    _exporter = with_change_detection(_exporter, hash_cache, collections=tracked)
     mongodb_centic = MongoDBCentic()
     job = TwitterProjectCrawlingJob(
         interval=interval,
@@ -51,6 +76,11 @@ def twitter_projects_crawler(interval, period, limit, output_url, projects, proj
         monitor=monitor,
         stream_types=stream_types,
         crawler_types=crawler_types,
-        col_output=col_output
+        col_output=col_output,
+        adaptive=adaptive,
+        budget=budget,
+        resume=resume,
+        run_id=run_id,
+        normalize_tweets=normalize_tweets,
     )
     job.run()
@@ -1,13 +1,64 @@
 class MongoCollection:
     tweets = "tweets"
     twitter_users = "twitter_users"
+    twitter_raw = "twitter_raw"
+    crawl_tasks = "crawl_tasks"
+    crawl_checkpoints = "crawl_checkpoints"
     twitter_follows = "twitter_follows"
     telegram_users = "telegram_users"
     telegram_messages = "telegram_messages"
+    telegram_media = "telegram_media"
     configs = "configs"
+    cookie3_kols = "cookie3_kols"
     discord_guilds = "discord_guilds"
     discord_users = "discord_users"
     discord_channels = "discord_channels"
     discord_messages = "discord_messages"
     discord_invites = "discord_invites"
     discord_audit_logs = "discord_audit_logs"
+
+
+class MongoIndexes:
+    """
+    Indexes required by the hot queries, per collection.
+    Each index is a dict with `keys` (list of (field, direction)) and optional `name` /
+    `partialFilterExpression` / `expireAfterSeconds`. `configs` and lookups by `_id` use the default _id index.
+    """
+    mapping = {
+        MongoCollection.tweets: [
+            # authorName $in + timestamp range (experiments.py, kol_steps_*.py)
+            {"keys": [("authorName", 1), ("timestamp", 1)], "name": "authorName_timestamp"},
+            {"keys": [("timestamp", 1)], "name": "timestamp"},
+        ],
+        MongoCollection.twitter_raw: [
+            # {elite: ...} batches, stalest first then most followed
+            {"keys": [("elite", 1), ("lastCrawled", 1), ("followersCount", -1)],
+             "name": "elite_lastCrawled_followersCount"},
+            # adaptive recrawl: due accounts (nextCrawl missing or <= now), most overdue first
+            {"keys": [("elite", 1), ("nextCrawl", 1), ("followersCount", -1)],
+             "name": "elite_nextCrawl_followersCount"},
+            {"keys": [("userName", 1)], "name": "userName"},
+        ],
+        MongoCollection.twitter_users: [
+            {"keys": [("userNameLower", 1)], "name": "userNameLower"},
+            {"keys": [("nextCrawl", 1)], "name": "nextCrawl"},
+        ],
+        MongoCollection.telegram_messages: [
+            # export_new_users / export_all_users_send_message
+            {"keys": [("timestamp", 1)], "name": "timestamp"},
+            # check_announcement update_many by channel
+            {"keys": [("channel", 1), ("timestamp", 1)], "name": "channel_timestamp"},
+        ],
+        MongoCollection.crawl_tasks: [
+            # work queue claims: pending and available, or leased with an expired lease
+            {"keys": [("queue", 1), ("status", 1), ("availableAt", 1)], "name": "queue_status_availableAt"},
+            {"keys": [("queue", 1), ("status", 1), ("leaseUntil", 1)], "name": "queue_status_leaseUntil"},
+            # finished and dead tasks are dropped once expireAt passes
+            {"keys": [("expireAt", 1)], "name": "expireAt", "expireAfterSeconds": 0},
+        ],
+        MongoCollection.crawl_checkpoints: [
+            # --resume loads the progress of one run
+            {"keys": [("runId", 1)], "name": "runId"},
+            {"keys": [("expireAt", 1)], "name": "expireAt", "expireAfterSeconds": 0},
+        ],
+    }
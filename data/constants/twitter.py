@@ -20,9 +20,17 @@ class TwitterUser:
     country = "country"
     profile_image_url = "profileImageUrl"
     profile_banner_url = "profileBannerUrl"
+    profile_image_hash = "profileImageHash"
+    profile_image_phash = "profileImagePhash"
+    profile_banner_hash = "profileBannerHash"
+    profile_banner_phash = "profileBannerPhash"
+    default_profile_image = "defaultProfileImage"
     protected = "protected"
     verified = "verified"
     count_logs = "countLogs"
+    last_crawled = "lastCrawled"
+    change_rate = "changeRate"
+    next_crawl = "nextCrawl"
 
 
 class Tweets:
@@ -0,0 +1,199 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from crawler.crawler import Crawler
+from utils.logger_utils import get_logger
+
+logger = get_logger('Cookie3 Crawler')
+
+LEADERBOARD_URL = "https://affiliate.cookie3.com/api/trpc/leaderboard.getKolsLeaderboard"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/71.0.3578.98 Safari/537.36",
+}
+
+
+def _elements(resp):
+    # tRPC batch response: one result per batched call
+    if not resp:
+        return []
+    return resp[0]["result"]["data"]["json"]["elements"] or []
+
+
+class Cookie3KolsCrawler(Crawler):
+    """
+    Pages of the Cookie3 KOLs leaderboard. The page count is found by probing (the response
+    has no total): doubling until an empty page, then bisecting. Pages are then fetched by
+    `workers` threads and returned in page order.
+    """
+
+    def __init__(self, limit=200, web3_kols=True, workers=8, max_retry_times=3):
+        super().__init__(max_retry_times=max_retry_times)
+        self.limit = limit
+        self.web3_kols = web3_kols
+        self.workers = workers
+
+    def page_url(self, page):
+        data = {"0": {"json": {"page": page, "limit": self.limit, "web3Kols": self.web3_kols}}}
+        return f"{LEADERBOARD_URL}?{urlencode({'batch': 1, 'input': json.dumps(data)})}"
+
+    def fetch_page(self, page):
+        """
+        Returns:
+            elements of page, [] past the last page, None when every retry failed
+        """
+        return self._request(self.page_url(page), _elements, headers=HEADERS)
+
+    def _has_elements(self, page):
+        elements = self.fetch_page(page)
+        if elements is None:
+            raise RuntimeError(f"Can not fetch page {page} of the leaderboard")
+        return bool(elements)
+
+    def count_pages(self):
+        if not self._has_elements(1):
+            return 0
+        low, high = 1, 2
+        while self._has_elements(high):
+            low, high = high, high * 2
+        # low has elements, high does not
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self._has_elements(middle):
+                low = middle
+            else:
+                high = middle
+        return low
+
+    def iter_pages(self, first_page, last_page):
+        """Yield (page, elements or None) from first_page to last_page, in order, fetched concurrently."""
+        pages = range(first_page, last_page + 1)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            yield from zip(pages, executor.map(self.fetch_page, pages))
+        finally:
+            # Consumer stopped early (failed page): do not fetch the pages not started yet
+            executor.shutdown(cancel_futures=True)
+
+
+class CrawlState:
+    """
+    Progress of a leaderboard crawl, saved to path after each written page: page count, last
+    page written in order and, for NDJSON output, the file size at that point (a partially
+    written page is truncated away on resume). params (page size, filters, output target) are
+    saved with it, a state saved under other params is ignored and the crawl starts over.
+    """
+
+    def __init__(self, path, params=None):
+        self.path = path
+        self.params = params or {}
+        self.pages = None
+        self.last_page = 0
+        self.offset = 0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Can not read {self.path}, starting from page 1: {ex}")
+            return self
+        if data.get("params", {}) != self.params:
+            logger.warning(f"{self.path} was saved for {data.get('params')}, starting from page 1 for {self.params}")
+            return self
+        self.pages = data.get("pages")
+        self.last_page = data.get("lastPage", 0)
+        self.offset = data.get("offset", 0)
+        return self
+
+    def reset(self):
+        self.pages = None
+        self.last_page = 0
+        self.offset = 0
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"params": self.params, "pages": self.pages, "lastPage": self.last_page, "offset": self.offset},
+                      f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class NdjsonWriter:
+    def __init__(self, path, offset=0):
+        if offset and not self.can_resume(path, offset):
+            raise ValueError(f"{path} is missing or shorter than {offset} bytes, can not resume it")
+        self.file = open(path, "r+b" if offset else "wb")
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    @staticmethod
+    def can_resume(path, offset):
+        # Truncating a missing or shorter file to offset would pad it with NUL bytes
+        return os.path.exists(path) and os.path.getsize(path) >= offset
+
+    def write(self, elements):
+        for element in elements:
+            self.file.write(json.dumps(element, ensure_ascii=False).encode() + b"\n")
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class MongoUpsertWriter:
+    """bulk upserts of the elements into collection (a pymongo Collection) by twitterId."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def write(self, elements):
+        from pymongo import UpdateOne
+
+        operations = [
+            UpdateOne({"_id": str(element["twitterId"])}, {"$set": element}, upsert=True)
+            for element in elements if element.get("twitterId")
+        ]
+        if len(operations) < len(elements):
+            logger.warning(f"{len(elements) - len(operations)} elements without twitterId skipped")
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return 0
+
+    def close(self):
+        pass
+
+
+def crawl_leaderboard(crawler, writer, state):
+    """
+    Write the leaderboard pages after state.last_page to writer, saving state after each page.
+    Stops at the first page failing every retry, the next run resumes there.
+
+    Returns:
+        (pages written, elements written)
+    """
+    if state.pages is None:
+        state.pages = crawler.count_pages()
+        logger.info(f"{state.pages} pages of {crawler.limit} KOLs")
+        state.save()
+    pages = elements_count = 0
+    for page, elements in crawler.iter_pages(state.last_page + 1, state.pages):
+        if elements is None:
+            logger.warning(f"Stopped at page {page}, rerun to resume from it")
+            break
+        offset = writer.write(elements)
+        state.last_page, state.offset = page, offset
+        state.save()
+        pages += 1
+        elements_count += len(elements)
+    return pages, elements_count
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import httpx
+from PIL import Image
+
+from utils.logger_utils import get_logger
+from utils.metrics_utils import IMAGE_FETCHES
+
+logger = get_logger('Image Fetcher')
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/71.0.3578.98 Safari/537.36",
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def perceptual_hash(data, hash_size=8):
+    """
+    dHash of an image: 64 bits telling whether each pixel of the grayscale, (hash_size + 1) x
+    hash_size thumbnail is brighter than its right neighbour. Re-encoded or resized copies of
+    an image get the same or a close hash (see hamming_distance).
+
+    Returns:
+        hex string, None when data is not an image Pillow can read
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            offset = row * (hash_size + 1) + col
+            bits = bits << 1 | (pixels[offset] > pixels[offset + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def is_similar(phash, references, max_distance=6):
+    return bool(phash) and any(hamming_distance(phash, reference) <= max_distance for reference in references)
+
+
+def _hashes(data):
+    return hashlib.sha256(data).hexdigest(), perceptual_hash(data)
+
+
+class ImageCache:
+    """
+    Content addressed image store: <directory>/<sha256[:2]>/<sha256>, indexed in
+    <directory>/index.sqlite (url -> hash, ETag / Last-Modified, perceptual hash; hash -> size,
+    last access). Once the files exceed max_bytes the least recently used ones are evicted down
+    to 90% of it. Evicted urls keep their hashes, so changes are still detected without the file.
+    """
+
+    def __init__(self, directory, max_bytes=1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"), isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " url TEXT PRIMARY KEY, hash TEXT, phash TEXT, etag TEXT, lastModified TEXT, fetchedAt INTEGER)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER, lastAccess REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (lastAccess)")
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if self.total_bytes > self.max_bytes:
+            # Opened with a smaller max_bytes than it was filled with
+            self.evict(int(self.max_bytes * 0.9))
+
+    def path(self, content_hash):
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def lookup(self, url):
+        """
+        Returns:
+            {hash, phash, etag, lastModified, fetchedAt, stored} of the last fetch of url, None if never fetched
+        """
+        row = self.connection.execute(
+            "SELECT urls.hash, phash, etag, lastModified, fetchedAt, blobs.hash FROM urls"
+            " LEFT JOIN blobs ON blobs.hash = urls.hash WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        keys = ("hash", "phash", "etag", "lastModified", "fetchedAt")
+        return {**dict(zip(keys, row[:5])), "stored": row[5] is not None}
+
+    def hit(self, content_hash):
+        # Served from the cache, keeps the blob from being evicted as least recently used
+        self.connection.execute("UPDATE blobs SET lastAccess = ? WHERE hash = ?", (time.time(), content_hash))
+
+    def touch(self, url, etag=None, last_modified=None):
+        # Revalidated (304), only the freshness and the blob recency change
+        self.connection.execute(
+            "UPDATE urls SET fetchedAt = ?, etag = COALESCE(?, etag), lastModified = COALESCE(?, lastModified)"
+            " WHERE url = ?", (int(time.time()), etag, last_modified, url))
+        self.connection.execute(
+            "UPDATE blobs SET lastAccess = ? WHERE hash = (SELECT hash FROM urls WHERE url = ?)", (time.time(), url))
+
+    def store(self, url, data, phash, etag=None, last_modified=None, content_hash=None):
+        content_hash = content_hash or hashlib.sha256(data).hexdigest()
+        path = self.path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.part"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        inserted = self.connection.execute(
+            "INSERT OR IGNORE INTO blobs (hash, size, lastAccess) VALUES (?, ?, ?)",
+            (content_hash, len(data), time.time())).rowcount
+        if inserted:
+            self.total_bytes += len(data)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO urls (url, hash, phash, etag, lastModified, fetchedAt) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, content_hash, phash, etag, last_modified, int(time.time())))
+        if self.total_bytes > self.max_bytes:
+            self.evict(int(self.max_bytes * 0.9))
+        return content_hash
+
+    def evict(self, target_bytes):
+        evicted = 0
+        rows = self.connection.execute("SELECT hash, size FROM blobs ORDER BY lastAccess").fetchall()
+        for content_hash, size in rows:
+            if self.total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(self.path(content_hash))
+            except FileNotFoundError:
+                pass
+            self.connection.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+            self.total_bytes -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} images, cache at {self.total_bytes / 1024 ** 2:.1f}MB")
+
+    def close(self):
+        self.connection.close()
+
+
+class ImageFetcher:
+    """
+    Fetch many images over one pooled async HTTP client, at most per_host requests in flight
+    per host and concurrency overall, through an ImageCache: urls fetched less than max_age ago
+    are served from it, older ones are revalidated with If-None-Match / If-Modified-Since.
+
+    fetch() result: {url, status, hash, phash, size}, status one of cached / not_modified /
+    downloaded / error.
+    """
+
+    def __init__(self, cache, concurrency=64, per_host=16, timeout=30, max_retry_times=3, max_age=7 * 24 * 3600):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_retry_times = max_retry_times
+        self.max_age = max_age
+        self.client = None
+        self._host_semaphores = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._semaphore = None
+        self.stats = defaultdict(int)
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            headers=HEADERS, timeout=self.timeout, follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.client.aclose()
+
+    def _result(self, url, status, entry=None, size=None):
+        self.stats[status] += 1
+        IMAGE_FETCHES.labels(status).inc()
+        return {"url": url, "status": status, "hash": entry and entry.get("hash"),
+                "phash": entry and entry.get("phash"), "size": size}
+
+    async def fetch(self, url):
+        entry = self.cache.lookup(url)
+        if entry and entry["stored"] and time.time() - entry["fetchedAt"] < self.max_age:
+            self.cache.hit(entry["hash"])
+            return self._result(url, "cached", entry)
+        headers = {}
+        if entry and entry["stored"]:
+            # Without the file a 304 would leave nothing to hash, fetch it in full
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["lastModified"]:
+                headers["If-Modified-Since"] = entry["lastModified"]
+        async with self._semaphore, self._host_semaphores[urlparse(url).netloc]:
+            response = await self._get(url, headers)
+        if response is None:
+            return self._result(url, "error", entry)
+        if response.status_code == 304:
+            self.cache.touch(url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return self._result(url, "not_modified", entry)
+        data = response.content
+        # Decoding and hashing a large image takes milliseconds of CPU, off the event loop
+        content_hash, phash = await asyncio.get_event_loop().run_in_executor(None, _hashes, data)
+        content_hash = self.cache.store(
+            url, data, phash, response.headers.get("ETag"), response.headers.get("Last-Modified"), content_hash)
+        return self._result(url, "downloaded", {"hash": content_hash, "phash": phash}, size=len(data))
+
+    async def _get(self, url, headers):
+        for retry_time in range(self.max_retry_times):
+            try:
+                response = await self.client.get(url, headers=headers)
+                if response.status_code in RETRY_STATUSES:
+                    logger.warning(f'Fail ({response.status_code}) to request url {url}')
+                elif response.status_code == 304 or 200 <= response.status_code < 300:
+                    return response
+                else:
+                    logger.warning(f'Fail ({response.status_code}) to request url {url}')
+                    return None
+            except httpx.HTTPError as ex:
+                logger.warning(f"Fail ({ex!r}) to request url {url}")
+            await asyncio.sleep(2 ** retry_time)
+        return None
+
+    async def fetch_many(self, urls):
+        """Fetch urls concurrently (duplicates once), results in the order of urls."""
+        unique = list(dict.fromkeys(urls))
+        results = dict(zip(unique, await asyncio.gather(*(self.fetch(url) for url in unique))))
+        return [results[url] for url in urls]
@@ -6,11 +6,48 @@ from twscrape import API, parse_users
 from twscrape.api import OP_Followers
 
 from utils.logger_utils import get_logger
+from utils.metrics_utils import API_ERRORS, API_REQUEST_SECONDS, time_api_call
 
 T = TypeVar("T")
 logger = get_logger("New API Twitter GraphQl")
 
 class NewAPi(API):
+    async def _gql_items(self, op, *args, **kwargs):
+        # Time every result page, from the request until the page is handed over
+        endpoint = op.split("/")[-1]
+        pages = super()._gql_items(op, *args, **kwargs)
+        try:
+            while True:
+                begin = time.perf_counter()
+                try:
+                    rep = await pages.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as ex:
+                    API_ERRORS.labels(endpoint, type(ex).__name__).inc()
+                    self._record_error(endpoint, ex)
+                    raise
+                API_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - begin)
+                yield rep
+        finally:
+            # Release the account lock even when the caller stops early
+            await pages.aclose()
+
+    async def _gql_item(self, op, *args, **kwargs):
+        endpoint = op.split("/")[-1]
+        try:
+            with time_api_call(endpoint):
+                return await super()._gql_item(op, *args, **kwargs)
+        except Exception as ex:
+            self._record_error(endpoint, ex)
+            raise
+
+    def _record_error(self, endpoint, ex):
+        # Only HealthAwareAccountsPool tracks per account errors, plain AccountsPool has no record_error
+        record_error = getattr(self.pool, "record_error", None)
+        if record_error is not None:
+            record_error(endpoint, f"{type(ex).__name__}: {ex}")
+
     async def followers_raw(self, uid: int, limit=-1, kv=None):
         op = OP_Followers
         kv = {"userId": str(uid), "count": 20, "includePromotedContent": False, **(kv or {})}
@@ -29,6 +66,5 @@ class NewAPi(API):
             items.append(x)
             total_n_items = len(items)
             if total_n_items and not (total_n_items % n_items):
-
-                time.sleep(time_sleep)
+                await asyncio.sleep(time_sleep)
         return items
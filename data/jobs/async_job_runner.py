@@ -0,0 +1,76 @@
+import asyncio
+import signal
+
+from utils.logger_utils import get_logger
+
+logger = get_logger('Async Job Runner')
+
+
+class AsyncJobRunner:
+    """
+    Host several CLIJob instances in one event loop, each on its own schedule (CLIJob.arun).
+    Jobs built on the same exporter / Mongo clients share their connection pools.
+
+    SIGINT / SIGTERM trigger a graceful shutdown: sleeping jobs stop right away, running
+    executions get shutdown_timeout seconds to finish before they are cancelled.
+
+    Args:
+        jobs: dict of job name -> CLIJob
+        shutdown_timeout: seconds to wait for running executions on shutdown
+    """
+
+    def __init__(self, jobs, shutdown_timeout=60):
+        self.jobs = jobs
+        self.shutdown_timeout = shutdown_timeout
+        self.stop_event = None
+
+    def stop(self):
+        if self.stop_event is not None and not self.stop_event.is_set():
+            logger.info("Stopping jobs ...")
+            self.stop_event.set()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Not on the main thread or not supported by the platform (Windows)
+                pass
+
+    async def run(self):
+        self.stop_event = asyncio.Event()
+        self._install_signal_handlers()
+        tasks = {
+            asyncio.create_task(job.arun(self.stop_event), name=name): name
+            for name, job in self.jobs.items()
+        }
+        stop_waiter = asyncio.create_task(self.stop_event.wait())
+        logger.info(f"Running jobs: {', '.join(self.jobs)}")
+
+        pending = set(tasks)
+        while pending and not self.stop_event.is_set():
+            done, pending = await asyncio.wait(pending | {stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(stop_waiter)
+            for task in done - {stop_waiter}:
+                self._report(tasks[task], task)
+
+        if pending:
+            done, pending = await asyncio.wait(pending, timeout=self.shutdown_timeout)
+            for task in done:
+                self._report(tasks[task], task)
+            for task in pending:
+                logger.warning(f"Cancelling job {tasks[task]} after {self.shutdown_timeout}s")
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        stop_waiter.cancel()
+        logger.info("All jobs stopped")
+
+    @staticmethod
+    def _report(name, task):
+        if task.cancelled():
+            logger.warning(f"Job {name} was cancelled")
+        elif task.exception() is not None:
+            logger.error(f"Job {name} failed: {task.exception()!r}")
+        else:
+            logger.info(f"Job {name} finished")
@@ -1,3 +1,4 @@
+import asyncio
 import time
 
 from utils.logger_utils import get_logger
@@ -60,6 +61,56 @@ class CLIJob:
 
         self._follow_end()
 
+    async def arun(self, stop_event=None, *args, **kwargs):
+        """
+        Async twin of run, so several jobs can share one event loop (see AsyncJobRunner).
+        Sleeps wake up early and the loop ends once stop_event is set.
+        """
+        stop_event = stop_event or asyncio.Event()
+        self._pre_start()
+        try:
+            while not stop_event.is_set():
+                try:
+                    self._start()
+                    await self._aexecute(*args, **kwargs)
+                except Exception as ex:
+                    logger.exception(ex)
+                    logger.warning('Something went wrong!!!')
+                    if self.retry:
+                        logger.warning(f'Try again after {SLEEP_DURATION} seconds ...')
+                        if await self._wait(stop_event, SLEEP_DURATION):
+                            break
+                        continue
+
+                self._end()
+
+                # Check if not repeat
+                if not self.interval:
+                    break
+
+                # Check if finish
+                next_synced_timestamp = self._get_next_synced_timestamp()
+                if self._check_finish(next_synced_timestamp):
+                    break
+
+                # Sleep to next synced time, or until stopped
+                time_sleep = next_synced_timestamp - time.time()
+                if time_sleep > 0:
+                    logger.info(f'Sleep {round(time_sleep, 3)} seconds')
+                    if await self._wait(stop_event, time_sleep):
+                        break
+        finally:
+            self._follow_end()
+
+    @staticmethod
+    async def _wait(stop_event, timeout):
+        # True if stop_event was set before the timeout
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
     def _get_next_synced_timestamp(self):
         # Get the next execute timestamp
         return round_timestamp(int(time.time()), round_time=self.interval) + self.interval
@@ -95,6 +146,10 @@ class CLIJob:
         # Main execute handler
         pass
 
+    async def _aexecute(self, *args, **kwargs):
+        # Main execute handler inside a running event loop, override for native async jobs
+        await asyncio.to_thread(self._execute, *args, **kwargs)
+
     def _retry(self):
         # Do before retry
         logger.warning(f'Try again after {SLEEP_DURATION} seconds ...')
@@ -15,13 +15,20 @@ from databases.mongodb_centic import MongoDBCentic
 from telethon.tl.types import User
 from telethon.tl.types import Message
 from src.jobs.cli_job import CLIJob
+from utils.async_exporter_utils import aget_doc, aupdate_docs
+from utils.checkpoint_utils import CheckpointStore
 from utils.file_utils import write_last_time_running_logs
 from utils.logger_utils import get_logger
+from utils.metrics_utils import DOCUMENTS_CONVERTED, observe_rate_limit
+from utils.profiling_utils import span, timed_aiter
+from utils.telegram_media_utils import MediaPipeline
 from utils.time_utils import round_timestamp
 from telethon.tl.functions.channels import GetFullChannelRequest, GetParticipantRequest
 
 logger = get_logger('Telegram Project Crawling Job')
 
+MESSAGES_PER_CHECKPOINT = 200
+
 
 class TelegramProjectCrawlingJob(CLIJob):
     def __init__(
@@ -35,7 +42,13 @@ class TelegramProjectCrawlingJob(CLIJob):
             api_hash: str = AccountConfig.TELE_API_HASH,
             session_id: str = "telegram",
             monitor: bool = False,
-            stream_types: list = ["users", "messages", "new_users", "check_announcement"]
+            stream_types: list = ["users", "messages", "new_users", "check_announcement"],
+            resume: bool = False,
+            run_id: str = None,
+            media_dir: str = None,
+            media_workers: int = 4,
+            media_queue_size: int = 10_000,
+            media_max_size: int = 20 * 1024 * 1024,
     ):
         super().__init__(interval, period, retry=False)
         self.stream_types = stream_types
@@ -46,8 +59,18 @@ class TelegramProjectCrawlingJob(CLIJob):
         self.mongodb_centic = mongodb_centic
         self.projects = projects
         self.client = TelegramClient(session_id, int(self.api_id), self.api_hash)
+        self.resume = resume
+        self.run_id = run_id
+        self.checkpoints = None
+        self.media_dir = media_dir
+        self.media_workers = media_workers
+        self.media_queue_size = media_queue_size
+        self.media_max_size = media_max_size
+        # Started per run with --media-dir, downloads media next to message ingestion
+        self.media_pipeline = None
 
     def convert_user_to_dict(self, user: User, project, _id):
+        DOCUMENTS_CONVERTED.labels("telegram_user").inc()
         return {
             TelegramUser.id_: f"{_id}_{user.id}",
             TelegramUser.user_id: str(user.id),
@@ -82,6 +105,7 @@ class TelegramProjectCrawlingJob(CLIJob):
         }
 
     def convert_message_to_dict(self, message: Message, project, _id):
+        DOCUMENTS_CONVERTED.labels("telegram_message").inc()
         result = {
             TelegramMessage.id_: f"{_id}_{message.id}",
             TelegramMessage.channel: _id,
@@ -178,7 +202,8 @@ class TelegramProjectCrawlingJob(CLIJob):
 
     # NEW USER
     async def update_new_users(self, project, _id, project_id):
-        channel_full_info = await self.client(GetFullChannelRequest(channel=project_id))
+        with span("api_fetch"):
+            channel_full_info = await self.client(GetFullChannelRequest(channel=project_id))
         config = {
             "_id": f"{_id}_telegram_update",
             "participants": channel_full_info.full_chat.participants_count,
@@ -190,11 +215,11 @@ class TelegramProjectCrawlingJob(CLIJob):
                 }
             }
         }
-        self.exporter.update_docs(MongoCollection.configs, [config])
+        await aupdate_docs(self.exporter, MongoCollection.configs, [config])
         await self.export_new_users(project, _id, project_id)
 
     async def export_new_users(self, project, _id, project_id):
-        config = self.exporter.get_doc(MongoCollection.configs, filter_={"_id": f"{_id}_telegram_update"})
+        config = await aget_doc(self.exporter, MongoCollection.configs, filter_={"_id": f"{_id}_telegram_update"})
         last_update_timestamp = int(time.time())
         if config:
             last_update_timestamp = config.get("timestamp") - self.interval
@@ -203,17 +228,18 @@ class TelegramProjectCrawlingJob(CLIJob):
                 filter_={TelegramMessage.timestamp: {"$gte": last_update_timestamp}}):
             user_id = message.get(TelegramMessage.from_id, {}).get("userId")
             if user_id:
-                user_info = self.exporter.get_doc(
-                    MongoCollection.telegram_users, filter_={TelegramUser.id_: f"{project}_{user_id}"})
+                user_info = await aget_doc(
+                    self.exporter, MongoCollection.telegram_users, filter_={TelegramUser.id_: f"{project}_{user_id}"})
                 if user_info:
                     await self.update_user_info(project, _id, project_id, user_id)
 
     # ALL USERS
     async def update_all_users(self, project, _id, project_id):
         tmp = 0
-        async for entity in self.client.iter_participants(entity=project_id):
-            user = self.convert_user_to_dict(entity, project, _id)
-            self.exporter.update_docs(MongoCollection.telegram_users, [user])
+        async for entity in timed_aiter(self.client.iter_participants(entity=project_id), "api_fetch"):
+            with span("convert"):
+                user = self.convert_user_to_dict(entity, project, _id)
+            await aupdate_docs(self.exporter, MongoCollection.telegram_users, [user])
             tmp += 1
         tmp += await self.export_all_users_send_message(project, _id, project_id)
         return tmp
@@ -225,18 +251,20 @@ class TelegramProjectCrawlingJob(CLIJob):
                 filter_={}):
             user_id = message.get(TelegramMessage.from_id, {}).get("userId")
             if user_id:
-                user_info = self.exporter.get_doc(
-                    MongoCollection.telegram_users, filter_={TelegramUser.id_: f"{_id}_{user_id}"})
+                user_info = await aget_doc(
+                    self.exporter, MongoCollection.telegram_users, filter_={TelegramUser.id_: f"{_id}_{user_id}"})
                 if not user_info:
                     tmp += await self.update_user_info(project, _id, project_id, user_id)
         return tmp
 
     async def update_user_info(self, project, _id, project_id, user_id):
         try:
-            full = await self.client(GetParticipantRequest(channel=project_id, participant=int(user_id)))
+            with span("api_fetch"):
+                full = await self.client(GetParticipantRequest(channel=project_id, participant=int(user_id)))
             if full.users:
-                user_info = self.convert_user_to_dict(full.users[0], project, _id)
-                self.exporter.update_docs(MongoCollection.telegram_users, [user_info])
+                with span("convert"):
+                    user_info = self.convert_user_to_dict(full.users[0], project, _id)
+                await aupdate_docs(self.exporter, MongoCollection.telegram_users, [user_info])
             return 1
         except Exception as e:
             logger.warn(f"Get err {e}")
@@ -258,15 +286,25 @@ class TelegramProjectCrawlingJob(CLIJob):
     #     return tmp
 
     async def update_messages_periods(self, project, _id, project_id):
-        config = self.exporter.get_doc(MongoCollection.configs, filter_={"_id": f"{_id}_telegram_update"})
+        config = await aget_doc(self.exporter, MongoCollection.configs, filter_={"_id": f"{_id}_telegram_update"})
         tmp = 0
         last_update_timestamp = None
         if config:
             last_update_timestamp = config.get("timestamp") - self.period
-        async for entity in self.client.iter_messages(entity=project_id):
-            message = self.convert_message_to_dict(entity, project, _id)
-            self.exporter.update_docs(MongoCollection.telegram_messages, [message])
+        # Messages come newest first, resume below the last one exported by an interrupted run
+        unit = f"{_id}:messages"
+        offset_id = self.checkpoints.cursor(unit, 0) if self.checkpoints else 0
+        messages = self.client.iter_messages(entity=project_id, offset_id=offset_id)
+        async for entity in timed_aiter(messages, "api_fetch"):
+            with span("convert"):
+                message = self.convert_message_to_dict(entity, project, _id)
+            media = self.media_pipeline.describe(entity, message) if self.media_pipeline else None
+            await aupdate_docs(self.exporter, MongoCollection.telegram_messages, [message])
+            if media:
+                self.media_pipeline.submit(entity, message[TelegramMessage.id_], media)
             tmp += 1
+            if self.checkpoints and not tmp % MESSAGES_PER_CHECKPOINT:
+                await self.checkpoints.asave_cursor(unit, entity.id)
             if last_update_timestamp and message.get(TelegramMessage.timestamp) < last_update_timestamp:
                 break
         return tmp
@@ -402,12 +440,14 @@ class TelegramProjectCrawlingJob(CLIJob):
                 match = re.search(r"A wait of (\d+) seconds is required", str(e))
                 if match:
                     wait_time = int(match.group(1))
+                    observe_rate_limit("GetFullChannelRequest", "telegram", wait_time)
                     logger.info(f"Waiting for {wait_time} seconds...")
                 else:
                     wait_time = 3  # Default wait time if no specific duration is found
                     logger.info("Continuing in 3 seconds...")
 
-                await asyncio.sleep(wait_time)
+                with span("sleep"):
+                    await asyncio.sleep(wait_time)
 
         else:
             for project in list_projects:
@@ -417,13 +457,17 @@ class TelegramProjectCrawlingJob(CLIJob):
                             if 'settings' in document and 'socialMedia' in document['settings']:
                                 for item in document['settings']['socialMedia']:
                                     if item.get('platform') == 'telegram' and item.get('type') == 'channel':
+                                        _id = item.get("id")
+                                        streams = [stream for stream in ("messages", "new_users", "users")
+                                                   if stream in self.stream_types]
+                                        if streams and all(self.checkpoints.is_done(f"{_id}:{stream}") for stream in streams):
+                                            continue
                                         async for i in self.client.iter_dialogs():
                                             continue
-                                        _id = item.get("id")
                                         if "telegramId" in item:
                                             logger.info(f"Start crawling {project} project info")
-                                            self.exporter.update_docs(
-                                                MongoCollection.configs,
+                                            await aupdate_docs(
+                                                self.exporter, MongoCollection.configs,
                                                 [{"_id": f"{_id}_telegram_update",
                                                   "timestamp": round_timestamp(time.time())}])
                                         else:
@@ -435,36 +479,56 @@ class TelegramProjectCrawlingJob(CLIJob):
                                         #     [{"_id": f"{_id}_telegram_update", "timestamp": round_timestamp(time.time())}])
                                         await self.export_new_users(project, _id, project_id)
                                         print(f"{project}, {_id}, {project_id}")
-                                        if "messages" in self.stream_types:
+                                        if "messages" in streams and not self.checkpoints.is_done(f"{_id}:messages"):
                                             begin = time.time()
                                             logger.info(f"Get messages of {_id}")
                                             # tmp = await self.update_messages(project, project_id)
                                             tmp = await self.update_messages_periods(project, _id, project_id)
+                                            await self.checkpoints.amark_done(f"{_id}:messages")
                                             logger.info(f"Crawled {tmp} messages!")
                                             logger.info(f"Execute in {time.time() - begin}s")
 
-                                        if "new_users" in self.stream_types:
+                                        if "new_users" in streams and not self.checkpoints.is_done(f"{_id}:new_users"):
                                             begin = time.time()
                                             logger.info(f"Get new members info of {_id}")
                                             await self.update_new_users(project, _id, project_id)
+                                            await self.checkpoints.amark_done(f"{_id}:new_users")
                                             logger.info(f"Execute in {time.time() - begin}s !")
 
-                                        if "users" in self.stream_types:
+                                        if "users" in streams and not self.checkpoints.is_done(f"{_id}:users"):
                                             begin = time.time()
                                             logger.info(f"Get all members info of {_id}")
                                             tmp = await self.update_all_users(project, _id, project_id)
+                                            await self.checkpoints.amark_done(f"{_id}:users")
                                             logger.info(f"Crawled {tmp} users!")
                                             logger.info(f"Execute in {time.time() - begin}s !")
                 except Exception as e:
                     logger.warn(f"Get err {e}")
                     logger.info("Continuing in 3 seconds...")
-                    await asyncio.sleep(3)
+                    with span("sleep"):
+                        await asyncio.sleep(3)
 
     def _execute(self, *args, **kwargs):
+        self.client.loop.run_until_complete(self._aexecute(*args, **kwargs))
+
+    async def _aexecute(self, *args, **kwargs):
         begin = time.time()
         logger.info("Start execute telegram crawler")
-        with self.client:
-            self.client.loop.run_until_complete(self.execute())
+        job_key = "_".join(["telegram", *self.stream_types])
+        run_id = self.run_id or CheckpointStore.run_id_for(job_key, self.interval)
+        async with CheckpointStore(self.exporter, run_id, resume=self.resume) as self.checkpoints:
+            async with self.client:
+                if self.media_dir:
+                    self.media_pipeline = MediaPipeline(
+                        self.client, self.exporter, self.media_dir, workers=self.media_workers,
+                        queue_size=self.media_queue_size, max_size=self.media_max_size)
+                    self.media_pipeline.start()
+                try:
+                    await self.execute()
+                finally:
+                    if self.media_pipeline:
+                        await self.media_pipeline.close()
+                        self.media_pipeline = None
         # for project in self.projects:
         #     if project not in Projects.mapping:
         #         continue
@@ -3,27 +3,40 @@ import os
 import sys
 import time
 
-import pycountry
-
 sys.path.append(os.getcwd())
 
 from typing import AsyncGenerator, TypeVar
 
 from dotenv import load_dotenv
+from pymongo import MongoClient
 from twscrape import Tweet, User, gather
 
+from constants.config import MongoDBConfig
+from constants.mongo_constant import MongoCollection
 from constants.time_constant import TimeConstants
 from constants.twitter import Follow, Tweets, TwitterUser
 from databases.mongodb_cdp import MongoDBCDP
 from cli_scheduler.scheduler_job import SchedulerJob
+from utils.country_utils import find_country
 from utils.logger_utils import get_logger
+from utils.metrics_utils import DOCUMENTS_CONVERTED
+from utils.profiling_utils import span
+from utils.recrawl_utils import RecrawlScheduler, accounts_for_budget
 from utils.time_utils import round_timestamp
+from utils.tweet_utils import split_embedded_tweets
+from utils.work_queue import MongoWorkQueue, default_worker_id
 from utils.twitter_utils.add_account import dynamic_account_module
 
 T = TypeVar("T")
 logger = get_logger(__name__)
 load_dotenv()
 
+CURSOR_BATCH_SIZE = 1000
+QUEUE_LEASE_SECONDS = 600
+# Point bounds on elite (missing / null / false), so the elite_* indexes return the batch in
+# sort order. {"$ne": True} is a range on elite and needs a blocking in-memory SORT.
+NON_ELITE_FILTER = {"elite": {"$in": [False, None]}}
+
 class TwitterGrowing3CrawlingJob(SchedulerJob):
     def __init__(
         self,
@@ -37,6 +50,12 @@ class TwitterGrowing3CrawlingJob(SchedulerJob):
         api_v=None,
         batch_size=None,
         num_accounts=None,
+        adaptive=False,
+        budget=None,
+        use_queue=False,
+        queue_url=None,
+        pooled=False,
+        normalize_tweets=False,
     ):
         super().__init__(scheduler=scheduler, interval=interval, retry=False)
         if stream_types is None:
@@ -51,15 +70,20 @@ class TwitterGrowing3CrawlingJob(SchedulerJob):
         self.api_v = api_v
         self.num_accounts = num_accounts
         self.batch_size = batch_size
+        self.adaptive = adaptive
+        self.budget = budget
+        self.recrawl_scheduler = RecrawlScheduler()
+        self.use_queue = use_queue
+        self.queue_url = queue_url
+        self.pooled = pooled
+        self.normalize_tweets = normalize_tweets
+        # Originals already upserted by this run, with normalize_tweets
+        self.seen_originals = set()
 
     @staticmethod
     def convert_user_to_dict(user: User) -> dict:
-        text = user.location
-        country_name = ""
-        for country in pycountry.countries:
-            if country.name.lower() in text.lower():
-                country_name = country.name
-                break
+        DOCUMENTS_CONVERTED.labels("twitter_user").inc()
+        country_name = find_country(user.location)
 
         return {
             TwitterUser.id_: str(user.id),
@@ -118,6 +142,7 @@ class TwitterGrowing3CrawlingJob(SchedulerJob):
     def convert_tweets_to_dict(self, tweet: Tweet) -> dict:
         if not tweet:
             return {}
+        DOCUMENTS_CONVERTED.labels("tweet").inc()
         result = {
             Tweets.id_: str(tweet.id),
             Tweets.author: str(tweet.user.id),
@@ -172,9 +197,71 @@ class TwitterGrowing3CrawlingJob(SchedulerJob):
             self.exporter.update_docs("twitter_raw", [self.convert_user_to_dict(x)])
             tmp += 1
             if tmp and not (tmp % n_items):
-                time.sleep(time_sleep)
+                with span("sleep"):
+                    await asyncio.sleep(time_sleep)
         return tmp
 
+    async def crawl_account(self, api, account_doc, api_name, stream_types, exporter, limit, period):
+        """
+        Crawl one account, errors are raised to the caller.
+
+        Returns:
+            (profile crawled, nextCrawl already scheduled)
+        """
+        account = account_doc.get("userName")
+        crawled = scheduled = False
+        if "profiles" in stream_types:
+            logger.info(f"Crawling {account} info with {api_name}")
+            with span("api_fetch"):
+                project_info = await api.user_by_login(account)
+            if project_info:
+                with span("convert"):
+                    profile_data = self.convert_user_to_dict(project_info)
+                if self.adaptive:
+                    profile_data.update(self.recrawl_scheduler.schedule(account_doc, profile_data))
+                    scheduled = True
+                profile_data[TwitterUser.last_crawled] = int(time.time())
+                exporter.update_docs("twitter_raw", [profile_data])
+                crawled = True
+
+        if "tweets" in stream_types:
+            logger.info(f"Crawling {account} tweets info with {api_name}")
+            with span("api_fetch"):
+                project_info = await api.user_by_login(account)
+                if project_info is None:
+                    return crawled, scheduled
+                if limit is None:
+                    tweets = await gather(api.user_tweets(project_info.id))
+                else:
+                    tweets = await gather(
+                        api.user_tweets(project_info.id, limit=limit)
+                    )
+            count = 0
+            _period = (
+                round_timestamp(time.time()) - period + TimeConstants.A_DAY
+            )
+            # One write per account, a single bulk with --merge-upserts
+            tweet_docs = []
+            for tweet in tweets:
+                with span("convert"):
+                    tweet_data = self.convert_tweets_to_dict(tweet)
+                if tweet_data["timestamp"] > _period:
+                    count += 1
+                    tweet_docs.extend(self._tweet_docs(tweet_data))
+            if tweet_docs:
+                exporter.update_docs("tweets", tweet_docs)
+
+            logger.info(
+                f"Crawled {count} tweets of {account} with {api_name}"
+            )
+        return crawled, scheduled
+
+    def _tweet_docs(self, tweet_data):
+        if self.normalize_tweets:
+            # Originals go to their own docs, the retweet / quote only keeps {_id, authorName}
+            return split_embedded_tweets(tweet_data, self.seen_originals)
+        return [tweet_data]
+
     async def crawl(
         self,
         api,
@@ -188,78 +275,160 @@ class TwitterGrowing3CrawlingJob(SchedulerJob):
         tmp = 0
         len_all_accounts = len(accounts)
        
-        for account in accounts:
-            account = account.get("userName")
+        for account_doc in accounts:
+            crawled = scheduled = False
             try:
-                if "profiles" in stream_types:
-                    logger.info(f"Crawling {account} info with {api_name}")
-                    project_info = await api.user_by_login(account)
-                    if project_info:
-                        profile_data = self.convert_user_to_dict(project_info)
-                
-                        exporter.update_docs("twitter_raw", [profile_data])
-                        tmp += 1
-                        logger.info(
-                            f"Crawled {tmp}/{len_all_accounts} accounts with {api_name}"
-                        )
-
-                if "tweets" in stream_types:
-                    logger.info(f"Crawling {account} tweets info with {api_name}")
-                    project_info = await api.user_by_login(account)
-                    if project_info is None:
-                        continue
-                    if limit is None:
-                        tweets = await gather(api.user_tweets(project_info.id))
-                    else:
-                        tweets = await gather(
-                            api.user_tweets(project_info.id, limit=limit)
-                        )
-                    count = 0
-                    _period = (
-                        round_timestamp(time.time()) - period + TimeConstants.A_DAY
-                    )
-                    for tweet in tweets:
-                        tweet_data = self.convert_tweets_to_dict(tweet)
-                        if tweet_data["timestamp"] > _period:
-                            count += 1
-                            exporter.update_docs("tweets", [tweet_data])
-
+                crawled, scheduled = await self.crawl_account(
+                    api, account_doc, api_name, stream_types, exporter, limit, period
+                )
+                if crawled:
+                    tmp += 1
                     logger.info(
-                        f"Crawled {count} tweets of {account} with {api_name}"
+                        f"Crawled {tmp}/{len_all_accounts} accounts with {api_name}"
                     )
 
             except Exception as e:
                 logger.warn(f"Get error {e} on {api_name}")
                 logger.info("Continuing in 3 seconds...")
-                await asyncio.sleep(3)
+                with span("sleep"):
+                    await asyncio.sleep(3)
+
+            finally:
+                # Failed or missing accounts go to the back of the queue, a crawled profile already set lastCrawled
+                if not crawled and TwitterUser.id_ in account_doc:
+                    self._mark_crawled(exporter, account_doc, scheduled)
 
             if tmp == len_all_accounts:
                 logger.info(
                     "########## Finished ##########"
                 )
 
+    def _get_work_queue(self):
+        # One queue per scheduler (elite / non-elite), shared by every worker on every machine
+        collection = MongoClient(self.queue_url or MongoDBConfig.CDP_CONNECTION_URL)[
+            MongoDBConfig.CDP_DATABASE][MongoCollection.crawl_tasks]
+        queue_name = f"growing3_{self.scheduler.strip('^').replace('@', '_')}"
+        return MongoWorkQueue(collection, queue_name, lease_seconds=QUEUE_LEASE_SECONDS)
+
+    async def _heartbeat(self, queue, task, worker):
+        while True:
+            await asyncio.sleep(QUEUE_LEASE_SECONDS / 3)
+            if not queue.heartbeat(task, worker):
+                logger.warning(f"Lost lease on {task['_id']}")
+                return
+
+    async def execute_queue(self, elite=True):
+        """
+        Every worker enqueues this run's selection (idempotent, task ids carry the run
+        window), then claims accounts one by one until the queue is drained. A worker
+        that dies stops heartbeating and its task is picked up by another one once the
+        lease expires. Failed tasks wait out their retry backoff and leases held by other
+        workers may still expire, so an empty claim only ends the run once nothing is left.
+        """
+        add_account_func = await self._get_add_account_function()
+        if not add_account_func:
+            logger.error("Invalid API version")
+            return
+
+        api = await add_account_func()
+        queue = self._get_work_queue()
+        usernames = await (self._get_elite_usernames() if elite else self._get_no_elite_usernames())
+        run_window = round_timestamp(time.time(), self.interval)
+        added = queue.enqueue(
+            (f"{run_window}_{doc['userName']}", doc) for doc in usernames if doc.get("userName")
+        )
+        logger.info(f"Enqueued {added} new tasks on {queue.queue}, depth {queue.depth()}")
+
+        api_name = f"api_v{self.api_v}"
+        worker = default_worker_id(f"_{api_name}")
+        tmp = 0
+        while True:
+            task = queue.claim(worker)
+            if task is None:
+                available_at = queue.next_available_at()
+                if available_at is None:
+                    break
+                with span("sleep"):
+                    await asyncio.sleep(min(max(available_at - time.time(), 1), QUEUE_LEASE_SECONDS / 3))
+                continue
+            account_doc = task["payload"]
+            heartbeat = asyncio.create_task(self._heartbeat(queue, task, worker))
+            crawled = scheduled = False
+            try:
+                crawled, scheduled = await self.crawl_account(
+                    api, account_doc, api_name, self.stream_types, self.exporter, self.limit, self.period
+                )
+                queue.ack(task, worker)
+                tmp += crawled
+                logger.info(f"Crawled {tmp} accounts with {api_name}, depth {queue.depth()}")
+            except Exception as e:
+                logger.warn(f"Get error {e} on {api_name}")
+                queue.fail(task, worker, e)
+                with span("sleep"):
+                    await asyncio.sleep(3)
+            finally:
+                heartbeat.cancel()
+                if not crawled and TwitterUser.id_ in account_doc:
+                    self._mark_crawled(self.exporter, account_doc, scheduled)
+
+        reaped = queue.reap_expired()
+        if reaped:
+            logger.warning(f"Dead-lettered {reaped} tasks with expired leases")
+        logger.info("########## Finished ##########")
+
     async def _get_add_account_function(self):
+        if self.pooled:
+            return dynamic_account_module.add_account_pooled
         return getattr(
             dynamic_account_module, 
             f"add_account_v{self.api_v}", 
             None
         )
     
-    async def _get_elite_usernames(self):
+    def _get_stalest_usernames(self, filter_):
+        # Never crawled (no lastCrawled) first, then oldest crawl, most followed first on ties
         cursor = self.exporter.get_docs(
             "twitter_raw",
-            filter_={"elite": True},
-            projection={"userName": 1},
-        ).limit(self.batch_size)
+            filter_=filter_,
+            projection={TwitterUser.user_name: 1, TwitterUser.last_crawled: 1},
+        ).sort([
+            (TwitterUser.last_crawled, 1),
+            (TwitterUser.followers_count, -1),
+        ]).limit(self.batch_size or 0).batch_size(CURSOR_BATCH_SIZE)
         return list(cursor)
-    
-    async def _get_no_elite_usernames(self):
+
+    def _get_due_usernames(self, filter_):
+        # Only accounts whose nextCrawl has passed, most overdue first, within the request budget
+        limit = self.batch_size or 0
+        if self.budget:
+            limit = accounts_for_budget(self.budget, self.stream_types)
+        self.recrawl_scheduler.bootstrap(self.exporter, "twitter_raw", filter_, limit or CURSOR_BATCH_SIZE)
         cursor = self.exporter.get_docs(
             "twitter_raw",
-            filter_={"elite": {"$ne": True}},
-            projection={"userName": 1},
-        ).limit(self.batch_size)
+            filter_={**filter_, **self.recrawl_scheduler.due_filter()},
+            projection=self.recrawl_scheduler.projection(),
+        ).sort(self.recrawl_scheduler.due_sort()).limit(limit).batch_size(CURSOR_BATCH_SIZE)
         return list(cursor)
+
+    def _mark_crawled(self, exporter, account, scheduled=True):
+        doc = {
+            TwitterUser.id_: account[TwitterUser.id_],
+            TwitterUser.last_crawled: int(time.time()),
+        }
+        if self.adaptive and not scheduled:
+            # No fresh profile, keep the learned rate and push nextCrawl forward
+            doc.update(self.recrawl_scheduler.schedule(account, {}))
+        exporter.update_docs("twitter_raw", [doc])
+
+    async def _get_elite_usernames(self):
+        if self.adaptive:
+            return self._get_due_usernames({"elite": True})
+        return self._get_stalest_usernames({"elite": True})
+
+    async def _get_no_elite_usernames(self):
+        if self.adaptive:
+            return self._get_due_usernames(NON_ELITE_FILTER)
+        return self._get_stalest_usernames(NON_ELITE_FILTER)
     
     def _distribute_accounts(self, usernames):
         num_versions = self.num_accounts
@@ -367,7 +536,11 @@ class TwitterGrowing3CrawlingJob(SchedulerJob):
     def _execute(self, *args, **kwargs):
         begin = time.time()
         logger.info("Start execute twitter crawler")
-        if self.scheduler == "^true@daily" or self.scheduler == "^false@daily":
+        self.seen_originals = set()
+        elite = self.scheduler == "^true@daily" or self.scheduler == "^false@daily"
+        if self.use_queue:
+            asyncio.run(self.execute_queue(elite=elite))
+        elif elite:
             asyncio.run(self.execute_v1())
         else:
             asyncio.run(self.execute_v2())
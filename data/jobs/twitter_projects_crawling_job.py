@@ -3,7 +3,6 @@ import json
 import time
 from typing import AsyncGenerator, TypeVar
 
-import pycountry
 from twscrape import Tweet, User, gather
 
 from constants.config import AccountConfig
@@ -14,13 +13,22 @@ from databases.mongodb_cdp import MongoDBCDP
 from databases.mongodb_centic import MongoDBCentic
 from src.crawler.new_api import NewAPi
 from src.jobs.cli_job import CLIJob
+from utils.async_exporter_utils import aupdate_docs
+from utils.checkpoint_utils import CheckpointStore
+from utils.country_utils import find_country
 from utils.file_utils import write_last_time_running_logs
 from utils.logger_utils import get_logger
+from utils.metrics_utils import DOCUMENTS_CONVERTED
+from utils.recrawl_utils import RecrawlScheduler, accounts_for_budget
 from utils.time_utils import round_timestamp
+from utils.tweet_utils import split_embedded_tweets
 
 T = TypeVar("T")
 logger = get_logger("Twitter Project Crawling Job")
 
+# (user name, event loop) -> login future
+_shared_logins = {}
+
 
 class TwitterProjectCrawlingJob(CLIJob):
     def __init__(
@@ -40,6 +48,11 @@ class TwitterProjectCrawlingJob(CLIJob):
         monitor: bool = False,
         crawler_types=None,
         stream_types=None,
+        adaptive=False,
+        budget=None,
+        resume=False,
+        run_id=None,
+        normalize_tweets=False,
     ):
         super().__init__(interval, period, limit, retry=False)
         if crawler_types is None:
@@ -60,6 +73,16 @@ class TwitterProjectCrawlingJob(CLIJob):
         self.mongodb_centic = mongodb_centic
         self.projects = projects
         self.col_output = col_output
+        self.adaptive = adaptive
+        self.budget = budget
+        self.recrawl_scheduler = RecrawlScheduler()
+        self.previous_docs = {}
+        self.resume = resume
+        self.run_id = run_id
+        self.checkpoints = None
+        self.normalize_tweets = normalize_tweets
+        # Originals already upserted by this run, with normalize_tweets
+        self.seen_originals = set()
         self.projects_file = (
             self.load_projects_from_file(projects_file)
             if projects_file is not None
@@ -74,12 +97,8 @@ class TwitterProjectCrawlingJob(CLIJob):
 
     @staticmethod
     def convert_user_to_dict(user: User) -> dict:
-        text = user.location
-        country_name = ""
-        for country in pycountry.countries:
-            if country.name.lower() in text.lower():
-                country_name = country.name
-                break
+        DOCUMENTS_CONVERTED.labels("twitter_user").inc()
+        country_name = find_country(user.location)
 
         return {
             TwitterUser.id_: str(user.id),
@@ -135,6 +154,7 @@ class TwitterProjectCrawlingJob(CLIJob):
     def convert_tweets_to_dict(self, tweet: Tweet) -> dict:
         if not tweet:
             return {}
+        DOCUMENTS_CONVERTED.labels("tweet").inc()
         result = {
             Tweets.id_: str(tweet.id),
             Tweets.author: str(tweet.user.id),
@@ -187,23 +207,82 @@ class TwitterProjectCrawlingJob(CLIJob):
     ) -> int:
         tmp = 0
         async for x in gen:
-            self.exporter.update_docs(
-                MongoCollection.twitter_users, [self.convert_user_to_dict(x)]
+            await aupdate_docs(
+                self.exporter, MongoCollection.twitter_users, [self.convert_user_to_dict(x)]
             )
-            self.exporter.update_docs(
-                MongoCollection.twitter_follows, [self.get_relationship(project, x.id)]
+            await aupdate_docs(
+                self.exporter, MongoCollection.twitter_follows, [self.get_relationship(project, x.id)]
             )
             tmp += 1
             if tmp and not (tmp % n_items):
-                time.sleep(time_sleep)
+                await asyncio.sleep(time_sleep)
         return tmp
 
-    async def execute(self):
+    def _select_due_accounts(self, list_account):
+        # Skip accounts whose learned nextCrawl is still in the future, most overdue first
+        now = int(time.time())
+        self.previous_docs = {
+            doc.get(TwitterUser.user_name_lower): doc
+            for doc in self.exporter.get_docs(
+                self.col_output or MongoCollection.twitter_users,
+                filter_={TwitterUser.user_name_lower: {"$in": list_account}},
+                projection={**self.recrawl_scheduler.projection(), TwitterUser.user_name_lower: 1},
+            )
+        }
+        due = [
+            account for account in list_account
+            if (self.previous_docs.get(account, {}).get(TwitterUser.next_crawl) or 0) <= now
+        ]
+        due.sort(key=lambda account: self.previous_docs.get(account, {}).get(TwitterUser.next_crawl) or 0)
+        if self.budget:
+            due = due[:accounts_for_budget(self.budget, self.stream_types)]
+        logger.info(f"{len(due)}/{len(list_account)} accounts are due")
+        return due
+
+    def _profile_doc(self, account, project_info):
+        profile_data = self.convert_user_to_dict(project_info)
+        if self.adaptive:
+            profile_data.update(self.recrawl_scheduler.schedule(self.previous_docs.get(account, {}), profile_data))
+            profile_data[TwitterUser.last_crawled] = int(time.time())
+        return profile_data
+
+    async def _mark_crawled(self, previous):
+        await aupdate_docs(
+            self.exporter, self.col_output or MongoCollection.twitter_users,
+            [{TwitterUser.id_: previous[TwitterUser.id_],
+              TwitterUser.last_crawled: int(time.time()),
+              **self.recrawl_scheduler.schedule(previous, {})}],
+        )
+
+    def _tweet_docs(self, tweet_data):
+        if self.normalize_tweets:
+            # Originals go to their own docs, the retweet / quote only keeps {_id, authorName}
+            return split_embedded_tweets(tweet_data, self.seen_originals)
+        return [tweet_data]
+
+    async def _login(self):
         api = NewAPi()
         await api.pool.add_account(
             self.user_name, self.password, self.email, self.email_password
         )
         await api.pool.login_all()
+        return api
+
+    async def _get_api(self):
+        # Log in once per event loop, jobs hosted by the same AsyncJobRunner share the session
+        for stale in [k for k in _shared_logins if k[1].is_closed()]:
+            del _shared_logins[stale]
+        key = (self.user_name, asyncio.get_running_loop())
+        if key not in _shared_logins:
+            _shared_logins[key] = asyncio.ensure_future(self._login())
+        try:
+            return await asyncio.shield(_shared_logins[key])
+        except Exception:
+            _shared_logins.pop(key, None)
+            raise
+
+    async def execute(self):
+        api = await self._get_api()
 
         list_projects = self.mongodb_centic.get_docs(collection="projects")
         list_kols = self.exporter.get_docs(collection="twitter_kols_elite")
@@ -247,22 +326,29 @@ class TwitterProjectCrawlingJob(CLIJob):
             merged_set = set(account_db) | set(account_projects) | set(account_file)
             list_account = list(merged_set)
 
+        if self.adaptive:
+            list_account = self._select_due_accounts(list(dict.fromkeys(list_account)))
+
         tmp = 0
         for account in list_account:
             tmp += 1
+            if self.checkpoints.is_done(account):
+                continue
+            scheduled = False
             try:
                 if "profiles" in self.stream_types:
                     logger.info(f"Crawling {account} info")
                     project_info = await api.user_by_login(account)
                     if self.col_output:
-                        self.exporter.update_docs(
-                            self.col_output, [self.convert_user_to_dict(project_info)]
+                        await aupdate_docs(
+                            self.exporter, self.col_output, [self._profile_doc(account, project_info)]
                         )
                     else:
-                        self.exporter.update_docs(
-                            MongoCollection.twitter_users,
-                            [self.convert_user_to_dict(project_info)],
+                        await aupdate_docs(
+                            self.exporter, MongoCollection.twitter_users,
+                            [self._profile_doc(account, project_info)],
                         )
+                    scheduled = self.adaptive
                     logger.info(f"Crawled {tmp}/{len(list_account)} projects")
 
                 if "tweets" in self.stream_types:
@@ -281,34 +367,34 @@ class TwitterProjectCrawlingJob(CLIJob):
                     _period = (
                         round_timestamp(time.time()) - self.period + TimeConstants.A_DAY
                     )
+                    # One write per account, a single bulk with --merge-upserts
+                    tweet_docs = []
                     for tweet in tweets:
-                        if self.convert_tweets_to_dict(tweet)["timestamp"] > _period:
+                        tweet_data = self.convert_tweets_to_dict(tweet)
+                        if tweet_data["timestamp"] > _period:
                             count += 1
-                            if self.col_output:
-                                self.exporter.update_docs(
-                                    self.col_output,
-                                    [self.convert_tweets_to_dict(tweet)],
-                                )
-                            else:
-                                self.exporter.update_docs(
-                                    MongoCollection.tweets,
-                                    [self.convert_tweets_to_dict(tweet)],
-                                )
+                            tweet_docs.extend(self._tweet_docs(tweet_data))
+                    if tweet_docs:
+                        await aupdate_docs(self.exporter, self.col_output or MongoCollection.tweets, tweet_docs)
 
                     logger.info(f"Crawled {count} tweets of {account}")
                     logger.info(f"Crawled {tmp}/{len(list_account)} projects")
 
+                await self.checkpoints.amark_done(account)
+
             except Exception as e:
                 logger.warn(f"Get err {e}")
                 logger.info("Continuing in 3 seconds...")
                 await asyncio.sleep(3)
 
+            finally:
+                if self.adaptive and not scheduled and account in self.previous_docs:
+                    # Tweets only, failed or missing (suspended, renamed) accounts: keep the learned
+                    # rate and push nextCrawl forward, so they do not head every budget slice
+                    await self._mark_crawled(self.previous_docs[account])
+
     async def execute_v2(self):
-        api = NewAPi()
-        await api.pool.add_account(
-            self.user_name, self.password, self.email, self.email_password
-        )
-        await api.pool.login_all()
+        api = await self._get_api()
 
         list_projects = self.exporter.get_docs(collection="projects_social_media")
         list_accounts = []
@@ -327,6 +413,8 @@ class TwitterProjectCrawlingJob(CLIJob):
         for account in list_accounts:
             acc = account.get("id")
             tmp += 1
+            if self.checkpoints.is_done(f"followings:{acc}"):
+                continue
             try:
                 if "followings" in self.stream_types:
                     logger.info(f"Crawling accounts followed by {acc}")
@@ -344,17 +432,18 @@ class TwitterProjectCrawlingJob(CLIJob):
                     count = 0
                     for following in followings:
                         count += 1
-                        self.exporter.update_docs(
-                            MongoCollection.twitter_users,
+                        await aupdate_docs(
+                            self.exporter, MongoCollection.twitter_users,
                             [self.convert_user_to_dict(following)],
                         )
 
                         name_of_following = following.username
                         data["followings"].append(name_of_following)
 
-                    self.exporter.update_docs("twitter_followings_v2", [data])
+                    await aupdate_docs(self.exporter, "twitter_followings_v2", [data])
 
                     logger.info(f"Crawled {count} followings of {acc}")
+                    await self.checkpoints.amark_done(f"followings:{acc}")
 
             except Exception as e:
                 logger.warn(f"Get err {e}")
@@ -362,12 +451,19 @@ class TwitterProjectCrawlingJob(CLIJob):
                 await asyncio.sleep(3)
 
     def _execute(self, *args, **kwargs):
+        asyncio.run(self._aexecute(*args, **kwargs))
+
+    async def _aexecute(self, *args, **kwargs):
         begin = time.time()
         logger.info("Start execute twitter crawler")
-        if "followings" in self.stream_types:
-            asyncio.run(self.execute_v2())
-        else:
-            asyncio.run(self.execute())
+        self.seen_originals = set()
+        job_key = "_".join(["twitter", *self.stream_types, *self.crawler_types, *self.projects])
+        run_id = self.run_id or CheckpointStore.run_id_for(job_key, self.interval)
+        async with CheckpointStore(self.exporter, run_id, resume=self.resume) as self.checkpoints:
+            if "followings" in self.stream_types:
+                await self.execute_v2()
+            else:
+                await self.execute()
 
         logger.info(f"Execute all streams in {time.time() - begin}s")
         if self.monitor:
@@ -0,0 +1,15 @@
+import asyncio
+
+
+async def aupdate_docs(exporter, collection, data, *args, **kwargs):
+    """
+    exporter.update_docs in a worker thread. Jobs sharing an event loop (job_runner) await their
+    writes this way, so a Mongo round trip, or a hash cache save inside a wrapping exporter, does
+    not stall the other jobs. pymongo clients are thread safe, the exporter is shared as is.
+    """
+    return await asyncio.to_thread(exporter.update_docs, collection, data, *args, **kwargs)
+
+
+async def aget_doc(exporter, collection, *args, **kwargs):
+    """exporter.get_doc in a worker thread, see aupdate_docs."""
+    return await asyncio.to_thread(exporter.get_doc, collection, *args, **kwargs)
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from constants.mongo_constant import MongoCollection
+from constants.time_constant import TimeConstants
+from utils.logger_utils import get_logger
+from utils.time_utils import round_timestamp
+
+logger = get_logger('Checkpoint Store')
+
+
+class CheckpointStore:
+    """
+    Progress of one crawl run: finished units (an account, a channel stream, ...) and the
+    cursor of unfinished ones, stored in the crawl_checkpoints collection. Writes are
+    buffered and flushed every batch_size updates or flush_interval seconds, so a crash
+    only loses the last few units. Coroutines use the a* methods and `async with`: flushes
+    then run in a worker thread instead of blocking the event loop.
+
+    Args:
+        exporter: MongoDBCDP
+        run_id: id shared by every attempt of the same run (see run_id_for)
+        resume: load the progress of earlier attempts, otherwise start from scratch
+    """
+
+    def __init__(self, exporter, run_id, resume=False, batch_size=50, flush_interval=30,
+                 keep_seconds=TimeConstants.DAYS_7, collection=MongoCollection.crawl_checkpoints):
+        self.exporter = exporter
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.keep_seconds = keep_seconds
+        self.collection = collection
+        self.done = set()
+        self.cursors = {}
+        self._buffer = {}
+        self._last_flush = time.time()
+        if resume:
+            self.load()
+
+    @staticmethod
+    def run_id_for(name, interval=None, now=None):
+        # Restarts inside the same scheduled window resume the same run
+        return f"{name}_{round_timestamp(now or time.time(), interval or TimeConstants.A_DAY)}"
+
+    def load(self):
+        docs = self.exporter.get_docs(
+            self.collection, filter_={"runId": self.run_id}, projection={"unit": 1, "done": 1, "cursor": 1})
+        for doc in docs:
+            if doc.get("done"):
+                self.done.add(doc["unit"])
+            elif doc.get("cursor") is not None:
+                self.cursors[doc["unit"]] = doc["cursor"]
+        logger.info(f"Resuming {self.run_id}: {len(self.done)} units done, {len(self.cursors)} in progress")
+
+    def is_done(self, unit):
+        return unit in self.done
+
+    def cursor(self, unit, default=None):
+        return self.cursors.get(unit, default)
+
+    def mark_done(self, unit):
+        self._set_done(unit)
+        if self._due():
+            self.flush()
+
+    def save_cursor(self, unit, cursor):
+        self._set_cursor(unit, cursor)
+        if self._due():
+            self.flush()
+
+    async def amark_done(self, unit):
+        self._set_done(unit)
+        if self._due():
+            await self.aflush()
+
+    async def asave_cursor(self, unit, cursor):
+        self._set_cursor(unit, cursor)
+        if self._due():
+            await self.aflush()
+
+    def _set_done(self, unit):
+        self.done.add(unit)
+        self.cursors.pop(unit, None)
+        self._put(unit, {"done": True})
+
+    def _set_cursor(self, unit, cursor):
+        self.cursors[unit] = cursor
+        self._put(unit, {"done": False, "cursor": cursor})
+
+    def _put(self, unit, fields):
+        now = int(time.time())
+        # Keyed by _id, a unit updated twice before a flush is written once
+        self._buffer[f"{self.run_id}_{unit}"] = {
+            "_id": f"{self.run_id}_{unit}",
+            "runId": self.run_id,
+            "unit": unit,
+            "updatedAt": now,
+            # TTL indexes only expire BSON dates
+            "expireAt": datetime.now(timezone.utc) + timedelta(seconds=self.keep_seconds),
+            **fields,
+        }
+
+    def _due(self):
+        return len(self._buffer) >= self.batch_size or time.time() - self._last_flush >= self.flush_interval
+
+    def _take(self):
+        self._last_flush = time.time()
+        docs, self._buffer = list(self._buffer.values()), {}
+        return docs
+
+    def flush(self):
+        self._write(self._take())
+
+    async def aflush(self):
+        # Buffer taken on the event loop, only the write runs in the worker thread
+        docs = self._take()
+        if docs:
+            await asyncio.to_thread(self._write, docs)
+
+    def _write(self, docs):
+        if not docs:
+            return
+        try:
+            self.exporter.update_docs(self.collection, docs)
+        except Exception as ex:
+            logger.warning(f"Can not save {len(docs)} checkpoints of {self.run_id}: {ex}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aflush()
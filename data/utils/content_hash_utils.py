@@ -0,0 +1,219 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from constants.mongo_constant import MongoCollection
+from constants.time_constant import TimeConstants
+from constants.twitter import Tweets, TwitterUser
+from utils.logger_utils import get_logger
+from utils.metrics_utils import DOCUMENTS_UNCHANGED
+
+logger = get_logger('Content Hash')
+
+# Get a new entry every crawl: not hashed, only written along with a changed document
+LOG_FIELDS = frozenset({TwitterUser.count_logs, Tweets.impression_logs})
+# Crawl scheduling: not hashed, always written
+BOOKKEEPING_FIELDS = frozenset({TwitterUser.last_crawled, TwitterUser.change_rate, TwitterUser.next_crawl})
+TRACKED_COLLECTIONS = (MongoCollection.twitter_raw, MongoCollection.twitter_users, MongoCollection.tweets)
+DIGEST_SIZE = 4
+FIELD_SET_SIZE = 2
+
+
+def _canonical(value):
+    # Embedded retweeted / quoted tweets carry their own impressionLogs, ignored as well
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items() if k not in LOG_FIELDS}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def field_digest(value):
+    data = json.dumps(_canonical(value), sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+class ContentHashCache:
+    """
+    id -> content hash of the documents last written, per collection. The hash of a document
+    is the index of its field set followed by one DIGEST_SIZE bytes digest per field (sorted
+    by name): equal hashes mean an unchanged document, differing digests name the changed fields.
+
+    Persisted as gzipped JSON to path between runs. The cache is dropped once older than
+    max_age, so documents changed or deleted by other writers are fully rewritten at least
+    that often.
+    """
+
+    def __init__(self, path=None, max_age=TimeConstants.DAYS_7):
+        self.path = path
+        self.max_age = max_age
+        self.created_at = time.time()
+        self.field_sets = []
+        self._field_set_ids = {}
+        self.hashes = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, "rt") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Can not read {self.path}, starting with an empty cache: {ex}")
+            return
+        if time.time() - data.get("createdAt", 0) > self.max_age:
+            logger.info(f"{self.path} is older than {self.max_age}s, starting with an empty cache")
+            return
+        self.created_at = data["createdAt"]
+        self.field_sets = [tuple(names) for names in data["fieldSets"]]
+        self._field_set_ids = {names: i for i, names in enumerate(self.field_sets)}
+        self.hashes = {
+            collection: {doc_id: bytes.fromhex(value) for doc_id, value in hashes.items()}
+            for collection, hashes in data["hashes"].items()
+        }
+        logger.info(f"Loaded {len(self)} content hashes from {self.path}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "createdAt": self.created_at,
+                "fieldSets": self.field_sets,
+                "hashes": {
+                    collection: {doc_id: value.hex() for doc_id, value in hashes.items()}
+                    for collection, hashes in self.hashes.items()
+                },
+            }
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Written aside then renamed, a crash while saving keeps the previous cache
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return sum(len(hashes) for hashes in self.hashes.values())
+
+    def content_hash(self, fields):
+        """
+        Args:
+            fields: {field: value} hashed, _id and log / bookkeeping fields excluded
+
+        Returns:
+            (content hash, field names in digest order)
+        """
+        names = tuple(sorted(fields))
+        with self._lock:
+            field_set_id = self._field_set_ids.get(names)
+            if field_set_id is None:
+                field_set_id = self._field_set_ids[names] = len(self.field_sets)
+                self.field_sets.append(names)
+        digests = b"".join(field_digest(fields[name]) for name in names)
+        return field_set_id.to_bytes(FIELD_SET_SIZE, "big") + digests, names
+
+    def changed_fields(self, collection, doc_id, content_hash, names):
+        """
+        Returns:
+            None for an unchanged document, every name for an unknown document or field set,
+            otherwise the names whose digest changed
+        """
+        previous = self.hashes.get(collection, {}).get(doc_id)
+        if previous == content_hash:
+            return None
+        if previous is None or previous[:FIELD_SET_SIZE] != content_hash[:FIELD_SET_SIZE]:
+            return list(names)
+        changed = []
+        for i, name in enumerate(names):
+            begin = FIELD_SET_SIZE + i * DIGEST_SIZE
+            if previous[begin:begin + DIGEST_SIZE] != content_hash[begin:begin + DIGEST_SIZE]:
+                changed.append(name)
+        return changed
+
+    def put(self, collection, doc_id, content_hash):
+        with self._lock:
+            self.hashes.setdefault(collection, {})[doc_id] = content_hash
+
+
+class ChangeDetectingExporter:
+    """
+    Wrap an exporter (MongoDBCDP) to skip documents of the tracked collections whose content
+    did not change since this process last wrote them. Changed documents are reduced to _id,
+    the changed fields and their log entries (countLogs / impressionLogs), which update_docs
+    $sets. Bookkeeping fields (lastCrawled, nextCrawl) are always written. Other collections
+    and every other attribute are passed through.
+    """
+
+    def __init__(self, exporter, cache, collections=TRACKED_COLLECTIONS, save_interval=300):
+        self._exporter = exporter
+        self.cache = cache
+        self.collections = set(collections)
+        self.save_interval = save_interval
+        self._last_save = time.time()
+
+    def _reduce(self, collection, doc):
+        """
+        Returns:
+            (document to write or None, content hash to remember or None)
+        """
+        hashed = {
+            k: v for k, v in doc.items()
+            if k != TwitterUser.id_ and k not in LOG_FIELDS and k not in BOOKKEEPING_FIELDS
+        }
+        if not hashed or TwitterUser.id_ not in doc:
+            # e.g. _mark_crawled, nothing crawled to compare
+            return doc, None
+        doc_id = doc[TwitterUser.id_]
+        content_hash, names = self.cache.content_hash(hashed)
+        changed = self.cache.changed_fields(collection, str(doc_id), content_hash, names)
+        bookkeeping = {k: v for k, v in doc.items() if k in BOOKKEEPING_FIELDS}
+        if changed is None:
+            DOCUMENTS_UNCHANGED.labels(collection).inc()
+            return ({TwitterUser.id_: doc_id, **bookkeeping} if bookkeeping else None), None
+        logs = {k: v for k, v in doc.items() if k in LOG_FIELDS}
+        return {TwitterUser.id_: doc_id, **{name: hashed[name] for name in changed}, **logs, **bookkeeping}, content_hash
+
+    def update_docs(self, collection_name, data, *args, **kwargs):
+        if collection_name not in self.collections:
+            return self._exporter.update_docs(collection_name, data, *args, **kwargs)
+        docs, hashes = [], []
+        for doc in data:
+            reduced, content_hash = self._reduce(collection_name, doc)
+            if reduced is not None:
+                docs.append(reduced)
+            if content_hash is not None:
+                hashes.append((str(doc[TwitterUser.id_]), content_hash))
+        result = None
+        if docs:
+            result = self._exporter.update_docs(collection_name, docs, *args, **kwargs)
+        # Only remembered once written, a failed write is retried in full next time
+        for doc_id, content_hash in hashes:
+            self.cache.put(collection_name, doc_id, content_hash)
+        if time.time() - self._last_save > self.save_interval:
+            self.save()
+        return result
+
+    def save(self):
+        self._last_save = time.time()
+        try:
+            self.cache.save()
+        except OSError as ex:
+            logger.warning(f"Can not save content hashes to {self.cache.path}: {ex}")
+
+    def __getattr__(self, item):
+        return getattr(self._exporter, item)
+
+
+def with_change_detection(exporter, path=None, max_age=TimeConstants.DAYS_7, collections=TRACKED_COLLECTIONS):
+    """Wrap exporter in a ChangeDetectingExporter persisting to path (and once at exit), as is when path is None."""
+    if not path:
+        return exporter
+    wrapped = ChangeDetectingExporter(exporter, ContentHashCache(path, max_age=max_age), collections=collections)
+    atexit.register(wrapped.save)
+    return wrapped
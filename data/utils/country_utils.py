@@ -0,0 +1,23 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _country_names():
+    # pycountry loads its JSON databases on import, only pay for it when a profile is converted
+    import pycountry
+
+    return [(country.name.lower(), country.name) for country in pycountry.countries]
+
+
+def find_country(text):
+    """
+    Returns:
+        name of the first country (pycountry order) whose name appears in text, or ""
+    """
+    if not text:
+        return ""
+    text = text.lower()
+    for name_lower, name in _country_names():
+        if name_lower in text:
+            return name
+    return ""
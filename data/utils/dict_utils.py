@@ -3,39 +3,68 @@ import inspect
 
 
 def flatten_dict(d):
+    """
+    {"a": {"b": 1}, "c": [{"d": 2}, 3]} -> {"a.b": 1, "c.d": 2, "c": [3]}: nested dicts and the
+    dicts of lists become dotted keys, other list items stay in a list under the key.
+    """
     out = {}
-    for key, val in d.items():
-        if isinstance(val, dict):
-            val = [val]
-        if isinstance(val, list):
-            array = []
-            for subdict in val:
-                if not isinstance(subdict, dict):
-                    array.append(subdict)
-                else:
-                    deeper = flatten_dict(subdict).items()
-                    out.update({str(key) + '.' + str(key2): val2 for key2, val2 in deeper})
-            if array:
-                out.update({str(key): array})
+    # Frames (array, path, iterator) replace the recursion and its per level dicts: array is
+    # None for a dict (path is the "a.b." prefix), the non dict items for a list (path is its key)
+    stack = [(None, "", iter(d.items()))]
+    while stack:
+        array, path, items = stack[-1]
+        if array is None:
+            for key, val in items:
+                key = path + str(key)
+                if isinstance(val, dict):
+                    stack.append((None, key + ".", iter(val.items())))
+                    break
+                if isinstance(val, list):
+                    stack.append(([], key, iter(val)))
+                    break
+                out[key] = val
+            else:
+                stack.pop()
         else:
-            out[str(key)] = val
+            for item in items:
+                if isinstance(item, dict):
+                    stack.append((None, path + ".", iter(item.items())))
+                    break
+                array.append(item)
+            else:
+                stack.pop()
+                if array:
+                    out[path] = array
     return out
 
 
+def flatten_dicts(docs):
+    return [flatten_dict(d) for d in docs]
+
+
 def reverse_flatten_dict(d: dict) -> dict:
     result = {}
+    # Flattened keys come grouped by parent (countLogs.<ts>.*): the parent of the previous key
+    # is reused while the prefix is the same, a write under it can not replace it
+    last_prefix, parent = "", result
     for key, val in d.items():
-        nested_keys = key.split('.')
-        d_ = result
-        for k in nested_keys[:-1]:
-            if k not in d_:
-                d_[k] = {}
-            d_ = d_[k]
-        d_[nested_keys[-1]] = val
+        path, sep, leaf = key.rpartition('.')
+        if path + sep != last_prefix:
+            last_prefix, parent = path + sep, result
+            if sep:
+                for k in path.split('.'):
+                    if k not in parent:
+                        parent[k] = {}
+                    parent = parent[k]
+        parent[leaf] = val
 
     return result
 
 
+def reverse_flatten_dicts(docs):
+    return [reverse_flatten_dict(d) for d in docs]
+
+
 def add_dict(first_dict: dict, second_dict: dict):
     ans_dict = dict()
     for key in first_dict.keys():
@@ -53,24 +82,45 @@ def remove_none_value_dict(a_dict):
 
 def delete_none(_dict):
     """Delete None values recursively from all the dictionaries"""
-    for key, value in list(_dict.items()):
-        if isinstance(value, dict):
-            delete_none(value)
-        elif value is None:
-            del _dict[key]
-        elif isinstance(value, list):
-            for v_i in value:
-                if isinstance(v_i, dict):
-                    delete_none(v_i)
-
-    return _dict
+    return delete_none_docs([_dict])[0]
+
+
+def delete_none_docs(docs):
+    """delete_none over a batch, in place, with one explicit stack instead of recursion"""
+    stack = list(docs)
+    while stack:
+        current = stack.pop()
+        none_keys = []
+        for key, value in current.items():
+            if value is None:
+                none_keys.append(key)
+            elif isinstance(value, dict):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(v for v in value if isinstance(v, dict))
+        for key in none_keys:
+            del current[key]
+    return docs
 
 
 def filter_doc_by_keys(doc, keys):
-    doc_ = copy.deepcopy(doc)
     if keys is None:
-        return doc_
-    return dict(filter(lambda x: x[0] in keys, doc_.items()))
+        return copy.deepcopy(doc)
+    return filter_docs_by_keys([doc], keys)[0]
+
+
+def filter_docs_by_keys(docs, keys):
+    """filter_doc_by_keys over a batch: only the kept values are deep copied"""
+    if keys is None:
+        return [copy.deepcopy(doc) for doc in docs]
+    if not isinstance(keys, (set, frozenset, dict, str)):
+        keys = set(keys)
+    result = []
+    for doc in docs:
+        # One memo per document, values shared inside it stay shared like with deepcopy(doc)
+        memo = {}
+        result.append({k: copy.deepcopy(v, memo) for k, v in doc.items() if k in keys})
+    return result
 
 
 def get_class_constant_keys(cls):
@@ -0,0 +1,124 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server, write_to_textfile
+
+from utils.logger_utils import get_logger
+from utils.profiling_utils import span
+
+logger = get_logger('Metrics')
+
+# One registry per process, exposed over HTTP or flushed to a node_exporter textfile
+registry = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+WAIT_BUCKETS = (1, 5, 15, 60, 300, 900, 3600)
+BATCH_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+API_REQUEST_SECONDS = Histogram(
+    'crawler_api_request_seconds', 'Latency of one API request / result page', ['endpoint'],
+    buckets=LATENCY_BUCKETS, registry=registry)
+API_ERRORS = Counter(
+    'crawler_api_errors_total', 'API requests that raised', ['endpoint', 'error'], registry=registry)
+ACCOUNT_REQUESTS = Counter(
+    'crawler_account_requests_total', 'API requests per account', ['endpoint', 'account'], registry=registry)
+ACCOUNT_BUSY_SECONDS = Counter(
+    'crawler_account_busy_seconds_total', 'Time an account was checked out, divide by requests for latency',
+    ['endpoint', 'account'], registry=registry)
+RATE_LIMITS = Counter(
+    'crawler_rate_limits_total', 'Rate limit / flood wait responses', ['endpoint', 'account'], registry=registry)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    'crawler_rate_limit_wait_seconds', 'Wait imposed by a rate limit', ['endpoint'],
+    buckets=WAIT_BUCKETS, registry=registry)
+DOCUMENTS_CONVERTED = Counter(
+    'crawler_documents_converted_total', 'Documents converted from API objects', ['kind'], registry=registry)
+DOCUMENTS_UNCHANGED = Counter(
+    'crawler_documents_unchanged_total', 'Documents not rewritten, content hash unchanged', ['collection'],
+    registry=registry)
+MONGO_WRITE_SECONDS = Histogram(
+    'crawler_mongo_write_seconds', 'Latency of one Mongo write call', ['collection'],
+    buckets=LATENCY_BUCKETS, registry=registry)
+MONGO_BATCH_SIZE = Histogram(
+    'crawler_mongo_batch_size', 'Documents per Mongo write call', ['collection'],
+    buckets=BATCH_BUCKETS, registry=registry)
+MEDIA_FILES = Counter(
+    'crawler_media_files_total', 'Telegram media by outcome: queued, downloaded, deduplicated, ...', ['outcome'],
+    registry=registry)
+IMAGE_FETCHES = Counter(
+    'crawler_image_fetches_total', 'Profile / banner image fetches by status: cached, not_modified, downloaded, error',
+    ['status'], registry=registry)
+QUEUE_DEPTH = Gauge(
+    'crawler_queue_depth', 'Pending and leased tasks', ['queue'], registry=registry)
+
+
+@contextmanager
+def time_api_call(endpoint):
+    begin = time.perf_counter()
+    try:
+        yield
+    except Exception as ex:
+        API_ERRORS.labels(endpoint, type(ex).__name__).inc()
+        raise
+    finally:
+        API_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - begin)
+
+
+def observe_rate_limit(endpoint, account, wait_seconds):
+    RATE_LIMITS.labels(endpoint, account).inc()
+    RATE_LIMIT_WAIT_SECONDS.labels(endpoint).observe(max(wait_seconds, 0))
+
+
+class InstrumentedExporter:
+    """
+    Wrap an exporter (MongoDBCDP) to time update_docs and record batch sizes per collection,
+    every other attribute is passed through.
+    """
+
+    def __init__(self, exporter):
+        self._exporter = exporter
+
+    def update_docs(self, collection_name, data, *args, **kwargs):
+        begin = time.perf_counter()
+        try:
+            with span("mongo_write"):
+                return self._exporter.update_docs(collection_name, data, *args, **kwargs)
+        finally:
+            MONGO_WRITE_SECONDS.labels(collection_name).observe(time.perf_counter() - begin)
+            MONGO_BATCH_SIZE.labels(collection_name).observe(len(data))
+
+    def __getattr__(self, item):
+        return getattr(self._exporter, item)
+
+
+def _flush_textfile(path, interval, stop_event):
+    while not stop_event.wait(interval):
+        flush_textfile(path)
+
+
+def flush_textfile(path):
+    try:
+        write_to_textfile(path, registry)
+    except OSError as ex:
+        logger.warning(f"Can not write metrics to {path}: {ex}")
+
+
+def start_metrics(port=None, textfile=None, interval=15):
+    """
+    Expose the registry on http://0.0.0.0:<port>/metrics and/or flush it to textfile every
+    interval seconds (and once at exit). Does nothing when both are None.
+    """
+    if port:
+        start_http_server(port, registry=registry)
+        logger.info(f"Serving metrics on port {port}")
+    if textfile:
+        stop_event = threading.Event()
+        threading.Thread(target=_flush_textfile, args=(textfile, interval, stop_event), daemon=True).start()
+
+        def _final_flush():
+            stop_event.set()
+            flush_textfile(textfile)
+
+        atexit.register(_final_flush)
+        logger.info(f"Flushing metrics to {textfile} every {interval}s")
@@ -0,0 +1,146 @@
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from constants.mongo_constant import MongoCollection, MongoIndexes
+from utils.logger_utils import get_logger
+
+logger = get_logger('Mongo Index Utils')
+
+# Query shapes the crawlers and analytics scripts actually run, used to check for COLLSCANs and
+# in-memory SORTs
+QUERY_SHAPES = [
+    {
+        "name": "kol tweets in time range",
+        "collection": MongoCollection.tweets,
+        "filter": {"timestamp": {"$gte": 0, "$lte": 1}, "authorName": {"$in": ["a", "b"]}},
+    },
+    {
+        "name": "elite usernames",
+        "collection": MongoCollection.twitter_raw,
+        "filter": {"elite": True},
+        "projection": {"userName": 1, "lastCrawled": 1},
+        "sort": [("lastCrawled", 1), ("followersCount", -1)],
+    },
+    {
+        "name": "non elite usernames",
+        "collection": MongoCollection.twitter_raw,
+        "filter": {"elite": {"$in": [False, None]}},
+        "projection": {"userName": 1, "lastCrawled": 1},
+        "sort": [("lastCrawled", 1), ("followersCount", -1)],
+    },
+    {
+        # growing3 --adaptive: due accounts (RecrawlScheduler.due_filter / due_sort)
+        "name": "elite due usernames",
+        "collection": MongoCollection.twitter_raw,
+        "filter": {"elite": True, "nextCrawl": {"$not": {"$gt": 0}}},
+        "projection": {"userName": 1, "nextCrawl": 1},
+        "sort": [("nextCrawl", 1), ("followersCount", -1)],
+    },
+    {
+        "name": "non elite due usernames",
+        "collection": MongoCollection.twitter_raw,
+        "filter": {"elite": {"$in": [False, None]}, "nextCrawl": {"$not": {"$gt": 0}}},
+        "projection": {"userName": 1, "nextCrawl": 1},
+        "sort": [("nextCrawl", 1), ("followersCount", -1)],
+    },
+    {
+        "name": "kol profile by userName",
+        "collection": MongoCollection.twitter_raw,
+        "filter": {"userName": "a"},
+    },
+    {
+        "name": "new telegram messages",
+        "collection": MongoCollection.telegram_messages,
+        "filter": {"timestamp": {"$gte": 0}},
+    },
+    {
+        "name": "telegram messages by channel",
+        "collection": MongoCollection.telegram_messages,
+        "filter": {"channel": "a"},
+    },
+    {
+        "name": "telegram user by id",
+        "collection": MongoCollection.telegram_users,
+        "filter": {"_id": "a_1"},
+    },
+    {
+        "name": "config by id",
+        "collection": MongoCollection.configs,
+        "filter": {"_id": "a_telegram_update"},
+    },
+]
+
+
+def ensure_indexes(db, mapping=None):
+    """
+    Create the declared indexes. Existing indexes with the same keys and options are a
+    no-op on the server, so this is safe to run on every deploy.
+
+    Returns:
+        dict of collection -> created index names
+    """
+    mapping = mapping or MongoIndexes.mapping
+    created = {}
+    for collection, indexes in mapping.items():
+        models = []
+        for index in indexes:
+            options = {k: v for k, v in index.items() if k != "keys"}
+            models.append(IndexModel(index["keys"], background=True, **options))
+        try:
+            created[collection] = db[collection].create_indexes(models)
+            logger.info(f"Ensured indexes {created[collection]} on {collection}")
+        except OperationFailure as ex:
+            # IndexOptionsConflict / IndexKeySpecsConflict: an index exists under other options
+            logger.warning(f"Can not create indexes on {collection}: {ex}")
+    return created
+
+
+def find_plan_stages(plan, stage):
+    # Walk a winning plan (classic or SBE) and return every node of the given stage
+    found = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get("stage") == stage:
+                found.append(node)
+            stack.extend(v for k, v in node.items() if k in ("inputStage", "inputStages", "queryPlan", "shards"))
+            stack.extend(v for k, v in node.items() if k == "winningPlan")
+        elif isinstance(node, list):
+            stack.extend(node)
+    return found
+
+
+def explain_queries(db, query_shapes=None):
+    """
+    Run explain() on each query shape and report whether it needs a full collection scan or
+    a blocking in-memory SORT (the index does not return the requested order).
+
+    Returns:
+        list of dicts: name, collection, collscan (bool), blocking_sort (bool), indexes (index names used)
+    """
+    report = []
+    for shape in query_shapes or QUERY_SHAPES:
+        cursor = db[shape["collection"]].find(shape["filter"], projection=shape.get("projection"))
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        plan = cursor.explain().get("queryPlanner", {})
+        winning_plan = plan.get("winningPlan", {})
+        index_names = sorted({s.get("indexName") for s in find_plan_stages(winning_plan, "IXSCAN")})
+        collscan = bool(find_plan_stages(winning_plan, "COLLSCAN"))
+        blocking_sort = bool(find_plan_stages(winning_plan, "SORT"))
+        report.append({
+            "name": shape["name"],
+            "collection": shape["collection"],
+            "collscan": collscan,
+            "blocking_sort": blocking_sort,
+            "indexes": index_names,
+        })
+        if collscan:
+            logger.warning(f"COLLSCAN: {shape['name']} on {shape['collection']} {shape['filter']}")
+        elif blocking_sort:
+            logger.warning(f"SORT: {shape['name']} on {shape['collection']} {shape['filter']} "
+                           f"sorted in memory, {index_names} do not return {shape.get('sort')}")
+        else:
+            logger.info(f"OK: {shape['name']} on {shape['collection']} uses {index_names or ['_id']}")
+    return report
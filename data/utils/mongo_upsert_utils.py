@@ -0,0 +1,59 @@
+from pymongo import MongoClient, UpdateOne
+
+from constants.config import MongoDBConfig
+from utils.content_hash_utils import LOG_FIELDS, TRACKED_COLLECTIONS
+from utils.dict_utils import flatten_dict
+
+
+def merge_update(doc, merge_fields=LOG_FIELDS):
+    """
+    Upsert of doc that merges instead of replacing its log maps: merge_fields
+    ({timestamp: {counts}}) are flattened to dotted paths (countLogs.1700000000.followersCount),
+    so a new entry is added next to the history server side. Other fields are $set as is.
+
+    Returns:
+        UpdateOne for bulk_write
+    """
+    fields = {}
+    for key, value in doc.items():
+        if key == "_id":
+            continue
+        if key in merge_fields and isinstance(value, dict):
+            fields.update({f"{key}.{path}": leaf for path, leaf in flatten_dict(value).items()})
+        else:
+            fields[key] = value
+    return UpdateOne({"_id": doc["_id"]}, {"$set": fields}, upsert=True)
+
+
+class MergeUpsertExporter:
+    """
+    Wrap an exporter (MongoDBCDP): update_docs of the given collections sends one unordered
+    bulk_write of merge_update upserts to database (a pymongo Database), one round trip and no
+    read of the existing document. Other collections and every other attribute are passed through.
+    """
+
+    def __init__(self, exporter, database, collections=TRACKED_COLLECTIONS, merge_fields=LOG_FIELDS):
+        self._exporter = exporter
+        self.database = database
+        self.collections = set(collections)
+        self.merge_fields = merge_fields
+
+    def update_docs(self, collection_name, data, *args, **kwargs):
+        if collection_name not in self.collections:
+            return self._exporter.update_docs(collection_name, data, *args, **kwargs)
+        if not data:
+            return None
+        operations = [merge_update(doc, self.merge_fields) for doc in data]
+        return self.database[collection_name].bulk_write(operations, ordered=False)
+
+    def __getattr__(self, item):
+        return getattr(self._exporter, item)
+
+
+def with_merge_upserts(exporter, enabled=False, connection_url=None, database="cdp_database",
+                       collections=TRACKED_COLLECTIONS):
+    """Wrap exporter in a MergeUpsertExporter writing to connection_url / database, as is when not enabled."""
+    if not enabled:
+        return exporter
+    client = MongoClient(connection_url or MongoDBConfig.CDP_CONNECTION_URL)
+    return MergeUpsertExporter(exporter, client[database], collections=collections)
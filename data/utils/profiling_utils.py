@@ -0,0 +1,195 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from utils.logger_utils import get_logger
+
+logger = get_logger('Run Profiler')
+
+# Profiler of the run in progress, spans are no-ops when None
+_active = None
+
+
+@contextmanager
+def span(stage):
+    """Time a stage (api_fetch, convert, mongo_write, sleep, ...) of the profiled run."""
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(stage, time.perf_counter() - begin)
+
+
+async def timed_aiter(iterable, stage):
+    # Time only the waits for the next item, the loop body is timed by its own spans
+    iterator = iterable.__aiter__()
+    while True:
+        with span(stage):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+class _Sampler(threading.Thread):
+    """Samples the stack of one thread (the event loop) every interval via sys._current_frames."""
+
+    def __init__(self, thread_id, interval, max_depth=30):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.functions = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.samples += 1
+            self.functions[stack[0]] += 1
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RunProfiler:
+    """
+    Per run report: wall time per stage span, optionally a sampling profile of the calling
+    thread and the tracemalloc top allocators, written as JSON to output_dir.
+    """
+
+    def __init__(self, name, output_dir="profiles", sampling=False, memory=False, sample_interval=0.005, top=25):
+        self.name = name
+        self.output_dir = output_dir
+        self.sampling = sampling
+        self.memory = memory
+        self.sample_interval = sample_interval
+        self.top = top
+        self.stages = {}
+        self._sampler = None
+        self._begin = None
+
+    def add(self, stage, seconds):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = {"count": 0, "total": 0.0, "max": 0.0}
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+    def start(self):
+        global _active
+        _active = self
+        self._begin = time.time()
+        if self.memory:
+            tracemalloc.start()
+        if self.sampling:
+            self._sampler = _Sampler(threading.get_ident(), self.sample_interval)
+            self._sampler.start()
+
+    def stop(self):
+        global _active
+        _active = None
+        duration = time.time() - self._begin
+        report = {
+            "name": self.name,
+            "start": int(self._begin),
+            "duration": duration,
+            "stages": {
+                stage: {**stats, "share": stats["total"] / duration if duration else 0.0}
+                for stage, stats in sorted(self.stages.items(), key=lambda item: -item[1]["total"])
+            },
+        }
+        if self._sampler is not None:
+            self._sampler.stop()
+            samples = self._sampler.samples or 1
+            report["sampling"] = {
+                "interval": self.sample_interval,
+                "samples": self._sampler.samples,
+                "top_functions": [{"frame": frame, "share": count / samples}
+                                  for frame, count in self._sampler.functions.most_common(self.top)],
+                "top_stacks": [{"stack": stack, "samples": count}
+                               for stack, count in self._sampler.stacks.most_common(self.top)],
+            }
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            report["memory"] = {
+                "current": current,
+                "peak": peak,
+                "top_allocators": [
+                    {"location": str(stat.traceback[0]), "size": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:self.top]
+                ],
+            }
+        return report
+
+    def write(self, report):
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_path = os.path.join(self.output_dir, f"{self.name}_{report['start']}.json")
+        with open(file_path, "w") as f:
+            json.dump(report, f, indent=2)
+        stages = ", ".join(f"{stage} {stats['total']:.1f}s" for stage, stats in report["stages"].items())
+        logger.info(f"Profile of {self.name} ({report['duration']:.1f}s: {stages}) written to {file_path}")
+        return file_path
+
+
+def profile_job(job, name, output_dir="profiles", sampling=False, memory=False):
+    """
+    Wrap the job's _execute (and _aexecute when present) so every run is profiled. Nested
+    calls (_execute driving _aexecute) produce a single report.
+    """
+
+    def wrap(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(*args, **kwargs):
+                if _active is not None:
+                    return await method(*args, **kwargs)
+                profiler = RunProfiler(name, output_dir, sampling=sampling, memory=memory)
+                profiler.start()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    profiler.write(profiler.stop())
+        else:
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                if _active is not None:
+                    return method(*args, **kwargs)
+                profiler = RunProfiler(name, output_dir, sampling=sampling, memory=memory)
+                profiler.start()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    profiler.write(profiler.stop())
+        return wrapper
+
+    job._execute = wrap(job._execute)
+    if hasattr(job, "_aexecute"):
+        job._aexecute = wrap(job._aexecute)
+    return job
@@ -0,0 +1,141 @@
+import time
+
+from constants.time_constant import TimeConstants
+from constants.twitter import TwitterUser
+
+# Weight of the newest observation in the change rate moving average
+EWMA_ALPHA = 0.3
+# Approximate API requests spent per account for each stream type
+REQUESTS_PER_STREAM = {"profiles": 1, "tweets": 2}
+
+
+def accounts_for_budget(budget, stream_types):
+    requests_per_account = sum(REQUESTS_PER_STREAM.get(x, 1) for x in stream_types) or 1
+    return max(budget // requests_per_account, 1)
+
+
+def rate_from_count_logs(count_logs, field=TwitterUser.statuses_count):
+    """
+    Estimate changes per second of a counter from a countLogs map {timestamp: {field: value}}.
+    Returns None when there are less than two usable points.
+    """
+    points = sorted(
+        (int(ts), values.get(field)) for ts, values in (count_logs or {}).items()
+        if isinstance(values, dict) and values.get(field) is not None
+    )
+    if len(points) < 2 or points[-1][0] <= points[0][0]:
+        return None
+    return max(points[-1][1] - points[0][1], 0) / (points[-1][0] - points[0][0])
+
+
+def rate_from_lifetime(doc, now=None):
+    # Average statuses per second since the account was created
+    now = now or time.time()
+    created = doc.get(TwitterUser.timestamp)
+    statuses = doc.get(TwitterUser.statuses_count)
+    if not created or statuses is None or now <= created:
+        return None
+    return statuses / (now - created)
+
+
+class RecrawlScheduler:
+    """
+    Learn how often each account changes and decide when it is due again.
+
+    An account expected to post `target_changes` new statuses in t seconds is due again
+    after t, clamped to [min_interval, max_interval]. The rate is an exponential moving
+    average of the statusesCount delta seen between two crawls, bootstrapped from the
+    countLogs history or the lifetime average.
+    """
+
+    def __init__(self, min_interval=TimeConstants.A_HOUR * 6, max_interval=TimeConstants.DAYS_30,
+                 target_changes=1.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_changes = target_changes
+
+    @staticmethod
+    def due_filter(now=None):
+        # Matches missing/null nextCrawl as well as nextCrawl <= now, with a single index range
+        return {TwitterUser.next_crawl: {"$not": {"$gt": int(now or time.time())}}}
+
+    @staticmethod
+    def due_sort():
+        return [(TwitterUser.next_crawl, 1), (TwitterUser.followers_count, -1)]
+
+    @staticmethod
+    def projection():
+        return {
+            TwitterUser.user_name: 1,
+            TwitterUser.statuses_count: 1,
+            TwitterUser.timestamp: 1,
+            TwitterUser.last_crawled: 1,
+            TwitterUser.change_rate: 1,
+            TwitterUser.next_crawl: 1,
+        }
+
+    def estimate_rate(self, previous, current, now=None):
+        now = now or time.time()
+        previous_rate = previous.get(TwitterUser.change_rate)
+        last_crawled = previous.get(TwitterUser.last_crawled)
+        previous_count = previous.get(TwitterUser.statuses_count)
+        count = current.get(TwitterUser.statuses_count)
+
+        observed = None
+        if last_crawled and previous_count is not None and count is not None and now > last_crawled:
+            observed = max(count - previous_count, 0) / (now - last_crawled)
+
+        if previous_rate is None:
+            previous_rate = rate_from_count_logs(previous.get(TwitterUser.count_logs))
+        if previous_rate is None:
+            previous_rate = rate_from_lifetime(current or previous, now)
+        if observed is None:
+            return previous_rate or 0.0
+        if previous_rate is None:
+            return observed
+        return EWMA_ALPHA * observed + (1 - EWMA_ALPHA) * previous_rate
+
+    def interval(self, rate):
+        if not rate:
+            return self.max_interval
+        return min(max(self.target_changes / rate, self.min_interval), self.max_interval)
+
+    def schedule(self, previous, current, now=None):
+        """
+        Args:
+            previous: stored document (at least the fields of `projection()`), may be empty
+            current: freshly crawled profile document, may be empty if the crawl failed
+        Returns:
+            fields to $set: changeRate, nextCrawl
+        """
+        now = int(now or time.time())
+        rate = self.estimate_rate(previous or {}, current or {}, now)
+        return {
+            TwitterUser.change_rate: rate,
+            TwitterUser.next_crawl: now + int(self.interval(rate)),
+        }
+
+    def bootstrap(self, exporter, collection, filter_, limit):
+        """
+        Give crawled accounts without a schedule a first nextCrawl from their countLogs history, so
+        the due query spreads them over time instead of crawling all of them on the first run.
+        Never crawled accounts are left without nextCrawl: due_filter matches them and due_sort
+        puts them first.
+        """
+        cursor = exporter.get_docs(
+            collection,
+            filter_={**filter_, TwitterUser.next_crawl: {"$exists": False}, TwitterUser.last_crawled: {"$gt": 0}},
+            projection={**self.projection(), TwitterUser.count_logs: 1},
+        ).limit(limit)
+        now = int(time.time())
+        docs = []
+        for doc in cursor:
+            rate = self.estimate_rate(doc, {}, now)
+            docs.append({
+                TwitterUser.id_: doc[TwitterUser.id_],
+                TwitterUser.change_rate: rate,
+                TwitterUser.next_crawl: int(doc[TwitterUser.last_crawled] + self.interval(rate)),
+            })
+        if docs:
+            exporter.update_docs(collection, docs)
+        return len(docs)
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import os
+import time
+
+from telethon import utils as telethon_utils
+from telethon.tl import types
+
+from constants.mongo_constant import MongoCollection
+from constants.telegram import TelegramMessage
+from utils.async_exporter_utils import aget_doc, aupdate_docs
+from utils.logger_utils import get_logger
+from utils.metrics_utils import MEDIA_FILES
+from utils.profiling_utils import span
+
+logger = get_logger('Telegram Media')
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def media_summary(media):
+    """
+    Small description of message.media stored on the message doc instead of its to_dict().
+
+    Returns:
+        {type, fileId, mimeType, size} ({type} only for media without a file: polls, web pages,
+        ...), None without media
+    """
+    if media is None:
+        return None
+    if isinstance(media, types.MessageMediaPhoto) and isinstance(media.photo, types.Photo):
+        sizes = [size.size for size in media.photo.sizes if isinstance(getattr(size, "size", None), int)]
+        return {"type": "photo", "fileId": str(media.photo.id), "mimeType": "image/jpeg",
+                "size": max(sizes) if sizes else None}
+    if isinstance(media, types.MessageMediaDocument) and isinstance(media.document, types.Document):
+        return {"type": "document", "fileId": str(media.document.id), "mimeType": media.document.mime_type,
+                "size": media.document.size}
+    return {"type": type(media).__name__}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaPipeline:
+    """
+    Downloads the media of ingested messages in the background: describe() adds the summary
+    to the message doc, submit() queues the message once written (never waits, a full queue
+    drops it), workers download with client.download_media and store the file content
+    addressed as <media_dir>/<sha256[:2]>/<sha256><ext>, so the same content is saved once. The message doc gets the hash in media.hash once downloaded.
+
+    Files already seen (same Telegram file id, e.g. forwarded to other channels) are not
+    downloaded again: the media collection maps "<type>_<fileId>" to its hash.
+
+    Args:
+        client: TelegramClient shared with ingestion
+        exporter: MongoDBCDP, message docs and the media collection
+        max_size: bytes, larger documents (videos, ...) are only summarized
+    """
+
+    def __init__(self, client, exporter, media_dir, workers=4, queue_size=10_000, max_size=20 * 1024 * 1024,
+                 collection=MongoCollection.telegram_media):
+        self.client = client
+        self.exporter = exporter
+        self.media_dir = media_dir
+        self.workers = workers
+        self.max_size = max_size
+        self.collection = collection
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.known = {}
+        # key -> ids of the messages waiting for that file, one download for all of them
+        self.pending = {}
+        self.stats = {"queued": 0, "downloaded": 0, "deduplicated": 0, "skipped": 0, "dropped": 0, "errors": 0}
+        self._tasks = []
+
+    def start(self):
+        os.makedirs(self.media_dir, exist_ok=True)
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Wait until the queued media are downloaded, then stop the workers."""
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Media: {self.stats}")
+
+    def _count(self, outcome):
+        self.stats[outcome] += 1
+        MEDIA_FILES.labels(outcome).inc()
+
+    def describe(self, message, doc):
+        """
+        Add the media summary to doc (before it is written) as media.<field> keys: the $set
+        leaves a media.hash stored by an earlier run in place.
+
+        Returns:
+            summary to submit() once doc is written, None without media
+        """
+        summary = media_summary(message.media)
+        if summary is None:
+            return None
+        if "fileId" in summary:
+            key = f"{summary['type']}_{summary['fileId']}"
+            if key in self.known:
+                summary["hash"] = self.known[key]
+        doc.update({f"{TelegramMessage.media}.{field}": value for field, value in summary.items()})
+        return summary
+
+    def submit(self, message, doc_id, summary):
+        """Queue the download of a described media, after its message doc is written so the hash lands on it."""
+        if summary is None or "fileId" not in summary:
+            return
+        key = f"{summary['type']}_{summary['fileId']}"
+        if "hash" in summary:
+            self._count("deduplicated")
+            return
+        if summary.get("size") and summary["size"] > self.max_size:
+            self._count("skipped")
+            return
+        if key in self.pending:
+            self.pending[key].append(doc_id)
+            self._count("deduplicated")
+            return
+        try:
+            self.queue.put_nowait((message, summary, key))
+        except asyncio.QueueFull:
+            # Ingestion never waits for downloads, the next run queues it again
+            self._count("dropped")
+            return
+        self.pending[key] = [doc_id]
+        self._count("queued")
+
+    async def _work(self):
+        while True:
+            message, summary, key = await self.queue.get()
+            try:
+                await self._process(message, summary, key)
+            except Exception as ex:
+                self._count("errors")
+                logger.warning(f"Can not download media {key}: {ex}")
+            finally:
+                self.pending.pop(key, None)
+                self.queue.task_done()
+
+    async def _process(self, message, summary, key):
+        media_doc = await aget_doc(self.exporter, self.collection, filter_={"_id": key})
+        content_hash = media_doc.get("hash") if media_doc else None
+        if content_hash is not None:
+            self._count("deduplicated")
+        else:
+            content_hash = await self._download(message, summary, key)
+        self.known[key] = content_hash
+        await aupdate_docs(self.exporter, MongoCollection.telegram_messages, [
+            {TelegramMessage.id_: doc_id, f"{TelegramMessage.media}.hash": content_hash}
+            for doc_id in self.pending.get(key, [])])
+
+    async def _download(self, message, summary, key):
+        with span("media_download"):
+            tmp_path = await self.client.download_media(message, file=os.path.join(self.media_dir, f".{key}.part"))
+        if tmp_path is None:
+            raise ValueError("nothing downloaded")
+        # Off the event loop, large files would stall ingestion
+        content_hash = await asyncio.get_event_loop().run_in_executor(None, file_sha256, tmp_path)
+        extension = telethon_utils.get_extension(message.media)
+        path = os.path.join(self.media_dir, content_hash[:2], f"{content_hash}{extension}")
+        if os.path.exists(path):
+            # Same content under another file id
+            os.remove(tmp_path)
+            self._count("deduplicated")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self._count("downloaded")
+        await aupdate_docs(self.exporter, self.collection, [{
+            "_id": key, "hash": content_hash, "path": os.path.relpath(path, self.media_dir),
+            "mimeType": summary.get("mimeType"), "size": os.path.getsize(path), "downloadedAt": int(time.time()),
+        }])
+        return content_hash
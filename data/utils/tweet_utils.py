@@ -0,0 +1,90 @@
+from pymongo import UpdateOne
+
+from constants.twitter import Tweets
+from utils.logger_utils import get_logger
+
+logger = get_logger('Tweet Utils')
+
+EMBEDDED_FIELDS = (Tweets.retweeted_tweet, Tweets.quoted_tweet)
+# Tweets still embedding a full original (references and {} have no text)
+EMBEDDED_FILTER = {"$or": [{f"{field}.{Tweets.text}": {"$exists": True}} for field in EMBEDDED_FIELDS]}
+
+
+def tweet_reference(doc):
+    """
+    Returns:
+        {_id, authorName} of a converted tweet, {} for a missing one (like convert_tweets_to_dict)
+    """
+    if not doc:
+        return {}
+    return {Tweets.id_: doc[Tweets.id_], Tweets.author_name: doc.get(Tweets.author_name)}
+
+
+def is_embedded(value):
+    # A full converted tweet, not a reference or the {} of a missing one
+    return isinstance(value, dict) and len(value.keys() - {Tweets.id_, Tweets.author_name}) > 0
+
+
+def split_embedded_tweets(doc, seen=None):
+    """
+    Replace the retweeted / quoted tweets embedded in a converted tweet by references and
+    return them as documents of their own, recursively (a retweet of a quote).
+
+    Args:
+        doc: output of convert_tweets_to_dict, not modified
+        seen: ids of originals already returned in this run, updated. Originals in it are not
+            returned again, popular ones are written once per run instead of once per retweet
+
+    Returns:
+        [doc with references, *originals]
+    """
+    doc = dict(doc)
+    originals = []
+    for field in EMBEDDED_FIELDS:
+        embedded = doc.get(field)
+        if not is_embedded(embedded):
+            continue
+        doc[field] = tweet_reference(embedded)
+        if seen is not None:
+            if embedded[Tweets.id_] in seen:
+                continue
+            seen.add(embedded[Tweets.id_])
+        originals.extend(split_embedded_tweets(embedded, seen))
+    return [doc, *originals]
+
+
+def normalize_embedded_tweets(collection, batch_size=1000, dry_run=False):
+    """
+    Backfill split_embedded_tweets over a pymongo tweets collection. Originals are only
+    inserted when missing, a crawled (fresher) document is never overwritten by an embedded copy.
+
+    Returns:
+        {"tweets": tweets rewritten, "originals": originals inserted}
+    """
+    counts = {"tweets": 0, "originals": 0}
+    ops, seen = [], set()
+
+    def _flush():
+        if ops and not dry_run:
+            result = collection.bulk_write(ops, ordered=False)
+            counts["originals"] += result.upserted_count
+        ops.clear()
+        seen.clear()
+        logger.info(f"Normalized {counts['tweets']} tweets, {counts['originals']} originals inserted")
+
+    cursor = collection.find(EMBEDDED_FILTER, projection=list(EMBEDDED_FIELDS)).batch_size(batch_size)
+    for doc in cursor:
+        normalized, *originals = split_embedded_tweets(doc, seen)
+        ops.append(UpdateOne({Tweets.id_: doc[Tweets.id_]}, {"$set": {
+            field: normalized[field] for field in EMBEDDED_FIELDS if field in normalized
+        }}))
+        for original in originals:
+            fields = {k: v for k, v in original.items() if k != Tweets.id_}
+            ops.append(UpdateOne({Tweets.id_: original[Tweets.id_]}, {"$setOnInsert": fields}, upsert=True))
+        counts["tweets"] += 1
+        if dry_run:
+            counts["originals"] += len(originals)
+        if len(ops) >= batch_size:
+            _flush()
+    _flush()
+    return counts
@@ -1,11 +1,226 @@
+import json
 import os
+import time
+from contextvars import ContextVar
 from typing import Awaitable, Callable, Dict
 
 from dotenv import load_dotenv
+from twscrape import AccountsPool
+from twscrape.db import fetchall
 
 from src.crawler.new_api import NewAPi
+from utils.logger_utils import get_logger
+from utils.metrics_utils import ACCOUNT_BUSY_SECONDS, ACCOUNT_REQUESTS, observe_rate_limit
 
 load_dotenv()
+logger = get_logger('Twitter Accounts')
+
+POOLED_DB_FILE = "accounts_pool_twitter/accounts_pool.db"
+HEALTH_FILE = "accounts_pool_twitter/accounts_health.json"
+LATENCY_ALPHA = 0.2
+HEALTH_SAVE_INTERVAL = 30
+# (username, queue) last handed out in the current asyncio task, to charge request errors to it
+_current_account = ContextVar("current_account", default=None)
+
+
+class AccountHealth:
+    """
+    Health of every pool account, persisted as JSON next to the accounts database so it
+    survives restarts. Updated from the AccountsPool hooks twscrape calls after each
+    queue context closes.
+    """
+
+    def __init__(self, file_path=HEALTH_FILE):
+        self.file_path = file_path
+        self.accounts = {}
+        self._last_save = 0
+        if os.path.exists(file_path):
+            try:
+                with open(file_path) as f:
+                    self.accounts = json.load(f)
+            except (OSError, ValueError) as ex:
+                logger.warning(f"Can not load account health from {file_path}: {ex}")
+
+    def get(self, username):
+        return self.accounts.setdefault(username, {
+            "requests": 0,
+            "errors": 0,
+            "rateLimits": 0,
+            "lockouts": 0,
+            "latency": None,
+            "rateLimitedUntil": {},
+            "lastError": None,
+        })
+
+    def record_success(self, username, req_count, elapsed):
+        health = self.get(username)
+        health["requests"] += req_count
+        if req_count:
+            latency = elapsed / req_count
+            previous = health["latency"]
+            health["latency"] = latency if previous is None else \
+                LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * previous
+        self.save()
+
+    def record_rate_limit(self, username, queue, reset_at, req_count):
+        health = self.get(username)
+        health["requests"] += req_count
+        health["rateLimits"] += 1
+        health["rateLimitedUntil"][queue] = int(reset_at)
+        self.save()
+
+    def record_error(self, username, error_msg):
+        health = self.get(username)
+        health["errors"] += 1
+        health["lastError"] = error_msg
+        self.save()
+
+    def record_lockout(self, username, error_msg):
+        health = self.get(username)
+        health["lockouts"] += 1
+        health["lastError"] = error_msg
+        self.save(force=True)
+
+    def score(self, username, queue, now=None):
+        """Lower is healthier: request error rate first, then lockout rate, rate-limit frequency, latency."""
+        now = now or time.time()
+        health = self.get(username)
+        if health["rateLimitedUntil"].get(queue, 0) > now:
+            return None
+        attempts = health["requests"] + health["errors"] + health["rateLimits"] + 1
+        error_rate = health["errors"] / attempts
+        lockout_rate = health["lockouts"] / attempts
+        rate_limit_rate = health["rateLimits"] / attempts
+        return error_rate, lockout_rate, rate_limit_rate, health["latency"] or 0.0
+
+    def save(self, force=False):
+        now = time.time()
+        if not force and now - self._last_save < HEALTH_SAVE_INTERVAL:
+            return
+        self._last_save = now
+        tmp_file = f"{self.file_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+            with open(tmp_file, "w") as f:
+                json.dump(self.accounts, f)
+            os.replace(tmp_file, self.file_path)
+        except OSError as ex:
+            logger.warning(f"Can not save account health to {self.file_path}: {ex}")
+
+
+class HealthAwareAccountsPool(AccountsPool):
+    """
+    twscrape pool that hands out the healthiest unlocked account for a queue instead of the
+    first one by username, and feeds rate limits, lockouts and latency into AccountHealth.
+    """
+
+    def __init__(self, db_file=POOLED_DB_FILE, health=None, **kwargs):
+        super().__init__(db_file, **kwargs)
+        self.health = health or AccountHealth()
+        self._acquired_at = {}
+
+    async def get_for_queue(self, queue: str):
+        unlocked = f"""
+        active = true AND (
+            locks IS NULL
+            OR json_extract(locks, '$.{queue}') IS NULL
+            OR json_extract(locks, '$.{queue}') < datetime('now')
+        )
+        """
+        rows = await fetchall(self._db_file, f"SELECT username FROM accounts WHERE {unlocked}")
+        now = time.time()
+        candidates = []
+        for row in rows:
+            score = self.health.score(row["username"], queue, now)
+            if score is not None:
+                candidates.append((score, row["username"]))
+        for _, username in sorted(candidates):
+            # Re-check the lock inside the UPDATE, another worker may have taken it since the select
+            username_sql = username.replace("'", "''")
+            condition = f"SELECT username FROM accounts WHERE username = '{username_sql}' AND {unlocked}"
+            account = await self._get_and_lock(queue, condition)
+            if account is not None:
+                self._acquired_at[(username, queue)] = time.perf_counter()
+                _current_account.set((username, queue))
+                return account
+        return None
+
+    def _elapsed(self, username, queue):
+        begin = self._acquired_at.pop((username, queue), None)
+        return time.perf_counter() - begin if begin is not None else 0.0
+
+    @staticmethod
+    def _observe(username, queue, req_count, elapsed):
+        ACCOUNT_REQUESTS.labels(queue, username).inc(req_count)
+        ACCOUNT_BUSY_SECONDS.labels(queue, username).inc(elapsed)
+
+    async def unlock(self, username: str, queue: str, req_count=0):
+        elapsed = self._elapsed(username, queue)
+        self._observe(username, queue, req_count, elapsed)
+        self.health.record_success(username, req_count, elapsed)
+        await super().unlock(username, queue, req_count)
+
+    def record_error(self, queue: str, error_msg: str):
+        """Request on queue failed, charged to the account last handed out for it in this task."""
+        current = _current_account.get()
+        if current is not None and current[1] == queue:
+            self.health.record_error(current[0], error_msg)
+
+    async def lock_until(self, username: str, queue: str, unlock_at: int, req_count=0):
+        self._observe(username, queue, req_count, self._elapsed(username, queue))
+        observe_rate_limit(queue, username, unlock_at - time.time())
+        self.health.record_rate_limit(username, queue, unlock_at, req_count)
+        await super().lock_until(username, queue, unlock_at, req_count)
+
+    async def mark_inactive(self, username: str, error_msg: str | None):
+        logger.warning(f"Account {username} is inactive: {error_msg}")
+        self.health.record_lockout(username, error_msg)
+        await super().mark_inactive(username, error_msg)
+
+
+def env_accounts(max_versions: int = 100):
+    # (username, password, email, email password) of every TWITTER_USER_NAME_V{n} in the env
+    accounts = []
+    for v in range(max_versions):
+        username = os.getenv(f"TWITTER_USER_NAME_V{v}")
+        email = os.getenv(f"TWITTER_EMAIL_V{v}")
+        if not (username and email):
+            break
+        accounts.append((username, os.getenv("TWITTER_PASSWORD_ALL"), email, os.getenv("TWITTER_EMAIL_PASSWORD")))
+    return accounts
+
+
+class PooledAccountManager:
+    """
+    One NewAPi over every env account. Sessions live in a single accounts database, so only
+    accounts that are new or lost their session log in; later calls in the same process
+    reuse the logged in API.
+    """
+
+    def __init__(self, db_file=POOLED_DB_FILE, health_file=HEALTH_FILE):
+        self.db_file = db_file
+        self.health_file = health_file
+        self.api = None
+
+    async def get_api(self) -> NewAPi:
+        if self.api is not None:
+            return self.api
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        pool = HealthAwareAccountsPool(self.db_file, health=AccountHealth(self.health_file))
+        api = NewAPi(pool)
+
+        known = {account.username for account in await pool.get_all()}
+        for username, password, email, email_password in env_accounts():
+            if username not in known:
+                await pool.add_account(username, password, email, email_password)
+        # login_all only picks accounts without a session that have not failed before
+        result = await pool.login_all()
+        logger.info(f"Account pool ready, logins: {result}")
+        self.api = api
+        return api
+
+
+pooled_account_manager = PooledAccountManager()
 
 
 class DynamicAccountImporter:
@@ -63,6 +278,7 @@ class DynamicAccountImporter:
         
         for name, func in functions.items():
             setattr(account_module, name, func)
+        setattr(account_module, "add_account_pooled", pooled_account_manager.get_api)
         
         return account_module
 
@@ -0,0 +1,287 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument, UpdateOne
+
+from utils.logger_utils import get_logger
+from utils.metrics_utils import QUEUE_DEPTH
+
+logger = get_logger('Work Queue')
+
+
+class TaskStatus:
+    pending = "pending"
+    leased = "leased"
+    done = "done"
+    dead = "dead"
+
+
+def default_worker_id(suffix=""):
+    return f"{socket.gethostname()}_{os.getpid()}{suffix}"
+
+
+class MongoWorkQueue:
+    """
+    Crawl tasks stored in a Mongo collection. Workers on any machine claim tasks atomically
+    with find_one_and_update and hold them under a lease they must keep alive with
+    heartbeat(). A task whose lease expires is claimable again. Failed tasks are retried
+    with backoff until max_attempts, then moved to the dead status.
+
+    Task document:
+        _id, queue, payload, status, attempts, availableAt, leaseUntil, worker,
+        lastError, createdAt, updatedAt, expireAt (for a TTL index on finished tasks)
+    """
+
+    def __init__(self, collection, queue, lease_seconds=300, max_attempts=5, retry_backoff=60,
+                 keep_finished_seconds=7 * 86400):
+        self.collection = collection
+        self.queue = queue
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.keep_finished_seconds = keep_finished_seconds
+
+    def task_id(self, key):
+        return f"{self.queue}_{key}"
+
+    def _expire_at(self):
+        # TTL indexes only expire BSON dates
+        return datetime.now(timezone.utc) + timedelta(seconds=self.keep_finished_seconds)
+
+    def enqueue(self, tasks):
+        """
+        Idempotently add tasks, existing ones (any status) are left untouched.
+
+        Args:
+            tasks: iterable of (key, payload)
+        """
+        now = int(time.time())
+        operations = [
+            UpdateOne(
+                {"_id": self.task_id(key)},
+                {"$setOnInsert": {
+                    "queue": self.queue,
+                    "payload": payload,
+                    "status": TaskStatus.pending,
+                    "attempts": 0,
+                    "availableAt": now,
+                    "createdAt": now,
+                    "updatedAt": now,
+                }},
+                upsert=True,
+            )
+            for key, payload in tasks
+        ]
+        if not operations:
+            return 0
+        result = self.collection.bulk_write(operations, ordered=False)
+        return result.upserted_count
+
+    def claim(self, worker):
+        now = int(time.time())
+        return self.collection.find_one_and_update(
+            {
+                "queue": self.queue,
+                "attempts": {"$lt": self.max_attempts},
+                "$or": [
+                    {"status": TaskStatus.pending, "availableAt": {"$lte": now}},
+                    {"status": TaskStatus.leased, "leaseUntil": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": TaskStatus.leased,
+                    "worker": worker,
+                    "leaseUntil": now + self.lease_seconds,
+                    "updatedAt": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("availableAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def heartbeat(self, task, worker):
+        # False means the lease was lost (expired and claimed by someone else)
+        now = int(time.time())
+        result = self.collection.update_one(
+            {"_id": task["_id"], "worker": worker, "status": TaskStatus.leased},
+            {"$set": {"leaseUntil": now + self.lease_seconds, "updatedAt": now}},
+        )
+        return result.modified_count == 1
+
+    def ack(self, task, worker):
+        now = int(time.time())
+        self.collection.update_one(
+            {"_id": task["_id"], "worker": worker},
+            {"$set": {"status": TaskStatus.done, "updatedAt": now, "expireAt": self._expire_at()},
+             "$unset": {"leaseUntil": ""}},
+        )
+
+    def fail(self, task, worker, error=None):
+        now = int(time.time())
+        attempts = task.get("attempts", 1)
+        if attempts >= self.max_attempts:
+            update = {"status": TaskStatus.dead, "expireAt": self._expire_at()}
+            logger.warning(f"Dead-lettering {task['_id']} after {attempts} attempts: {error}")
+        else:
+            update = {"status": TaskStatus.pending, "availableAt": now + self.retry_backoff * attempts}
+        self.collection.update_one(
+            {"_id": task["_id"], "worker": worker},
+            {"$set": {**update, "lastError": str(error)[:1000], "updatedAt": now},
+             "$unset": {"leaseUntil": ""}},
+        )
+
+    def reap_expired(self):
+        # Expired leases that already used all attempts will never be claimed again
+        now = int(time.time())
+        result = self.collection.update_many(
+            {"queue": self.queue, "status": TaskStatus.leased, "leaseUntil": {"$lt": now},
+             "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": TaskStatus.dead, "lastError": "lease expired", "updatedAt": now,
+                      "expireAt": self._expire_at()}},
+        )
+        return result.modified_count
+
+    def next_available_at(self):
+        """
+        Earliest time a task still to do becomes claimable: a pending task waiting out its retry
+        backoff, or a leased one if its lease runs out. None when nothing is left to claim.
+        """
+        claimable = {"queue": self.queue, "attempts": {"$lt": self.max_attempts}}
+        times = []
+        pending = self.collection.find_one(
+            {**claimable, "status": TaskStatus.pending}, projection={"availableAt": 1}, sort=[("availableAt", 1)])
+        if pending:
+            times.append(pending["availableAt"])
+        leased = self.collection.find_one(
+            {**claimable, "status": TaskStatus.leased}, projection={"leaseUntil": 1}, sort=[("leaseUntil", 1)])
+        if leased:
+            times.append(leased["leaseUntil"])
+        return min(times) if times else None
+
+    def depth(self):
+        depth = self.collection.count_documents(
+            {"queue": self.queue, "status": {"$in": [TaskStatus.pending, TaskStatus.leased]}})
+        QUEUE_DEPTH.labels(self.queue).set(depth)
+        return depth
+
+
+class SQLiteWorkQueue:
+    """
+    Same interface as MongoWorkQueue backed by a local SQLite file, for single machine runs
+    and local testing. Claims use BEGIN IMMEDIATE so concurrent processes never get the
+    same task.
+    """
+
+    def __init__(self, path, queue, lease_seconds=300, max_attempts=5, retry_backoff=60):
+        self.queue = queue
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " _id TEXT PRIMARY KEY, queue TEXT, payload TEXT, status TEXT, attempts INTEGER,"
+            " availableAt INTEGER, leaseUntil INTEGER, worker TEXT, lastError TEXT,"
+            " createdAt INTEGER, updatedAt INTEGER)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_queue_status ON tasks (queue, status, availableAt)")
+
+    def task_id(self, key):
+        return f"{self.queue}_{key}"
+
+    @staticmethod
+    def _to_task(row):
+        if row is None:
+            return None
+        keys = ("_id", "queue", "payload", "status", "attempts", "availableAt", "leaseUntil", "worker",
+                "lastError", "createdAt", "updatedAt")
+        task = dict(zip(keys, row))
+        task["payload"] = json.loads(task["payload"])
+        return task
+
+    def enqueue(self, tasks):
+        now = int(time.time())
+        rows = [(self.task_id(key), self.queue, json.dumps(payload, default=str), TaskStatus.pending, 0, now, now, now)
+                for key, payload in tasks]
+        before = self.connection.total_changes
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO tasks (_id, queue, payload, status, attempts, availableAt, createdAt, updatedAt)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return self.connection.total_changes - before
+
+    def claim(self, worker):
+        now = int(time.time())
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            row = cursor.execute(
+                "SELECT _id FROM tasks WHERE queue = ? AND attempts < ? AND ("
+                " (status = ? AND availableAt <= ?) OR (status = ? AND leaseUntil < ?))"
+                " ORDER BY availableAt LIMIT 1",
+                (self.queue, self.max_attempts, TaskStatus.pending, now, TaskStatus.leased, now)).fetchone()
+            if row is None:
+                cursor.execute("COMMIT")
+                return None
+            cursor.execute(
+                "UPDATE tasks SET status = ?, worker = ?, leaseUntil = ?, updatedAt = ?, attempts = attempts + 1"
+                " WHERE _id = ?", (TaskStatus.leased, worker, now + self.lease_seconds, now, row[0]))
+            task = cursor.execute("SELECT * FROM tasks WHERE _id = ?", (row[0],)).fetchone()
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        return self._to_task(task)
+
+    def heartbeat(self, task, worker):
+        now = int(time.time())
+        cursor = self.connection.execute(
+            "UPDATE tasks SET leaseUntil = ?, updatedAt = ? WHERE _id = ? AND worker = ? AND status = ?",
+            (now + self.lease_seconds, now, task["_id"], worker, TaskStatus.leased))
+        return cursor.rowcount == 1
+
+    def ack(self, task, worker):
+        self.connection.execute(
+            "UPDATE tasks SET status = ?, leaseUntil = NULL, updatedAt = ? WHERE _id = ? AND worker = ?",
+            (TaskStatus.done, int(time.time()), task["_id"], worker))
+
+    def fail(self, task, worker, error=None):
+        now = int(time.time())
+        attempts = task.get("attempts", 1)
+        if attempts >= self.max_attempts:
+            status, available_at = TaskStatus.dead, now
+            logger.warning(f"Dead-lettering {task['_id']} after {attempts} attempts: {error}")
+        else:
+            status, available_at = TaskStatus.pending, now + self.retry_backoff * attempts
+        self.connection.execute(
+            "UPDATE tasks SET status = ?, availableAt = ?, leaseUntil = NULL, lastError = ?, updatedAt = ?"
+            " WHERE _id = ? AND worker = ?",
+            (status, available_at, str(error)[:1000], now, task["_id"], worker))
+
+    def reap_expired(self):
+        now = int(time.time())
+        cursor = self.connection.execute(
+            "UPDATE tasks SET status = ?, lastError = 'lease expired', updatedAt = ?"
+            " WHERE queue = ? AND status = ? AND leaseUntil < ? AND attempts >= ?",
+            (TaskStatus.dead, now, self.queue, TaskStatus.leased, now, self.max_attempts))
+        return cursor.rowcount
+
+    def next_available_at(self):
+        row = self.connection.execute(
+            "SELECT MIN(CASE WHEN status = ? THEN availableAt ELSE leaseUntil END) FROM tasks"
+            " WHERE queue = ? AND attempts < ? AND status IN (?, ?)",
+            (TaskStatus.pending, self.queue, self.max_attempts, TaskStatus.pending, TaskStatus.leased)).fetchone()
+        return row[0]
+
+    def depth(self):
+        depth = self.connection.execute(
+            "SELECT COUNT(*) FROM tasks WHERE queue = ? AND status IN (?, ?)",
+            (self.queue, TaskStatus.pending, TaskStatus.leased)).fetchone()[0]
+        QUEUE_DEPTH.labels(self.queue).set(depth)
+        return depth
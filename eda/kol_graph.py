@@ -0,0 +1,158 @@
+import time
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+# Purpose: Edge weights per interaction type (same as experiments.py)
+RETWEET_WEIGHT = 1.0
+QUOTE_WEIGHT = 0.8
+MENTION_WEIGHT = 0.6
+
+RETWEET = 0
+QUOTE = 1
+MENTION = 2
+
+
+# Purpose: Map usernames to dense integer ids while new nodes are being discovered
+class NodeInterner:
+    def __init__(self, names=()):
+        self.index = {}
+        self.names = []
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        idx = self.index.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.index[name] = idx
+            self.names.append(name)
+        return idx
+
+    def get(self, name, default=None):
+        return self.index.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+
+# Purpose: Build the KOL interaction network tweet by tweet with O(1) node lookups
+class ExpandedNetworkBuilder:
+    """
+    Nodes are interned on first sight, edges are stored in growable typed arrays.
+
+    Args:
+        elite_usernames: KOL usernames, they always get the first ids
+        include_non_elite: also add mentioned/retweeted/quoted accounts that are not elite
+    """
+
+    def __init__(self, elite_usernames, include_non_elite=False):
+        self.nodes = NodeInterner(elite_usernames)
+        self.n_elite = len(self.nodes)
+        self.include_non_elite = include_non_elite
+        self.src = array('q')
+        self.dst = array('q')
+        self.weights = array('d')
+        self.kinds = array('b')
+
+    def _target_id(self, username):
+        if self.include_non_elite:
+            return self.nodes.intern(username)
+        return self.nodes.get(username)
+
+    def add_edge(self, source, target, weight, kind):
+        if source == target:
+            return False
+        target_id = self._target_id(target)
+        if target_id is None:
+            return False
+        self.src.append(self.nodes.intern(source))
+        self.dst.append(target_id)
+        self.weights.append(weight)
+        self.kinds.append(kind)
+        return True
+
+    def add_tweet(self, tweet):
+        author_name = tweet["authorName"]
+        retweeted = tweet.get("retweetedTweet")
+        if retweeted:
+            self.add_edge(author_name, retweeted["authorName"], RETWEET_WEIGHT, RETWEET)
+
+        quoted = tweet.get("quotedTweet")
+        if quoted:
+            self.add_edge(author_name, quoted["authorName"], QUOTE_WEIGHT, QUOTE)
+
+        for username in (tweet.get("userMentions") or {}).values():
+            self.add_edge(author_name, username, MENTION_WEIGHT, MENTION)
+
+    def add_tweets(self, tweets):
+        for tweet in tweets:
+            self.add_tweet(tweet)
+        return self
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    def edge_arrays(self):
+        src = np.frombuffer(self.src, dtype=np.int64) if self.src else np.empty(0, dtype=np.int64)
+        dst = np.frombuffer(self.dst, dtype=np.int64) if self.dst else np.empty(0, dtype=np.int64)
+        weights = np.frombuffer(self.weights, dtype=np.float64) if self.weights else np.empty(0)
+        return src, dst, weights
+
+    def edges(self):
+        names = self.nodes.names
+        return [(names[u], names[v]) for u, v in zip(self.src, self.dst)]
+
+    def kind_counts(self):
+        counts = np.bincount(np.frombuffer(self.kinds, dtype=np.int8), minlength=3) if self.kinds else np.zeros(3)
+        return {'retweet': int(counts[RETWEET]), 'quote': int(counts[QUOTE]), 'mention': int(counts[MENTION])}
+
+    def interaction_counts(self):
+        # Number of times each node was mentioned, retweeted or quoted
+        _, dst, _ = self.edge_arrays()
+        return np.bincount(dst, minlength=self.num_nodes)
+
+    def to_csr(self):
+        # Parallel edges are summed into one weighted entry
+        src, dst, weights = self.edge_arrays()
+        n = self.num_nodes
+        G = sparse.csr_matrix((weights, (src, dst)), shape=(n, n))
+        G.sum_duplicates()
+        return G
+
+
+# Purpose: Show that building stays linear in the number of edges
+def benchmark(edge_counts=(100_000, 1_000_000, 3_000_000), n_elite=20_000, n_accounts=500_000, seed=42):
+    rng = np.random.default_rng(seed)
+    elite = [f"kol_{i}" for i in range(n_elite)]
+    # Mentions hit elite and non-elite accounts with a heavy-tailed popularity
+    accounts = np.array(elite + [f"user_{i}" for i in range(n_accounts)], dtype=object)
+    for n_edges in edge_counts:
+        n_tweets = n_edges // 3
+        authors = rng.integers(0, n_elite, n_tweets)
+        mentioned = rng.zipf(1.5, (n_tweets, 3)) % len(accounts)
+        tweets = [
+            {"authorName": elite[a], "userMentions": {str(m): accounts[m] for m in row}}
+            for a, row in zip(authors, mentioned)
+        ]
+        for include_non_elite in (False, True):
+            begin = time.perf_counter()
+            builder = ExpandedNetworkBuilder(elite, include_non_elite=include_non_elite).add_tweets(tweets)
+            G = builder.to_csr()
+            elapsed = time.perf_counter() - begin
+            print(f"{len(tweets)} tweets, include_non_elite={include_non_elite}: "
+                  f"{builder.num_nodes} nodes, {builder.num_edges} edges, {G.nnz} unique edges "
+                  f"in {elapsed:.2f}s ({builder.num_edges / elapsed:,.0f} edges/s)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -4,91 +4,99 @@ import numpy as np
 import pandas as pd
 import networkx as nx
 import json
-from datetime import datetime, timedelta
 from collections import Counter
 import re
 import ijson
 import os
+from array import array
+
+from centrality import CentralityGraph
 
 # Purpose: Setup visualization settings for consistent charts
 sns.set_style('whitegrid')
 sns.set_context('paper')
 np.random.seed(42)  # For reproducibility
 
-# Purpose: Load and preprocess Twitter KOL data from JSON source
-def load_data_sample(file_path='datn_data/cdp_db.twitter_users.json'):
+# Purpose: Hold the users table plus long-format (user, ts, ...) log tables with typed columns
+class KOLData:
+    def __init__(self, users, engagement, tweet_counts, view_counts):
+        # users: one row per user, the row position is the `user` key used by the log tables
+        self.users = users
+        # engagement: user, ts, likes, replies, retweets
+        self.engagement = engagement
+        # tweet_counts / view_counts: user, ts, value
+        self.tweet_counts = tweet_counts
+        self.view_counts = view_counts
+
+    def __len__(self):
+        return len(self.users)
+
+
+def _get_ijson():
+    # The C backend parses several times faster than the pure-python one
+    try:
+        return ijson.get_backend('yajl2_c')
+    except ImportError:
+        return ijson
+
+
+def _append_count_logs(logs, user, users_buf, ts_buf, value_buf):
+    for timestamp, value in logs.items():
+        users_buf.append(user)
+        ts_buf.append(int(timestamp))
+        value_buf.append(int(value or 0))
+
+
+# Purpose: Stream the whole twitter_users dump into typed NumPy columns without per-user Python lists
+def load_data(file_path='datn_data/cdp_db.twitter_users.json', min_followers=1000, limit=None):
     print("Loading Twitter users data...")
-    users = []
+    ids, names, followers = [], [], array('q')
+    eng_user, eng_ts, likes, replies, retweets = array('q'), array('q'), array('q'), array('q'), array('q')
+    tc_user, tc_ts, tc_value = array('q'), array('q'), array('q')
+    vc_user, vc_ts, vc_value = array('q'), array('q'), array('q')
+
     with open(file_path, 'rb') as f:
-        parser = ijson.items(f, 'item')
-        for i, user in enumerate(parser):
-            if user.get('engagementChangeLogs') and user.get('followersCount', 0) > 1000:  # Filter for active users
-                users.append({
-                    '_id': user['_id'],
-                    'userName': user.get('userName', ''),
-                    'followersCount': user.get('followersCount', 0),
-                    'engagement_metrics': process_engagement_logs(user.get('engagementChangeLogs', {})),
-                    'tweet_counts': process_tweet_counts(user.get('tweetCountChangeLogs', {})),
-                    'view_counts': process_view_counts(user.get('viewChangeLogs', {}))
-                })
-            if i >= 999:  # Limit to 1000 users
+        for i, user in enumerate(_get_ijson().items(f, 'item', use_float=True)):
+            if limit is not None and i >= limit:
                 break
-    users_df = pd.DataFrame(users)
-    print(f"Loaded {len(users_df)} users with engagement data")
-    return users_df
+            logs = user.get('engagementChangeLogs')
+            if not logs or (user.get('followersCount') or 0) <= min_followers:  # Filter for active users
+                continue
+            idx = len(ids)
+            ids.append(str(user['_id']))
+            names.append(user.get('userName', ''))
+            followers.append(int(user.get('followersCount', 0)))
+            for timestamp, metrics in logs.items():
+                eng_user.append(idx)
+                eng_ts.append(int(timestamp))
+                likes.append(int(metrics.get('likeCount', 0) or 0))
+                replies.append(int(metrics.get('replyCount', 0) or 0))
+                retweets.append(int(metrics.get('retweetCount', 0) or 0))
+            _append_count_logs(user.get('tweetCountChangeLogs') or {}, idx, tc_user, tc_ts, tc_value)
+            _append_count_logs(user.get('viewChangeLogs') or {}, idx, vc_user, vc_ts, vc_value)
 
-# Purpose: Convert raw engagement logs into structured time series data
-def process_engagement_logs(logs):
-    if not logs:
-        return {'likes': [], 'replies': [], 'retweets': [], 'dates': []}
-    
-    daily_metrics = {
-        'likes': [],
-        'replies': [],
-        'retweets': [],
-        'dates': []
-    }
-    
-    for timestamp, metrics in sorted(logs.items()):
-        daily_metrics['dates'].append(int(timestamp))
-        daily_metrics['likes'].append(metrics.get('likeCount', 0))
-        daily_metrics['replies'].append(metrics.get('replyCount', 0))
-        daily_metrics['retweets'].append(metrics.get('retweetCount', 0))
-    
-    return daily_metrics
+    def column(buf):
+        return np.frombuffer(buf, dtype=np.int64) if buf else np.empty(0, dtype=np.int64)
 
-# Purpose: Process tweet count logs for activity analysis
-def process_tweet_counts(logs):
-    if not logs:
-        return {}
-    return {int(k): v for k, v in logs.items()}
+    users = pd.DataFrame({'_id': ids, 'userName': names, 'followersCount': column(followers)})
+    engagement = pd.DataFrame({
+        'user': column(eng_user), 'ts': column(eng_ts),
+        'likes': column(likes), 'replies': column(replies), 'retweets': column(retweets),
+    }).sort_values(['user', 'ts'], kind='stable', ignore_index=True)
+    engagement['total'] = engagement['likes'] + engagement['replies'] + engagement['retweets']
+    tweet_counts = pd.DataFrame({'user': column(tc_user), 'ts': column(tc_ts), 'value': column(tc_value)})
+    view_counts = pd.DataFrame({'user': column(vc_user), 'ts': column(vc_ts), 'value': column(vc_value)})
+
+    data = KOLData(users, engagement, tweet_counts, view_counts)
+    print(f"Loaded {len(users)} users with engagement data ({len(engagement)} engagement rows)")
+    return data
 
-# Purpose: Process view count logs to analyze content reach
-def process_view_counts(logs):
-    if not logs:
-        return {}
-    return {int(k): v for k, v in logs.items()}
 
 # Purpose: Analyze distribution of engagement levels across KOLs to identify patterns
-def analyze_engagement_distribution(users_df):
-    engagement_data = []
-    tweet_frequency = []
-    
-    for _, user in users_df.iterrows():
-        if user['engagement_metrics'].get('likes'):
-            avg_engagement = np.mean([
-                sum(x) for x in zip(
-                    user['engagement_metrics']['likes'],
-                    user['engagement_metrics']['replies'],
-                    user['engagement_metrics']['retweets']
-                )
-            ])
-            engagement_data.append(avg_engagement)
-        
-        if user['tweet_counts']:
-            avg_tweets = np.mean(list(user['tweet_counts'].values()))
-            tweet_frequency.append(avg_tweets)
-            
+def analyze_engagement_distribution(data):
+    engagement_data = data.engagement.groupby('user')['total'].mean().to_numpy()
+    tweet_frequency = data.tweet_counts.groupby('user')['value'].mean().to_numpy()
+
     return {
         'engagement_stats': {
             'mean': np.mean(engagement_data),
@@ -105,130 +113,194 @@ def analyze_engagement_distribution(users_df):
     }
 
 # Purpose: Track engagement trends for top KOLs to identify patterns and anomalies
-def analyze_engagement_trends(users_df, top_n=5):
-    top_users = users_df.nlargest(top_n, 'followersCount')
+def analyze_engagement_trends(data, top_n=5):
+    top_users = data.users.nlargest(top_n, 'followersCount')
+    rows = data.engagement[data.engagement['user'].isin(top_users.index)]
     trends = {}
-    
-    for _, user in top_users.iterrows():
-        if user['engagement_metrics'].get('dates'):
-            dates = [datetime.fromtimestamp(ts) for ts in user['engagement_metrics']['dates']]
-            engagement = [sum(x) for x in zip(
-                user['engagement_metrics']['likes'],
-                user['engagement_metrics']['replies'],
-                user['engagement_metrics']['retweets']
-            )]
-            trends[user['userName']] = {
-                'dates': dates,
-                'engagement': engagement
-            }
-    
+
+    for user, group in rows.groupby('user', sort=False):
+        trends[data.users.at[user, 'userName']] = {
+            'dates': pd.to_datetime(group['ts'].to_numpy(), unit='s').to_pydatetime().tolist(),
+            'engagement': group['total'].tolist()
+        }
+
     return trends
 
 # Purpose: Calculate influence scores to rank KOLs by their impact
-def calculate_influence_scores(users_df):
-    users_df['influence_score'] = users_df.apply(lambda x: 
-        np.mean([sum(y) for y in zip(
-            x['engagement_metrics'].get('likes', [0]),
-            x['engagement_metrics'].get('replies', [0]),
-            x['engagement_metrics'].get('retweets', [0])
-        )]) * np.log10(x['followersCount'] + 1) if x['engagement_metrics'].get('likes') else 0,
-        axis=1
+def calculate_influence_scores(data):
+    users_df = data.users
+    avg_engagement = data.engagement.groupby('user')['total'].mean()
+    users_df['influence_score'] = (
+        avg_engagement.reindex(users_df.index, fill_value=0).to_numpy()
+        * np.log10(users_df['followersCount'].to_numpy() + 1)
     )
-    
+
     # Create influence categories
     influence_thresholds = users_df['influence_score'].quantile([0.33, 0.66])
-    users_df['influence_category'] = users_df['influence_score'].apply(
-        lambda x: 'High' if x >= influence_thresholds[0.66]
-        else ('Medium' if x >= influence_thresholds[0.33] else 'Low')
+    users_df['influence_category'] = np.select(
+        [users_df['influence_score'] >= influence_thresholds[0.66],
+         users_df['influence_score'] >= influence_thresholds[0.33]],
+        ['High', 'Medium'],
+        default='Low'
     )
-    
+
     return users_df
 
+# Purpose: Align users' engagement into one (days x users) matrix, resampled to daily buckets
+def engagement_matrix(data, users, resample=86400, min_points=6):
+    """
+    Returns:
+        (kept user keys, matrix) where missing days are filled with the user's own mean,
+        so they add nothing to the covariance. Users with fewer than min_points observed
+        days or a flat series are dropped.
+    """
+    rows = data.engagement[data.engagement['user'].isin(users)]
+    bucket = rows['ts'].to_numpy() // resample
+    day_keys, day_idx = np.unique(bucket, return_inverse=True)
+    user_keys, user_idx = np.unique(rows['user'].to_numpy(), return_inverse=True)
+
+    shape = (len(day_keys), len(user_keys))
+    flat = day_idx * shape[1] + user_idx
+    sums = np.bincount(flat, weights=rows['total'].to_numpy(), minlength=shape[0] * shape[1]).reshape(shape)
+    counts = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+
+    observed = counts > 0
+    matrix = np.divide(sums, counts, out=np.zeros(shape), where=observed)
+    means = matrix.sum(axis=0) / np.maximum(observed.sum(axis=0), 1)
+    matrix = np.where(observed, matrix, means)
+
+    keep = (observed.sum(axis=0) >= min_points) & (matrix.std(axis=0) > 0)
+    return user_keys[keep], matrix[:, keep]
+
+
+# Purpose: Pearson correlation of every column pair with a single matrix product
+def correlation_matrix(matrix):
+    centered = matrix - matrix.mean(axis=0)
+    centered /= np.linalg.norm(centered, axis=0)
+    return centered.T @ centered
+
+
 # Purpose: Build network visualization of KOL interactions to identify key influencer clusters
-def build_kol_network(users_df, top_n=30, correlation_threshold=0.6):
-    top_users = users_df.nlargest(top_n, 'followersCount')
+def build_kol_network(data, top_n=30, correlation_threshold=0.6):
+    top_users = data.users.nlargest(top_n, 'followersCount')
     G = nx.Graph()
-    
+
+    names = data.users['userName'].where(
+        data.users['userName'].astype(bool), "User-" + data.users['_id'].str[:6])
+
     # Add nodes
-    for _, user in top_users.iterrows():
-        G.add_node(user['userName'] or f"User-{user['_id'][:6]}", 
-                  followers=user['followersCount'],
-                  influence=user.get('influence_score', 0))
-    
+    influence = top_users['influence_score'] if 'influence_score' in top_users else pd.Series(0, index=top_users.index)
+    G.add_nodes_from(
+        (names.at[user], {'followers': followers, 'influence': influence.at[user]})
+        for user, followers in top_users['followersCount'].items()
+    )
+
     # Add edges based on similar engagement patterns
-    for i, user1 in top_users.iterrows():
-        for j, user2 in top_users.iloc[i+1:].iterrows():
-            if (user1['engagement_metrics'].get('likes') and 
-                user2['engagement_metrics'].get('likes') and
-                len(user1['engagement_metrics']['likes']) > 5 and
-                len(user2['engagement_metrics']['likes']) > 5):
-                try:
-                    # Calculate total engagement for each user
-                    user1_engagement = [sum(x) for x in zip(
-                        user1['engagement_metrics']['likes'],
-                        user1['engagement_metrics']['replies'],
-                        user1['engagement_metrics']['retweets']
-                    )]
-                    
-                    user2_engagement = [sum(x) for x in zip(
-                        user2['engagement_metrics']['likes'],
-                        user2['engagement_metrics']['replies'],
-                        user2['engagement_metrics']['retweets']
-                    )]
-                    
-                    # Calculate correlation if data is valid
-                    if np.std(user1_engagement) > 0 and np.std(user2_engagement) > 0:
-                        correlation = np.corrcoef(user1_engagement, user2_engagement)[0, 1]
-                        if not np.isnan(correlation) and correlation > correlation_threshold:
-                            G.add_edge(user1['userName'] or f"User-{user1['_id'][:6]}", 
-                                      user2['userName'] or f"User-{user2['_id'][:6]}", 
-                                      weight=correlation)
-                except Exception as e:
-                    # Skip if correlation calculation fails
-                    print(f"  Skipping edge due to: {e}")
-                    pass
-    
+    users, matrix = engagement_matrix(data, top_users.index)
+    if len(users) < 2:
+        return G
+    correlation = correlation_matrix(matrix)
+    rows, cols = np.nonzero(np.triu(correlation > correlation_threshold, k=1))
+    node_names = names.loc[users].to_numpy()
+    G.add_weighted_edges_from(zip(node_names[rows], node_names[cols], correlation[rows, cols]))
+
     return G
 
-# Purpose: Analyze temporal engagement patterns to identify optimal posting times
-def analyze_temporal_patterns(users_df):
-    hourly_engagement = {i: 0 for i in range(24)}
-    daily_engagement = {i: 0 for i in range(7)}
-    
-    for _, user in users_df.iterrows():
-        if user['engagement_metrics'].get('dates'):
-            for ts in user['engagement_metrics']['dates']:
-                dt = datetime.fromtimestamp(ts)
-                hourly_engagement[dt.hour] += 1
-                daily_engagement[dt.weekday()] += 1
-    
+# Purpose: Analyze temporal engagement patterns to identify optimal posting times (UTC)
+def analyze_temporal_patterns(data):
+    dates = pd.to_datetime(data.engagement['ts'].to_numpy(), unit='s')
+    hourly = np.bincount(dates.hour, minlength=24)
+    daily = np.bincount(dates.weekday, minlength=7)
+
     return {
-        'hourly': hourly_engagement,
-        'daily': daily_engagement
+        'hourly': dict(enumerate(hourly.tolist())),
+        'daily': dict(enumerate(daily.tolist()))
     }
 
 # Purpose: Apply PageRank algorithm to identify most influential KOLs in the network
 def apply_pagerank(G, damping_factor=0.85):
-    pagerank_scores = nx.pagerank(G, alpha=damping_factor)
+    centrality = CentralityGraph.from_networkx(G)
+    pagerank_scores = dict(zip(centrality.names, centrality.pagerank(alpha=damping_factor)))
     return pagerank_scores
 
+# Purpose: Pearson correlation of x[t] with y[t + lag] for every (kol, token) pair and lag at once
+def lagged_correlations(kol_matrix, market_matrix, max_lag=7, chunk_size=1024):
+    """
+    Window sums come from cumulative sums and the cross products from one matrix product
+    per lag and KOL chunk, so memory stays bounded by chunk_size x n_tokens x (max_lag + 1).
+
+    Args:
+        kol_matrix: (T x K) KOL activity, one column per KOL
+        market_matrix: (T x M) market series aligned on the same T time steps
+    Yields:
+        (first KOL column of the chunk, array of shape (max_lag + 1, chunk, M)) where lag 0
+        is the direct correlation. Pairs with a flat window are NaN.
+    """
+    X = np.asarray(kol_matrix, dtype=np.float64)
+    Y = np.asarray(market_matrix, dtype=np.float64)
+    T = X.shape[0]
+    max_lag = min(max_lag, T - 2)
+    # Centre on the full series first to keep the sum-of-products formula numerically stable
+    Y = Y - Y.mean(axis=0)
+    cum_y = np.vstack((np.zeros(Y.shape[1]), np.cumsum(Y, axis=0)))
+    cum_yy = np.vstack((np.zeros(Y.shape[1]), np.cumsum(Y * Y, axis=0)))
+
+    for start in range(0, X.shape[1], chunk_size):
+        Xc = X[:, start:start + chunk_size]
+        Xc = Xc - Xc.mean(axis=0)
+        cum_x = np.vstack((np.zeros(Xc.shape[1]), np.cumsum(Xc, axis=0)))
+        cum_xx = np.vstack((np.zeros(Xc.shape[1]), np.cumsum(Xc * Xc, axis=0)))
+        result = np.empty((max_lag + 1, Xc.shape[1], Y.shape[1]))
+        for lag in range(max_lag + 1):
+            n = T - lag
+            sx, sxx = cum_x[n], cum_xx[n]
+            sy, syy = cum_y[T] - cum_y[lag], cum_yy[T] - cum_yy[lag]
+            cov = Xc[:n].T @ Y[lag:] - np.outer(sx, sy) / n
+            var = np.outer(sxx - sx * sx / n, syy - sy * sy / n)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[lag] = cov / np.sqrt(np.where(var > 1e-12, var, np.nan))
+        yield start, result
+
+
+# Purpose: Screen many KOLs against many tokens and keep the strongest lagged relationships
+def top_lagged_correlations(kol_matrix, market_matrix, kol_names=None, token_names=None, max_lag=7,
+                            top_n=100, min_lag=1, chunk_size=1024):
+    kol_names = kol_names if kol_names is not None else list(range(np.shape(kol_matrix)[1]))
+    token_names = token_names if token_names is not None else list(range(np.shape(market_matrix)[1]))
+    best_r = np.empty(0)
+    best_idx = np.empty((0, 3), dtype=np.int64)
+
+    for start, result in lagged_correlations(kol_matrix, market_matrix, max_lag=max_lag, chunk_size=chunk_size):
+        r = np.nan_to_num(result[min_lag:], nan=0.0)
+        flat = np.abs(r).ravel()
+        k = min(top_n, flat.size)
+        candidates = np.argpartition(-flat, k - 1)[:k]
+        lag, kol, token = np.unravel_index(candidates, r.shape)
+        best_r = np.concatenate((best_r, r[lag, kol, token]))
+        best_idx = np.vstack((best_idx, np.column_stack((lag + min_lag, kol + start, token))))
+        if len(best_r) > top_n:
+            keep = np.argpartition(-np.abs(best_r), top_n - 1)[:top_n]
+            best_r, best_idx = best_r[keep], best_idx[keep]
+
+    order = np.argsort(-np.abs(best_r))
+    best_r, best_idx = best_r[order], best_idx[order]
+    return pd.DataFrame({
+        'kol': [kol_names[i] for i in best_idx[:, 1]],
+        'token': [token_names[i] for i in best_idx[:, 2]],
+        'lag': best_idx[:, 0],
+        'r': best_r,
+    })
+
+
 # Purpose: Analyze correlation between KOL activity and market movements
 def analyze_market_impact(kol_activity, market_data):
-    # Calculate correlation
-    correlation = np.corrcoef(kol_activity, market_data)[0, 1]
-    
-    # Calculate lag correlations (how KOL activity predicts future price movements)
-    lag_correlations = []
-    for lag in range(1, 8):  # Check correlations up to 7 days lag
-        lag_correlation = np.corrcoef(
-            kol_activity[:-lag], 
-            market_data[lag:]
-        )[0, 1]
-        lag_correlations.append((lag, lag_correlation))
-    
+    result = next(lagged_correlations(np.reshape(kol_activity, (-1, 1)), np.reshape(market_data, (-1, 1))))[1]
+    correlations = result[:, 0, 0]
+
     return {
-        'direct_correlation': correlation,
-        'lag_correlations': lag_correlations
+        'direct_correlation': correlations[0],
+        # how KOL activity predicts future price movements, up to 7 days lag
+        'lag_correlations': [(lag, correlations[lag]) for lag in range(1, len(correlations))]
     }
 
 # Purpose: Main function to run the complete KOL analysis pipeline
@@ -240,19 +312,19 @@ def main():
     try:
         # Step 1: Load data
         print("Loading data from database...")
-        users_df = load_data_sample()
+        data = load_data()
         
         # Step 2: Analyze engagement distribution
         print("Analyzing engagement distribution...")
-        engagement_stats = analyze_engagement_distribution(users_df)
+        engagement_stats = analyze_engagement_distribution(data)
         
         # Step 3: Calculate influence scores
         print("Calculating influence scores...")
-        users_df = calculate_influence_scores(users_df)
+        users_df = calculate_influence_scores(data)
         
         # Step 4: Build KOL network
         print("Building KOL network...")
-        G = build_kol_network(users_df)
+        G = build_kol_network(data)
         
         # Step 5: Apply PageRank to identify most influential KOLs
         print("Applying PageRank algorithm...")
@@ -260,7 +332,7 @@ def main():
         
         # Step 6: Analyze temporal patterns
         print("Analyzing temporal patterns...")
-        temporal_patterns = analyze_temporal_patterns(users_df)
+        temporal_patterns = analyze_temporal_patterns(data)
         
         # Step 7: Export results
         print("Exporting results...")
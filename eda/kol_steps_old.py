@@ -48,9 +48,6 @@ for i in kol_usernames:
     count_i += 1
 print(count_i)
 
-data = {user: {"username": user, "mentioned": 0, "retweeted": 0} for user in kol_usernames}
-# print(data)
-
 ## S3: Get edges and weights
 filter_ = {
     "timestamp": {"$gte": start_time, "$lte": end_time},
@@ -72,44 +69,15 @@ projection = {
     "retweetedTweet": 1,
     "quotedTweet": 1
 }
-nodes = kol_usernames
-edges = []
-weights = []
-count = 0
-for tweet in tweets_col.find(filter_, projection=projection):
-    author_name = tweet["authorName"]
-    if "retweetedTweet" in tweet:
-        original_author = tweet["retweetedTweet"]["authorName"]
-        if original_author not in kol_usernames:
-            kol_usernames.append(original_author)
-            data[original_author] = {"username": original_author, "mentioned": 0, "retweeted": 0}
-            if author_name != original_author:
-                data[original_author]["retweeted"] += 1
-                edges.append((author_name, original_author))
-                weights.append(0.8)
-
-    if "quotedTweet" in tweet:
-        original_author = tweet["quotedTweet"]["authorName"]
-        if original_author not in kol_usernames:
-            kol_usernames.append(original_author)
-            data[original_author] = {"username": original_author, "mentioned": 0, "retweeted": 0}
-            if author_name != original_author:
-                count += 1
-                data[original_author]["retweeted"] += 1
-                edges.append((author_name, original_author))
-                weights.append(0.8)
-
-    if "userMentions" in tweet:
-        for _id, username in tweet["userMentions"].items():
-            if username not in kol_usernames:
-                kol_usernames.append(username)
-                data[username] = {"username": username, "mentioned": 0, "retweeted": 0}
-                if author_name != username:
-                    data[username]["mentioned"] += 1
-                    edges.append((author_name, username))
-                    weights.append(0.6)
-print(count)
-# Result: 8976
+# Nodes are interned in a dict (name -> id) and edges go into typed arrays, so each
+# lookup is O(1) instead of scanning the growing username list. Every interaction
+# adds an edge, not only the first one seen for a new node.
+from kol_graph import ExpandedNetworkBuilder
+
+builder = ExpandedNetworkBuilder(kol_usernames, include_non_elite=True)
+builder.add_tweets(tweets_col.find(filter_, projection=projection))
+nodes = builder.nodes.names
+print(builder.num_nodes, builder.num_edges, builder.kind_counts())
 
 ## S4: Count the number of tweets that are quoted
 tweets_col.count_documents({
@@ -120,9 +88,7 @@ tweets_col.count_documents({
 # Result: 8976
 
 ## S5: Count the number of tweets that are mentioned
-new_data = {}
-for k, v in data.items():
-    new_data[k] = v["mentioned"] + v["retweeted"]
+new_data = dict(zip(nodes, builder.interaction_counts()))
 
 ## S6: Count the number of tweets that are mentioned in different bins
 bins = [0, 10, 20, 40, 60, 80, 100, 200, 300, 400, 500, 1000, 20000]
@@ -174,11 +140,7 @@ plt.show()
 
 
 ## S8: Count the number of edges
-count = 0
-for edge in edges:
-    count += 1
-    if count == 10:
-        break
+for edge in builder.edges()[:10]:
     print(edge)
 # Result:
 # ('KittenHaimer', 'geojamofficial')
@@ -191,24 +153,14 @@ for edge in edges:
 # ('bitpinas', 'bitgetglobal')
 
 ## S9: Calculate the PageRank score
-from scipy import sparse
-from fast_pagerank import pagerank
-from fast_pagerank import pagerank_power
-import numpy as np
-
-num_nodes = len(nodes)
-
-node_to_index = {node: index for index, node in enumerate(nodes)}
-
-edges_indices = [(node_to_index[u], node_to_index[v]) for u, v in edges]
-
+from centrality import CentralityGraph
 
-A = np.array(edges_indices)
-G = sparse.csr_matrix((weights, (A[:, 0], A[:, 1])), shape=(num_nodes, num_nodes))
+G = builder.to_csr()
+centrality = CentralityGraph(G, names=nodes)
 
 print("Tính PageRank")
 damping_factor = 0.85
-pagerank_scores = pagerank(G, p=damping_factor)
+pagerank_scores = centrality.pagerank(alpha=damping_factor)
 
 print(pagerank_scores)
 # Result:
@@ -1,48 +1,217 @@
-import networkx as nx
+import hashlib
+import os
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
+from scipy import sparse
+
+from centrality import CentralityGraph
+
+LAYOUT_CACHE_DIR = 'layout_cache'
+
+
+# Purpose: Keep only the top_k nodes by PageRank or weighted degree and their induced edges
+def select_top_nodes(adjacency, names, top_k=5000, by='pagerank'):
+    centrality = CentralityGraph(adjacency, names)
+    if by == 'pagerank':
+        scores = centrality.pagerank()
+    else:
+        scores = centrality.in_strength + centrality.out_strength
+    top_k = min(top_k, centrality.n)
+    keep = np.sort(np.argpartition(-scores, top_k - 1)[:top_k])
+    sub = centrality.csr[keep][:, keep]
+    return sub, [names[i] for i in keep], scores[keep]
+
+
+# Purpose: Merge parallel and reciprocal edges into one undirected weighted edge per pair
+def aggregate_edges(adjacency):
+    A = sparse.csr_matrix(adjacency)
+    A.sum_duplicates()
+    undirected = sparse.triu(A + A.T, k=1).tocoo()
+    return undirected.row, undirected.col, undirected.data
+
+
+def _cell_stats(flat, mass, pos, n_cells):
+    cell_mass = np.bincount(flat, weights=mass, minlength=n_cells)
+    nonzero = cell_mass > 0
+    centroid = np.zeros((n_cells, 2))
+    for axis in range(2):
+        weighted = np.bincount(flat, weights=mass * pos[:, axis], minlength=n_cells)
+        centroid[nonzero, axis] = weighted[nonzero] / cell_mass[nonzero]
+    return cell_mass, centroid
+
+
+def _repulsion(pos, mass, depth, epsilon=1e-2):
+    """
+    ForceAtlas2 repulsion (m_i * m_j / d) approximated on a quadtree built level by level.
+
+    At every level each node interacts with the centroids of the cells that are children of
+    its parent's neighbours but not neighbours of its own cell (at most 27 cells), so far
+    away mass is summarised while near mass is refined at the next level. At the deepest
+    level the nodes of the 9 surrounding cells are handled pair by pair. Every step is a
+    NumPy operation over all nodes, the total work is O(n log n).
+    """
+    n = len(pos)
+    force = np.zeros((n, 2))
+    low = pos.min(axis=0)
+    extent = (pos.max(axis=0) - low).max() or 1.0
+    unit = (pos - low) / extent * (1 - 1e-9)
+
+    for level in range(2, depth + 1):
+        size = 2 ** level
+        cell = (unit * size).astype(np.int64)
+        cell_mass, centroid = _cell_stats(cell[:, 0] * size + cell[:, 1], mass, pos, size * size)
+        base = (cell // 2) * 2 - 2
+        for ox in range(6):
+            ix = base[:, 0] + ox
+            for oy in range(6):
+                iy = base[:, 1] + oy
+                valid = (ix >= 0) & (ix < size) & (iy >= 0) & (iy < size) & (
+                        (np.abs(ix - cell[:, 0]) > 1) | (np.abs(iy - cell[:, 1]) > 1))
+                nodes = np.flatnonzero(valid)
+                cells = ix[nodes] * size + iy[nodes]
+                m = cell_mass[cells]
+                nodes, cells, m = nodes[m > 0], cells[m > 0], m[m > 0]
+                delta = pos[nodes] - centroid[cells]
+                d2 = np.einsum('ij,ij->i', delta, delta) + epsilon
+                force[nodes] += delta * (mass[nodes] * m / d2)[:, None]
+
+    # Exact interactions with the nodes of the surrounding leaf cells
+    size = 2 ** depth
+    cell = (unit * size).astype(np.int64)
+    flat = cell[:, 0] * size + cell[:, 1]
+    order = np.argsort(flat, kind='stable')
+    counts = np.bincount(flat, minlength=size * size)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    for ox in (-1, 0, 1):
+        for oy in (-1, 0, 1):
+            ix, iy = cell[:, 0] + ox, cell[:, 1] + oy
+            nodes = np.flatnonzero((ix >= 0) & (ix < size) & (iy >= 0) & (iy < size))
+            neighbour = ix[nodes] * size + iy[nodes]
+            cnt = counts[neighbour]
+            i = np.repeat(nodes, cnt)
+            offsets = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            j = order[np.repeat(starts[neighbour], cnt) + offsets]
+            distinct = i != j
+            i, j = i[distinct], j[distinct]
+            delta = pos[i] - pos[j]
+            d2 = np.einsum('ij,ij->i', delta, delta) + epsilon
+            strength = mass[i] * mass[j] / d2
+            force[:, 0] += np.bincount(i, weights=delta[:, 0] * strength, minlength=n)
+            force[:, 1] += np.bincount(i, weights=delta[:, 1] * strength, minlength=n)
+    return force
+
+
+# Purpose: ForceAtlas2-style layout on NumPy arrays with Barnes-Hut repulsion
+def force_atlas_layout(n, rows, cols, weights, iterations=100, scaling=2.0, gravity=1.0,
+                       leaf_size=8, seed=42):
+    rng = np.random.default_rng(seed)
+    pos = rng.normal(scale=np.sqrt(n), size=(n, 2))
+    if n < 2:
+        return pos
+    degree = np.bincount(rows, minlength=n) + np.bincount(cols, minlength=n)
+    mass = degree + 1.0
+    depth = int(np.clip(np.ceil(np.log(max(n / leaf_size, 1)) / np.log(4)), 2, 10))
+    log_weights = np.log1p(weights)
+
+    temperature = np.sqrt(n)
+    cooling = temperature / iterations
+    for _ in range(iterations):
+        force = scaling * _repulsion(pos, mass, depth)
+
+        # Linear attraction along edges, pulling both endpoints together
+        delta = pos[rows] - pos[cols]
+        pull = delta * log_weights[:, None]
+        for axis in range(2):
+            force[:, axis] -= np.bincount(rows, weights=pull[:, axis], minlength=n)
+            force[:, axis] += np.bincount(cols, weights=pull[:, axis], minlength=n)
+
+        # Gravity keeps disconnected components on screen
+        dist = np.linalg.norm(pos, axis=1) + 1e-9
+        force -= gravity * (mass / dist)[:, None] * pos
+
+        # Cap each displacement with a cooling temperature
+        length = np.linalg.norm(force, axis=1) + 1e-9
+        pos += force * (np.minimum(length, temperature) / length)[:, None]
+        temperature = max(temperature - cooling, cooling)
+    return pos
+
+
+# Purpose: Reuse layout coordinates across runs when the graph and settings are unchanged
+def load_or_compute_layout(names, rows, cols, weights, cache_dir=LAYOUT_CACHE_DIR, **layout_kwargs):
+    digest = hashlib.sha1()
+    digest.update('\n'.join(map(str, names)).encode())
+    for array in (rows, cols, weights):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(repr(sorted(layout_kwargs.items())).encode())
+    cache_file = os.path.join(cache_dir, f"{digest.hexdigest()}.npy")
+    if os.path.exists(cache_file):
+        return np.load(cache_file)
+
+    pos = force_atlas_layout(len(names), rows, cols, weights, **layout_kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(cache_file, pos)
+    return pos
 
-# Create a graph
-G = nx.DiGraph()
 
-# Add all nodes first
-for node in nodes:
-    G.add_node(node)
+# Purpose: Draw all edges as one LineCollection and all nodes as one scatter
+def draw_network(pos, rows, cols, weights, node_sizes, output_file, title='', dpi=150):
+    fig, ax = plt.subplots(figsize=(20, 20))
+    segments = np.stack((pos[rows], pos[cols]), axis=1)
+    edge_alpha = min(0.3, 2000.0 / max(len(rows), 1))
+    ax.add_collection(LineCollection(segments, linewidths=0.2 + 0.3 * np.log1p(weights) / (np.log1p(weights).max() or 1),
+                                     colors='gray', alpha=edge_alpha, rasterized=True))
+    ax.scatter(pos[:, 0], pos[:, 1], s=node_sizes, alpha=0.6, c='skyblue', edgecolors='none', rasterized=True)
+    ax.autoscale()
+    ax.set_title(title, pad=20)
+    ax.axis('off')
+    fig.savefig(output_file, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
 
-# Add all edges with their weights
-for (source, target), weight in zip(edges, weights):
-    G.add_edge(source, target, weight=weight)
 
-# Create visualization
-plt.figure(figsize=(20, 20))
+# Purpose: Full pipeline from a weighted adjacency matrix to a PNG
+def visualize_network(adjacency, names, output_file='kol_network_full.png', top_k=5000, by='pagerank',
+                      iterations=100):
+    begin = time.time()
+    sub, sub_names, scores = select_top_nodes(adjacency, names, top_k=top_k, by=by)
+    rows, cols, weights = aggregate_edges(sub)
+    pos = load_or_compute_layout(sub_names, rows, cols, weights, iterations=iterations)
 
-# Use a force-directed layout
-pos = nx.spring_layout(G, k=1/np.sqrt(len(G)), iterations=50)
+    degree = np.bincount(rows, minlength=len(sub_names)) + np.bincount(cols, minlength=len(sub_names))
+    draw_network(pos, rows, cols, weights, node_sizes=1 + 2 * degree, output_file=output_file,
+                 title=f"KOL Network (top {len(sub_names)} by {by})\n{len(sub_names)} nodes, {len(rows)} edges")
 
-# Calculate node sizes based on degree centrality
-degree_dict = dict(G.degree())
-node_sizes = [v * 2 for v in degree_dict.values()]
+    print(f"Network visualization saved as '{output_file}' in {time.time() - begin:.1f}s")
+    print("Network statistics:")
+    print(f"Number of nodes: {len(sub_names)}")
+    print(f"Number of edges: {len(rows)}")
+    print(f"Network density: {2 * len(rows) / max(len(sub_names) * (len(sub_names) - 1), 1):.6f}")
+    print(f"Average degree: {degree.mean():.2f}")
 
-# Draw the network
-nx.draw_networkx_nodes(G, pos, node_size=node_sizes, alpha=0.6, node_color='skyblue')
-nx.draw_networkx_edges(G, pos, alpha=0.1, arrows=False)  # Set alpha low for better visibility with many edges
+    # Calculate and display top 10 nodes by degree
+    print("\nTop 10 nodes by degree:")
+    for i in np.argsort(-degree)[:10]:
+        print(f"{sub_names[i]}: {degree[i]} connections")
+    return pos
 
-plt.title(f"KOL Network\n{len(nodes)} nodes, {len(edges)} edges", pad=20)
-plt.axis('off')
 
-# Save with high resolution
-plt.savefig('kol_network_full.png', dpi=300, bbox_inches='tight')
-plt.close()
+if __name__ == "__main__":
+    from pymongo import MongoClient
 
-print(f"Network visualization saved as 'kol_network_full.png'")
-print(f"Network statistics:")
-print(f"Number of nodes: {len(G.nodes())}")
-print(f"Number of edges: {len(G.edges())}")
-print(f"Network density: {nx.density(G):.6f}")
-print(f"Average degree: {sum(dict(G.degree()).values())/len(G):.2f}")
+    from kol_graph import ExpandedNetworkBuilder
 
-# Calculate and display top 10 nodes by degree
-top_degrees = sorted(degree_dict.items(), key=lambda x: x[1], reverse=True)[:10]
-print("\nTop 10 nodes by degree:")
-for node, degree in top_degrees:
-    print(f"{node}: {degree} connections") 
\ No newline at end of file
+    client = MongoClient("mongodb://localhost:27017/")
+    db = client["cdp_database"]
+    kol_usernames = db["twitter_raw"].distinct("userName", {"elite": True})
+    filter_ = {
+        "timestamp": {"$gte": 1731628800, "$lte": 1734220800},
+        "authorName": {"$in": kol_usernames},
+    }
+    projection = {"authorName": 1, "userMentions": 1, "retweetedTweet.authorName": 1, "quotedTweet.authorName": 1}
+    builder = ExpandedNetworkBuilder(kol_usernames).add_tweets(db["tweets"].find(filter_, projection=projection))
+    visualize_network(builder.to_csr(), builder.nodes.names, top_k=len(kol_usernames))
@@ -184,9 +184,8 @@ print(len(nodes), len(edges))
 
 ## S9: Calculate the PageRank score
 from scipy import sparse
-from fast_pagerank import pagerank
-from fast_pagerank import pagerank_power
 import numpy as np
+from eda.centrality import CentralityGraph
 
 num_nodes = len(nodes)
 
@@ -197,10 +196,11 @@ edges_indices = [(node_to_index[u], node_to_index[v]) for u, v in edges]
 
 A = np.array(edges_indices)
 G = sparse.csr_matrix((weights, (A[:, 0], A[:, 1])), shape=(num_nodes, num_nodes))
+centrality = CentralityGraph(G, names=nodes)
 
 print("Tính PageRank")
 damping_factor = 0.85
-pagerank_scores = pagerank(G, p=damping_factor)
+pagerank_scores = centrality.pagerank(alpha=damping_factor)
 
 pagerank_scores
 # Result:
@@ -319,3 +319,13 @@ for kol in results.keys():
 print(mapping_follower)
 
 
+## S15: Centrality suite and per-project personalized PageRank on the same CSR
+table = centrality.centrality_table(alpha=damping_factor)
+print(table.sort_values("authority", ascending=False).head(10))
+
+project_accounts = {}
+for document in db["projects_social_media"].find({"twitter": {"$exists": True}}, {"projectId": 1, "twitter.id": 1}):
+    project_accounts.setdefault(document["projectId"], []).append(document["twitter"]["id"])
+
+project_ranks = centrality.personalized_table(project_accounts, alpha=damping_factor, top_n=20)
+print(project_ranks.head(20))